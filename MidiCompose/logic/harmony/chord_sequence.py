@@ -120,10 +120,10 @@ class ChordSequence:
             for i_part, p in enumerate(parts):
                 if len_chord >= i_part + 1:
                     # activate first subdivision of first beat of current measure
-                    p[i_chord][0][0].activate()
+                    p[i_chord][0][0] = 1
                     melodies[i_part].append_note(c[i_part])
                 else:
-                    p[i_chord][0][0].deactivate()
+                    p[i_chord][0][0] = 0
 
         # set velocities
         for m,v in zip(melodies,velocities):
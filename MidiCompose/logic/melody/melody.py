@@ -1,6 +1,7 @@
-from copy import deepcopy
 from typing import List, Union, Optional, Sequence
 
+import numpy as np
+
 from MidiCompose.logic.harmony.note import Note
 
 
@@ -23,6 +24,10 @@ class MelodyIterator:
 class Melody:
     """
     A collection of Note objects with utility functions for generating melodies.
+
+    Copies (`copy()`, `*`) are copy-on-write: they share the lists of notes and velocities of the original until
+    either Melody is mutated, or either list is accessed through `notes` or `velocity` (which may be mutated in
+    place).
     """
 
     def __init__(self,
@@ -35,12 +40,15 @@ class Melody:
         an array of integers with size equal to the number of notes.
         """
 
+        self._shared = False  # True if `_notes`/`_velocity` may be shared with a copy
+
         self.notes = notes  # calls setter
 
         self.velocity = velocity  # calls setter
 
     @property
     def notes(self) -> List[Note]:
+        self._ensure_writable()
         return self._notes
 
     @notes.setter
@@ -71,6 +79,7 @@ class Melody:
 
     @property
     def velocity(self) -> List[int]:
+        self._ensure_writable()
         return self._velocity
 
     @velocity.setter
@@ -97,29 +106,55 @@ class Melody:
 
         self._velocity = _velocity
 
+    @property
+    def note_values(self) -> np.ndarray:
+        """
+        1d array of the midi-value of each Note.
+        """
+        return np.fromiter((n.value for n in self._notes), dtype=int, count=len(self._notes))
+
     #### UTILITY METHODS ####
 
+    def _ensure_writable(self):
+        if self._shared:
+            self._notes = list(self._notes)
+            if self._velocity is not None:
+                self._velocity = list(self._velocity)
+            self._shared = False
+
     def append_note(self, note: Note, velocity: int = 64):
+        self._ensure_writable()
         self.notes.append(note)
         self.velocity.append(velocity)
         return self
 
+    def copy(self):
+        """
+        Returns a copy-on-write copy of the Melody. Note objects are shared, as they are treated as values.
+        """
+        melody = Melody.__new__(Melody)
+        melody._notes = self._notes
+        melody._velocity = self._velocity
+        melody._shared = True
+        self._shared = True
+        return melody
+
     #### MAGIC METHODS ####
 
     def __len__(self):
-        return len(self.notes)
+        return len(self._notes)
 
     def __getitem__(self, item: int):
-        return self.notes[item]
+        return self._notes[item]
 
     def __iter__(self):
         return MelodyIterator(self)
 
     def __mul__(self, other: int):
-        return [deepcopy(self) for _ in range(other)]
+        return [self.copy() for _ in range(other)]
 
     def __repr__(self):
         r = "Melody("
-        r += ", ".join([str(n.as_letter()) for n in self.notes])
+        r += ", ".join([str(n.as_letter()) for n in self._notes])
         r += ")"
         return r
@@ -1,11 +1,16 @@
+from __future__ import annotations
+
 from copy import deepcopy
-from typing import Union, Iterable, Collection, Optional, List
-import random
+from typing import TYPE_CHECKING, Union, Iterable, Collection, Optional, List, Dict, Tuple
+import weakref
 
 import numpy as np
 
 from MidiCompose.logic.rhythm.time_unit import TimeUnit
-from MidiCompose.utilities import temp_seed, ctx_random_seed
+from MidiCompose.utilities import get_generator
+
+if TYPE_CHECKING:
+    from MidiCompose.logic.rhythm.part_buffer import PartBuffer
 
 
 class BeatIterator:
@@ -18,7 +23,7 @@ class BeatIterator:
 
     def __next__(self):
         if self._index < self._len_Beat:
-            result = self._Beat.time_units[self._index]
+            result = TimeUnit(self._Beat[self._index])
             self._index += 1
             return result
         else:
@@ -29,11 +34,27 @@ class Beat:
     """
     Container for TimeUnit objects.
 
-    Definitive attribute is `self.time_units`, which is a numpy array containing TimeUnit objects.
+    Definitive attribute is the flagged figure array returned by `self.state`. `self.time_units` gives the
+    (shared, immutable) TimeUnit of each subdivision, and `beat[i]` gives its value. Subdivisions are set by
+    assignment, ie. `beat[i] = 1` or `beat[i] = TimeUnit(1)`.
+
+    Note that `beat[i]` is an `np.int8` rather than a TimeUnit, and that TimeUnits are immutable: code mutating
+    a subdivision in place, like `beat[i].activate()`, must assign instead (`beat[i] = 1`, or
+    `beat[i] = beat.time_units[i].activate()`).
 
     Argument `time_units` must either be a single integer representing the number of
     subdivisions, or an iterable containing TimeUnit objects and/or "TimeUnit-like"
     integers (ie. {0,1,2}). The latter is useful when passing stateful TimeUnit objects.
+
+    A Beat obtained from a buffered `Part` is a view into the Part's buffer rather than owning its own array.
+
+    Measures containing the Beat are registered as its owners, and are notified whenever the Beat is mutated so
+    that their cached figures stay valid.
+
+    Copies (`copy()`, `*`) are copy-on-write: they share the figure array of the original until either one is
+    mutated.
+
+    Beats are equal (and hash equally) if their figures are equal. Don't mutate a Beat used as a dict key.
     """
 
     def __init__(self,
@@ -43,52 +64,181 @@ class Beat:
         :param verbose: determines format of output
         """
 
-        # self._parse_beat_arg(time_units)
+        # set when the Beat is a view into a PartBuffer
+        self._buffer: Optional[PartBuffer] = None
+        self._index: Optional[int] = None
 
+        # Measures containing this Beat, keyed by id
+        self._owners: Optional[Dict[int, weakref.ref]] = None  # created on first registration
+
+        self._state: Optional[np.ndarray] = None
+        self._shared: bool = False  # True if `_state` may be shared with a copy
         self.time_units = time_units  # calls setter method
 
         self.verbose = verbose
 
+    @classmethod
+    def _from_active_state(cls, active_state: np.ndarray, verbose: bool = False):
+        """
+        Returns a standalone Beat from an array of TimeUnit values, without validating them.
+        """
+        beat = cls.__new__(cls)
+        beat._buffer = None
+        beat._index = None
+        beat._owners = None
+        beat._state = np.empty(shape=(active_state.size + 2,), dtype=np.int8)
+        beat._state[:2] = [-3, active_state.size]
+        beat._state[2:] = active_state
+        beat._shared = False
+        beat.verbose = verbose
+        return beat
+
+    @classmethod
+    def _from_buffer(cls, buffer: PartBuffer, index: int):
+        """
+        Returns a Beat which views the `index`-th Beat of a `PartBuffer`.
+        """
+        beat = cls.__new__(cls)
+        beat._buffer = buffer
+        beat._index = index
+        beat._owners = None
+        beat._shared = False
+        beat.verbose = False
+        return beat
+
+    def _view(self) -> Tuple[PartBuffer, int]:
+        """
+        Returns the PartBuffer viewed by the Beat, and the index of the Beat in it.
+        """
+        if self._buffer is None or self._index is None:
+            msg = "Beat is not a view into a PartBuffer."
+            raise ValueError(msg)
+        return self._buffer, self._index
+
+    def _own_state(self) -> np.ndarray:
+        """
+        Returns the figure array owned by a standalone Beat.
+        """
+        if self._state is None:
+            msg = "Beat is a view into a PartBuffer and owns no figure."
+            raise ValueError(msg)
+        return self._state
+
+    @property
+    def _array(self) -> np.ndarray:
+        """
+        Writable figure array of the Beat (a slice of the PartBuffer if the Beat is a view).
+        """
+        if self._buffer is not None:
+            buffer, index = self._view()
+            return buffer.beat_state(index)
+        return self._own_state()
+
+    @property
+    def _writable_array(self) -> np.ndarray:
+        """
+        Same as `_array`, but copies the figure first if it is shared with a copy of the Beat.
+        """
+        if self._buffer is not None:
+            buffer, index = self._view()
+            return buffer.beat_state(index, writable=True)
+        if self._shared:
+            self._state = self._own_state().copy()
+            self._shared = False
+        return self._own_state()
+
+    @property
+    def is_view(self) -> bool:
+        return self._buffer is not None
+
     @property
     def time_units(self) -> List[TimeUnit]:
-        return self._time_units
+        return [TimeUnit(v) for v in self._array[2:].tolist()]
 
     @time_units.setter
     def time_units(self, value):
 
         # if integer, `value` represents number of subdivisions
         if isinstance(value, int):
-            self._time_units = [TimeUnit() for _ in range(value)]
+            _active_state = [0 for _ in range(value)]
         else:
             tu_like_type_set = {int, TimeUnit}
             value_type_set = set([type(v) for v in value])
 
             # else, collection of integers/TimeUnit objects
             if value_type_set.issubset(tu_like_type_set):
-                _time_units = []
+                _active_state = []
                 for v in value:
                     if isinstance(v, TimeUnit):
-                        _time_units.append(v)
+                        _active_state.append(v.state)
                     else:
-                        _time_units.append(TimeUnit(v))
-                self._time_units = _time_units
+                        _active_state.append(TimeUnit(v).state)  # validates
 
             else:
                 msg = f"Invalid input"
                 raise AttributeError(msg)
 
+        if self.is_view:
+            if len(_active_state) != self.subdivision:
+                msg = "Cannot change the subdivision of a Beat which is a view into a buffered Part."
+                raise ValueError(msg)
+            self._writable_array[2:] = _active_state
+        else:
+            layout_changed = self._state is None or len(_active_state) != self.subdivision
+            state = np.empty(shape=(len(_active_state) + 2,), dtype=np.int8)
+            state[:2] = [-3, len(_active_state)]
+            state[2:] = _active_state
+            self._state = state
+            self._shared = False
+            self._changed(layout_changed=layout_changed)
+
+    def _register_owner(self, measure):
+        if self._buffer is None:  # views can't notify owners
+            if self._owners is None:
+                self._owners = dict()
+            self._owners[id(measure)] = weakref.ref(measure)
+
+    def _unregister_owner(self, measure):
+        if self._owners:
+            self._owners.pop(id(measure), None)
+
+    def _changed(self, layout_changed: bool = False):
+        """
+        Invalidate the cached figures of every Measure containing the Beat.
+
+        :param layout_changed: True if the subdivision of the Beat changed.
+        """
+        if self._owners:
+            for owner_id, ref in list(self._owners.items()):
+                measure = ref()
+                if measure is None:  # garbage collected
+                    del self._owners[owner_id]
+                    continue
+                measure._beat_changed(self, layout_changed)
+
+    def _set_unit(self, index: int, value: int):
+        """
+        Set the figure of a single TimeUnit.
+        """
+        if value not in {0, 1, 2}:
+            msg = f"Invalid value. TimeUnit `figure` must be in {0, 1, 2}."
+            raise ValueError(msg)
+        self._writable_array[2 + index] = value
+        self._changed()
+
     @property
     def subdivision(self) -> int:
-        return len(self)
+        return int(self._array[1])
 
     @property
     def state(self) -> np.ndarray:
         """
         1d numeric array representing the value of each TimeUnit in the Beat.
+
+        Returned array is a read-only view of the Beat's figure.
         """
-        state = np.empty(shape=(self.subdivision + 2,), dtype=np.int8)
-        state[:2] = [-3, self.subdivision]
-        state[2:] = [tu.state for tu in self.time_units]
+        state = self._array.view()
+        state.flags.writeable = False
         return state
 
     @property
@@ -139,25 +289,19 @@ class Beat:
 
     def activate_random(self,
                         density: float,
-                        random_seed: Optional[int] = None):
+                        random_seed: Optional[Union[int, np.random.Generator]] = None):
         """
         :param density: float between 0 and 1 representing the density of activation.
-        :param random_seed: Provide a random random_seed for reproducibility.
+        :param random_seed: Provide a random random_seed (or numpy Generator) for reproducibility.
         """
-        _beat = deepcopy(self)
+        if density < 0 or density > 1:
+            msg = "`density` must be a float between 0 and 1."
+            raise ValueError(msg)
 
-        if random_seed is not None:
-            with temp_seed(random_seed):
-                choices = np.random.choice(a=[0, 1],
-                                           size=_beat.subdivision,
-                                           p=[1 - density, density])
+        rng = get_generator(random_seed)
+        choices = rng.random(self.subdivision) < density
 
-                [tu.set_state(c) for tu, c in zip(_beat.time_units, choices)]
-        else:
-            choices = np.random.choice(a=[0, 1],
-                                       size=_beat.subdivision,
-                                       p=[1 - density, density])
-            [tu.set_state(c) for tu, c in zip(_beat.time_units, choices)]
+        _beat = Beat._from_active_state(choices.astype(np.int8), verbose=self.verbose)
 
         return _beat
 
@@ -165,56 +309,46 @@ class Beat:
         """
         Convert all "note_off" events to sustain events (ie change all 0s to 2).
         """
-        _beat = deepcopy(self)
+        active_state = self._writable_array[2:]
+        active_state[active_state == 0] = 2
+        self._changed()
 
-        idx_off = np.where(_beat.state[2:] == 0)[0]
-        for idx in idx_off:
-            _beat.time_units[idx].sustain()
-
-        return _beat
+        return self
 
     def shorten_all(self):
         """
         Convert all "sustain" events to "note_off".
         """
-        idx_sustain = np.where(self.state[2:] == 2)[0]
-        for idx in idx_sustain:
-            self.time_units[idx].deactivate()
+        active_state = self._writable_array[2:]
+        active_state[active_state == 2] = 0
+        self._changed()
 
     #### GENERATOR METHODS ####
 
     def get_complement(self,
                        adherence: float = 1.0,
-                       random_seed: Optional[int] = None):
+                       random_seed: Optional[Union[int, np.random.Generator]] = None):
         """
         Returns new `Beat` instance which is complement of "attack".
 
         ie. all "sustain" is stripped.
 
         Params:
-        - adherence (str) : ...
+        - adherence (float) : probability with which each TimeUnit is toggled. Otherwise, it keeps its figure.
+        - random_seed : Provide a random random_seed (or numpy Generator) for reproducibility.
         """
 
         if adherence < 0 or adherence > 1:
             msg = "`Adherence` must be a float between 0 and 1"
             raise ValueError(msg)
 
-        _time_units = deepcopy(self._time_units)
+        rng = get_generator(random_seed)
+        toggle = rng.random(self.subdivision) < adherence
 
-        with ctx_random_seed(random_seed):
-            _adherence = random.choices([0,1],
-                                        weights=[1-adherence,adherence],
-                                        k=len(_time_units))
+        active_state = self.active_state
+        _complement = np.where(toggle, np.where(active_state == 1, 0, 1), active_state).astype(np.int8)
 
-        _complement = []
-        for tu,adhere in zip(_time_units,_adherence):
-            if adhere == 1:
-                _tu = tu.toggle()
-            else:
-                _tu = tu
-            _complement.append(_tu)
-
-        complement = Beat(_complement)
+        complement = Beat._from_active_state(_complement)
 
         return complement
 
@@ -223,17 +357,74 @@ class Beat:
     def __iter__(self):
         return BeatIterator(self)
 
-    def __getitem__(self, item: int) -> TimeUnit:
-        return self.time_units[item]
+    def __getitem__(self, item: int) -> np.int8:
+        """
+        Returns the value (0, 1 or 2) of the `item`-th subdivision. Assign to `beat[item]` to change it.
+        """
+        if not -self.subdivision <= item < self.subdivision:
+            msg = f"TimeUnit index {item} out of range for Beat with subdivision {self.subdivision}."
+            raise IndexError(msg)
+        return self._array[2 + item % self.subdivision]
+
+    def __setitem__(self, item: int, value: Union[int, TimeUnit]):
+        if not -self.subdivision <= item < self.subdivision:
+            msg = f"TimeUnit index {item} out of range for Beat with subdivision {self.subdivision}."
+            raise IndexError(msg)
+        if isinstance(value, TimeUnit):
+            value = value.state
+        self._set_unit(item % self.subdivision, value)
+
+    def copy(self) -> Beat:
+        """
+        Returns a copy-on-write copy of the Beat. The copy of a view is a standalone Beat.
+        """
+        if self.is_view:
+            return deepcopy(self)
+
+        beat = Beat.__new__(Beat)
+        beat._buffer = None
+        beat._index = None
+        beat._owners = None
+        beat._state = self._state
+        beat._shared = True
+        beat.verbose = self.verbose
+
+        self._shared = True
+        return beat
 
     def __mul__(self, number: int):
-        copies = []
-        for _ in range(number):
-            copies.append(deepcopy(self))
-        return copies
+        return [self.copy() for _ in range(number)]
 
     def __len__(self):
-        return len(self.time_units)
+        return self.subdivision
+
+    def __eq__(self, other):
+        if not isinstance(other, Beat):
+            return NotImplemented
+        return np.array_equal(self._array, other._array)
+
+    def __hash__(self):
+        # content hash of the figure: mutating a Beat changes its hash
+        return hash(self._array.tobytes())
+
+    def __deepcopy__(self, memo):
+        # a copy never aliases the original, so copies of views are standalone
+        beat = Beat.__new__(Beat)
+        beat._buffer = None
+        beat._index = None
+        beat._owners = None
+        beat._state = self._array.copy()
+        beat._shared = False
+        beat.verbose = self.verbose
+        return beat
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_owners"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
 
     def set_verbosity(self, verbose: bool):
         self.verbose = verbose
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+
+Rhythm = Union[Beat, Measure, Part]
+
+
+class DedupIndex:
+    """
+    Counts the unique patterns among a large number of Beats, Measures or Parts.
+
+    Patterns are keyed by the bytes of their flagged figure, which is the same canonical key hashed by `Beat`,
+    `Measure` and `Part`: two rhythms are the same pattern if they have the same layout and the same activations.
+    Figures start with their own flag (-3, -2 or -1), so Beats, Measures and Parts never collide.
+
+    Batches of raw figures (`update_states`) are deduplicated with `np.unique` before being merged into the index,
+    so ingesting eg. `RhythmEnsemble.states` costs one sort rather than one lookup per rhythm.
+    """
+
+    def __init__(self):
+        self._counts: Dict[bytes, int] = dict()
+        self.n_total: int = 0
+
+    @staticmethod
+    def _key(rhythm: Union[Rhythm, np.ndarray, Sequence[int]]) -> bytes:
+        if isinstance(rhythm, (Beat, Measure, Part)):
+            rhythm = rhythm.state
+        return np.asarray(rhythm, dtype=np.int8).tobytes()
+
+    #### INGESTION ####
+
+    def add(self, rhythm: Rhythm):
+        self.update([rhythm])
+
+    def update(self, rhythms: Iterable[Rhythm]):
+        counts = self._counts
+        n = 0
+        for rhythm in rhythms:
+            key = self._key(rhythm)
+            counts[key] = counts.get(key, 0) + 1
+            n += 1
+        self.n_total += n
+
+    def update_states(self, states: Union[np.ndarray, Sequence[Union[np.ndarray, Sequence[int]]]]):
+        """
+        Ingest a batch of flagged figures: either a 2d array (one figure per row), or a sequence of figures of any
+        length, which are grouped by length and deduplicated one group at a time.
+        """
+        if isinstance(states, np.ndarray) and states.ndim == 2:
+            self._update_matrix(states)
+            return
+
+        figures: List[np.ndarray] = [np.asarray(s, dtype=np.int8) for s in states]
+        sizes = np.array([f.size for f in figures], dtype=np.int64)
+        for size in np.unique(sizes):
+            idx = np.flatnonzero(sizes == size)
+            self._update_matrix(np.stack([figures[i] for i in idx]))
+
+    def _update_matrix(self, states: np.ndarray):
+        states = np.ascontiguousarray(states, dtype=np.int8)
+        if states.shape[0] == 0:
+            return
+        unique_states, counts = np.unique(states, axis=0, return_counts=True)
+        for state, count in zip(unique_states, counts.tolist()):
+            key = state.tobytes()
+            self._counts[key] = self._counts.get(key, 0) + count
+        self.n_total += states.shape[0]
+
+    #### REPORTING ####
+
+    def count(self, rhythm: Union[Rhythm, np.ndarray, Sequence[int]]) -> int:
+        """
+        Number of ingested rhythms equal to `rhythm` (a Beat, Measure, Part or flagged figure).
+        """
+        return self._counts.get(self._key(rhythm), 0)
+
+    @property
+    def unique_states(self) -> List[np.ndarray]:
+        """
+        Figure of every unique pattern, in order of first ingestion.
+        """
+        return [np.frombuffer(key, dtype=np.int8) for key in self._counts]
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        Number of occurrences of each pattern of `unique_states`.
+        """
+        return np.fromiter(self._counts.values(), dtype=np.int64, count=len(self._counts))
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        """
+        Relative frequency of each pattern of `unique_states`.
+        """
+        return self.counts / max(self.n_total, 1)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[np.ndarray, int]]:
+        """
+        Returns the `n` most common patterns (all if None) and their counts, most common first.
+        """
+        counts = self.counts
+        order = np.argsort(-counts, kind="stable")[:n]
+        keys = list(self._counts)
+        return [(np.frombuffer(keys[i], dtype=np.int8), int(counts[i])) for i in order]
+
+    #### MAGIC METHODS ####
+
+    def __contains__(self, rhythm: Union[Rhythm, np.ndarray, Sequence[int]]) -> bool:
+        return self._key(rhythm) in self._counts
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __repr__(self):
+        return f"DedupIndex(n_unique={len(self)}, n_total={self.n_total})"
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.part_buffer import PartBuffer
+from MidiCompose.utilities import get_generator
+
+
+class RhythmEnsembleIterator:
+
+    def __init__(self, ensemble):
+        self._Ensemble = ensemble
+        self._index = 0
+        self._len_Ensemble = len(self._Ensemble)
+
+    def __next__(self) -> Part:
+        if self._index < self._len_Ensemble:
+            result = self._Ensemble[self._index]
+            self._index += 1
+            return result
+        else:
+            raise StopIteration
+
+
+class RhythmEnsemble:
+    """
+    A collection of Parts which share the layout (measures, beats and subdivisions) of a template Part.
+
+    Definitive attribute is `self.states`, a 2d int8 array with one flagged figure per row. Parts are created
+    lazily on access, and are buffered Parts whose buffer is a view of the corresponding row.
+    """
+
+    def __init__(self,
+                 layout: PartBuffer,
+                 states: np.ndarray):
+        """
+        :param layout: PartBuffer whose offset arrays describe every row of `states`.
+        :param states: 2d array of shape (n_parts, layout.data.size).
+        """
+        if states.ndim != 2 or states.shape[1] != layout.data.size:
+            msg = "`states` must be a 2d array with one figure of the same layout as `layout` per row."
+            raise ValueError(msg)
+
+        self.layout: PartBuffer = layout
+        self.states: np.ndarray = states
+
+    @classmethod
+    def from_states(cls,
+                    states: np.ndarray,
+                    validate: bool = True) -> RhythmEnsemble:
+        """
+        Returns an ensemble from a 2d array of flagged figures sharing the same layout. `states` is copied.
+
+        :param validate: If True, the first row is parsed and validated, and every row is checked against its layout
+        in a single vectorized comparison.
+        """
+        states = np.array(states, dtype=np.int8)
+        if states.ndim != 2 or states.shape[0] == 0:
+            msg = "`states` must be a non-empty 2d array with one figure per row."
+            raise ValueError(msg)
+        layout = PartBuffer.from_state(states[0], validate=validate)
+        if validate:
+            layout.validate_batch(states)
+        return cls(layout, states)
+
+    @classmethod
+    def activate_random(cls,
+                        template: Part,
+                        n: int,
+                        density: Union[float, Sequence[float], np.ndarray],
+                        random_seed: Optional[Union[int, np.random.Generator]] = None,
+                        measure_idx: Optional[Sequence[int]] = None) -> RhythmEnsemble:
+        """
+        Batch equivalent of `Part.activate_random`. Returns `n` Parts with the layout of `template`, drawing all
+        onsets in a single call to a numpy Generator.
+
+        :param template: Part which gives the layout, as well as the figure of excluded measures.
+        :param density: Either a single float, one float per Measure, or one float per TimeUnit of `template`.
+        :param random_seed: Provide a random random_seed (or numpy Generator) for reproducibility.
+        :param measure_idx: If given, these measures are excluded and keep the figure of `template`.
+        """
+        layout = PartBuffer(np.array(template.state, dtype=np.int8))
+
+        density = np.asarray(density, dtype=float)
+        if density.ndim == 1 and density.size == layout.n_measures:
+            density = layout.expand_measure_values(density)
+        elif density.ndim == 1 and density.size != layout.n_time_units:
+            msg = "`density` must be a single float, or a schedule with one float per Measure or per TimeUnit."
+            raise ValueError(msg)
+        if np.any(density < 0) or np.any(density > 1):
+            msg = "`density` must be between 0 and 1."
+            raise ValueError(msg)
+
+        rng = get_generator(random_seed)
+        choices = (rng.random((n, layout.n_time_units)) < density).astype(np.int8)
+
+        states = np.tile(layout.data, (n, 1))
+        if measure_idx is None:
+            states[:, layout.unit_index] = choices
+        else:
+            mask = ~layout.unit_mask(measure_idx=measure_idx)
+            states[:, layout.unit_index[mask]] = choices[:, mask]
+
+        return cls(layout, states)
+
+    @property
+    def active_states(self) -> np.ndarray:
+        """
+        2d array of shape (n_parts, n_time_units), ie. `states` without part/measure/beat flags.
+        """
+        return self.states[:, self.layout.unit_index]
+
+    @property
+    def n_note_on(self) -> np.ndarray:
+        """
+        Number of "note_on" events in each Part.
+        """
+        return np.count_nonzero(self.active_states == 1, axis=1)
+
+    #### MAGIC METHODS ####
+
+    def __getitem__(self, item: int) -> Part:
+        return Part.from_buffer(self.layout.with_data(self.states[item]))
+
+    def __iter__(self):
+        return RhythmEnsembleIterator(self)
+
+    def __len__(self):
+        return self.states.shape[0]
+
+    def __repr__(self):
+        return f"RhythmEnsemble(n_parts={len(self)}, n_time_units={self.layout.n_time_units})"
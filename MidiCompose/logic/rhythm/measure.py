@@ -1,5 +1,7 @@
-import random
-from typing import Union, Collection, Optional, List, Sequence
+from __future__ import annotations
+
+import weakref
+from typing import TYPE_CHECKING, Union, Collection, Optional, List, Sequence, Dict, Tuple
 from copy import deepcopy
 from itertools import chain
 
@@ -7,7 +9,10 @@ import numpy as np
 from icecream import ic
 
 from MidiCompose.logic.rhythm.beat import Beat
-from MidiCompose.utilities import temp_seed,ctx_random_seed
+from MidiCompose.utilities import get_generator
+
+if TYPE_CHECKING:
+    from MidiCompose.logic.rhythm.part_buffer import PartBuffer
 
 
 class MeasureIterator:
@@ -19,7 +24,7 @@ class MeasureIterator:
 
     def __next__(self) -> Beat:
         if self._index < self._len_Measure:
-            result = self._Measure.beats[self._index]
+            result = self._Measure[self._index]
             self._index += 1
             return result
         else:
@@ -43,23 +48,206 @@ class Measure:
 
         :param beats: iterable containing Beat objects, bare integers, or a combination of the two.
         :param verbose: if True, __repr__ gives more info.
+
+        `state`, `subdivision_values` and `n_note_on` are cached. Mutating a contained Beat (or one of its
+        TimeUnits) only refreshes that Beat's slice of the cached figure.
+
+        Measures are equal (and hash equally) if their figures are equal.
         """
 
+        # set when the Measure is a view into a PartBuffer
+        self._buffer: Optional[PartBuffer] = None
+        self._index: Optional[int] = None
+
+        # Parts containing this Measure, keyed by id
+        self._owners: Optional[Dict[int, weakref.ref]] = None  # created on first registration
+        self._beats: List[Beat] = []
+        self._has_view_beats: bool = False  # set by `_set_beats`
+        self._clear_cache()
+
         self.beats: Collection[Beat] = beats  # calls setter method
         self.verbose: bool = verbose
 
+    @classmethod
+    def _from_beats(cls, beats: List[Beat], verbose: bool = False):
+        """
+        Returns a Measure containing `beats` (a list of Beat objects), skipping validation.
+        """
+        measure = cls.__new__(cls)
+        measure._buffer = None
+        measure._index = None
+        measure._owners = None
+        measure._beats = []
+        measure._clear_cache()
+        measure._set_beats(beats)
+        measure.verbose = verbose
+        return measure
+
+    @classmethod
+    def from_state(cls,
+                   state: Union[np.ndarray, Sequence[int]],
+                   validate: bool = True,
+                   verbose: bool = False) -> Measure:
+        """
+        Returns a Measure parsed from its flagged figure (ie. the output of `Measure.state`).
+
+        Beats are sliced directly out of `state`, without validating each TimeUnit.
+
+        :param validate: If True, raises ValueError if `state` isn't a valid figure of a single Measure.
+        """
+        from MidiCompose.logic.rhythm.part_buffer import PartBuffer  # avoid circular import
+
+        data = np.empty(shape=(len(state) + 2,), dtype=np.int8)
+        data[0], data[-1] = -1, -1
+        data[1:-1] = state
+        buffer = PartBuffer.from_state(data, validate=validate, copy=False)
+        if buffer.n_measures != 1:
+            msg = "`state` must be the figure of exactly one Measure."
+            raise ValueError(msg)
+
+        starts = buffer.beat_offsets + 2
+        beats = [Beat._from_active_state(data[start:stop], verbose=verbose)
+                 for start, stop in zip(starts, starts + buffer.sub_values)]
+        return cls._from_beats(beats, verbose=verbose)
+
+    @classmethod
+    def _from_buffer(cls, buffer: PartBuffer, index: int):
+        """
+        Returns a Measure which views the `index`-th Measure of a `PartBuffer`.
+        """
+        measure = cls.__new__(cls)
+        measure._buffer = buffer
+        measure._index = index
+        measure._owners = None
+        measure._has_view_beats = False
+        measure.verbose = False
+        return measure
+
+    def _view(self) -> Tuple[PartBuffer, int]:
+        """
+        Returns the PartBuffer viewed by the Measure, and the index of the Measure in it.
+        """
+        if self._buffer is None or self._index is None:
+            msg = "Measure is not a view into a PartBuffer."
+            raise ValueError(msg)
+        return self._buffer, self._index
+
+    #### CACHE ####
+
+    def _clear_cache(self):
+        self._cache_state: Optional[np.ndarray] = None
+        self._cache_positions: Dict[int, List[int]] = dict()  # id(beat) -> offsets of the beat in cached figure
+        self._cache_views: List[int] = list()  # offsets of Beats which are views into a PartBuffer
+        self._dirty_beats: Dict[int, Beat] = dict()
+        self._cache_sub_values: Optional[np.ndarray] = None
+        self._cache_n_note_on: Optional[int] = None
+
+    def _set_beats(self, beats: List[Beat]):
+        for b in self._beats:
+            b._unregister_owner(self)
+        for b in beats:
+            b._register_owner(self)
+        self._beats = beats
+        self._has_view_beats = any([b.is_view for b in beats])
+        self._clear_cache()
+        self._changed(layout_changed=True)
+
+    def _beat_changed(self, beat: Beat, layout_changed: bool):
+        """
+        Called by a contained Beat after it is mutated.
+        """
+        if layout_changed:
+            self._clear_cache()
+        elif self._cache_state is not None:
+            self._dirty_beats[id(beat)] = beat
+        self._cache_n_note_on = None
+        self._changed(layout_changed=layout_changed)
+
+    def _register_owner(self, part):
+        if self._buffer is None:  # views can't notify owners
+            if self._owners is None:
+                self._owners = dict()
+            self._owners[id(part)] = weakref.ref(part)
+
+    def _unregister_owner(self, part):
+        if self._owners:
+            self._owners.pop(id(part), None)
+
+    def _changed(self, layout_changed: bool = False):
+        if self._owners:
+            for owner_id, ref in list(self._owners.items()):
+                part = ref()
+                if part is None:  # garbage collected
+                    del self._owners[owner_id]
+                    continue
+                part._measure_changed(self, layout_changed)
+
+    def _refresh_state(self) -> np.ndarray:
+        """
+        Rebuild the cached figure if the layout changed, otherwise copy only the slices of mutated Beats.
+        """
+        if self._cache_state is None:
+            size = 1 + sum([b._array.size for b in self._beats])
+            state = np.empty(shape=(size,), dtype=np.int8)
+            state[0] = -2
+            offset = 1
+            for b in self._beats:
+                b_state = b._array
+                state[offset:offset + b_state.size] = b_state
+                if b.is_view:
+                    self._cache_views.append(offset)
+                else:
+                    self._cache_positions.setdefault(id(b), []).append(offset)
+                offset += b_state.size
+            self._cache_state = state
+            self._dirty_beats = dict()
+
+        else:
+            for beat_id, b in self._dirty_beats.items():
+                b_state = b._array
+                for offset in self._cache_positions[beat_id]:
+                    self._cache_state[offset:offset + b_state.size] = b_state
+            self._dirty_beats = dict()
+
+            # views into a PartBuffer can't notify their owners
+            if self._cache_views:
+                views = [b for b in self._beats if b.is_view]
+                for offset, b in zip(self._cache_views, views):
+                    b_state = b._array
+                    self._cache_state[offset:offset + b_state.size] = b_state
+
+        return self._cache_state
 
     #### PROPERTIES ####
 
+    @property
+    def is_view(self) -> bool:
+        return self._buffer is not None
+
+    @property
+    def has_views(self) -> bool:
+        """
+        True if the Measure, or any of its Beats, is a view into a PartBuffer. Mutations of views can't be
+        notified to the Parts containing the Measure.
+        """
+        return self.is_view or self._has_view_beats
+
     @property
     def beats(self) -> List[Beat]:
+        if self.is_view:
+            buffer, index = self._view()
+            return [buffer.beat(i) for i in buffer.measure_beat_range(index)]
         return self._beats
 
     @beats.setter
     def beats(self, value):
 
-        if value is None:  # initialize empty measure
-            self._beats = []
+        if self.is_view:  # write through to buffer -- layout must not change
+            buffer, index = self._view()
+            buffer.set_measure_state(index, Measure(value).state)
+
+        elif value is None:  # initialize empty measure
+            self._set_beats([])
         else:
 
             value_type_set = set([type(b) for b in value])
@@ -72,15 +260,15 @@ class Measure:
             # collection of collections of integers
             coll_of_colls = all([issubclass(type(b), Collection) for b in value])
             if coll_of_colls:
-                self._beats = [Beat(c) for c in value]
+                self._set_beats([Beat(c) for c in value])
 
             # contains only Beats -- no validation needed
             elif value_type_set.issubset(beat_set):
-                self._beats = [v for v in value]
+                self._set_beats([v for v in value])
 
             # contains only integers -- validated by Beat constructor
             elif value_type_set.issubset(int_set):
-                self._beats = [Beat(a) for a in value]
+                self._set_beats([Beat(a) for a in value])
 
             # contains mixture Beat and int -- validated by Beat constructor
             else:
@@ -90,7 +278,7 @@ class Measure:
                         _beats.append(Beat(b))
                     else:
                         _beats.append(b)
-                self._beats = _beats
+                self._set_beats(_beats)
 
     @property
     def n_beats(self):
@@ -101,10 +289,12 @@ class Measure:
         """
         1-d numeric array containing figure of each time_units in Measure.
         """
-        beat_states = np.concatenate([b.state for b in self.beats])
-        state = np.empty(shape=(beat_states.size + 1,), dtype=np.int8)
-        state[0] = -2
-        state[1:] = beat_states
+        if self.is_view:
+            buffer, index = self._view()
+            return buffer.measure_state(index)
+
+        state = self._refresh_state().view()
+        state.flags.writeable = False
         return state
 
     @property
@@ -112,23 +302,39 @@ class Measure:
         """
         Same as `figure` array but without beat/measure flags.
         """
-        return np.concatenate([b.active_state for b in self.beats])
+        if self.is_view:
+            buffer, index = self._view()
+            return buffer.measure_active_state(index)
+        if not self._beats:
+            return np.empty(shape=(0,), dtype=np.int8)
+        return np.concatenate([b.active_state for b in self._beats])
 
     @property
     def subdivision_values(self) -> np.ndarray:
         """
         Returns a 1d array containing the subdivision of each `Beat` in the `Measure`.
         """
-        idx_sub_vals = np.where(self.state == -3)[0] + 1
-        sub_vals = self.state[idx_sub_vals]
-        return sub_vals
+        if self.is_view:
+            buffer, index = self._view()
+            return buffer.measure_sub_values(index)
+
+        if self._cache_sub_values is None:
+            state = self.state
+            idx_sub_vals = np.where(state == -3)[0] + 1
+            self._cache_sub_values = state[idx_sub_vals]
+        return self._cache_sub_values
 
     @property
     def n_note_on(self) -> int:
         """
         The number of "note_on" events in the Measure.
         """
-        return sum([b.n_note_on for b in self.beats])
+        if self.is_view:
+            return int(np.count_nonzero(self.active_state == 1))
+
+        if self._cache_n_note_on is None or self._has_view_beats:
+            self._cache_n_note_on = sum([b.n_note_on for b in self.beats])
+        return self._cache_n_note_on
 
     @property
     def is_active(self):
@@ -159,27 +365,32 @@ class Measure:
         self.beats = state
 
     def activate_random(self, density: float,
-                        random_seed: Optional[int] = None,
+                        random_seed: Optional[Union[int, np.random.Generator]] = None,
                         beat_idx: Sequence[int] = None):
+        """
+        Returns a new Measure with the same layout, where each TimeUnit is activated with probability `density`.
 
-        beats = deepcopy(self.beats)
+        All onsets are drawn in a single call to a numpy Generator.
 
-        _beats = []
-        with ctx_random_seed(random_seed):
-            if beat_idx is None:
-                beat_idx = list()
+        :param random_seed: Provide a random random_seed (or numpy Generator) for reproducibility.
+        :param beat_idx: If given, these beats are excluded and keep their current figure.
+        """
+        if density < 0 or density > 1:
+            msg = "`density` must be a float between 0 and 1."
+            raise ValueError(msg)
 
-            for i,beat in enumerate(beats):
-                if i not in beat_idx:
-                    choices = random.choices(population=[1,0],
-                                             weights=[density,1-density],
-                                             k=len(beat))
-                    _beat = Beat(choices)
-                else:
-                    _beat = beat
-                _beats.append(_beat)
+        sub_values = self.subdivision_values.astype(int)
+        rng = get_generator(random_seed)
+        choices = (rng.random(sub_values.sum()) < density).astype(np.int8)
 
-        _measure = Measure(_beats)
+        if beat_idx is not None:
+            beat_mask = np.zeros(shape=sub_values.shape, dtype=bool)
+            beat_mask[list(beat_idx)] = True
+            choices = np.where(np.repeat(beat_mask, sub_values), self.active_state, choices)
+
+        # splitting an empty array still gives one (empty) chunk
+        beat_states = np.split(choices, np.cumsum(sub_values)[:-1]) if sub_values.size > 0 else []
+        _measure = Measure._from_beats([Beat._from_active_state(s) for s in beat_states])
         return _measure
 
     def sustain_all(self, beat_idx: Optional[Collection[int]] = None):
@@ -223,18 +434,36 @@ class Measure:
 
     def get_complement(self,
                        adherence: float = 1.0,
-                       random_seed: Optional[int] = None,
-                       beat_idx:Optional[Sequence[int]] = None) -> Beat():
-
-        raise NotImplementedError()
+                       random_seed: Optional[Union[int, np.random.Generator]] = None,
+                       beat_idx: Optional[Sequence[int]] = None) -> Measure:
+        """
+        Returns a new Measure which is the complement of "attack" (see `Beat.get_complement`), computed over the
+        whole Measure at once.
 
+        :param adherence: probability with which each TimeUnit is toggled. Otherwise, it keeps its figure.
+        :param random_seed: Provide a random random_seed (or numpy Generator) for reproducibility.
+        :param beat_idx: If given, only these beats are complemented. Other beats keep their figure.
+        """
         if adherence > 1 or adherence < 0:
             msg = "`adherence` must be a float between 0 and 1."
             raise ValueError(msg)
 
+        sub_values = self.subdivision_values.astype(int)
+        rng = get_generator(random_seed)
+        toggle = rng.random(sub_values.sum()) < adherence
+
         if beat_idx is not None:
-            e = "Implement beat indexing!"
-            raise NotImplementedError(e)
+            beat_mask = np.zeros(shape=sub_values.shape, dtype=bool)
+            beat_mask[list(beat_idx)] = True
+            toggle &= np.repeat(beat_mask, sub_values)
+
+        active_state = self.active_state
+        _complement = np.where(toggle, np.where(active_state == 1, 0, 1), active_state).astype(np.int8)
+
+        # splitting an empty array still gives one (empty) chunk
+        beat_states = np.split(_complement, np.cumsum(sub_values)[:-1]) if sub_values.size > 0 else []
+        _measure = Measure._from_beats([Beat._from_active_state(s) for s in beat_states])
+        return _measure
 
     #### MAGIC METHODS ####
 
@@ -242,14 +471,52 @@ class Measure:
         return MeasureIterator(self)
 
     def __getitem__(self, item: int) -> Beat:
+        if self.is_view:
+            buffer, index = self._view()
+            return buffer.beat(buffer.measure_beat_range(index)[item])
         return self.beats[item]
 
+    def copy(self) -> Measure:
+        """
+        Returns a copy-on-write copy of the Measure. Its Beats share their figures with the original Beats until
+        either one is mutated.
+        """
+        return Measure._from_beats([b.copy() for b in self.beats], verbose=self.verbose)
+
     def __mul__(self,number: int) -> list:
-        return [deepcopy(self) for _ in range(number)]
+        return [self.copy() for _ in range(number)]
 
     def __len__(self):
+        if self.is_view:
+            buffer, index = self._view()
+            return len(buffer.measure_beat_range(index))
         return len(self.beats)
 
+    def __eq__(self, other):
+        if not isinstance(other, Measure):
+            return NotImplemented
+        return np.array_equal(self.state, other.state)
+
+    def __hash__(self):
+        # content hash of the figure: mutating a Measure changes its hash
+        return hash(self.state.tobytes())
+
+    def __deepcopy__(self, memo):
+        # a copy never aliases the original, so copies of views are standalone
+        return Measure._from_beats([deepcopy(b, memo) for b in self.beats], verbose=self.verbose)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_owners"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._buffer is None:
+            self._clear_cache()
+            for b in self._beats:
+                b._register_owner(self)
+
     def __repr__(self):
         r = "Measure("
         beat_strs = [str(b.active_state) for b in self.beats]
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.part_buffer import PartBuffer
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+
+MotifLike = Union[Beat, Measure, Part, Sequence[Beat]]
+
+
+def motif_layout(motif: MotifLike) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the TimeUnit values and the subdivision of each Beat of `motif`.
+    """
+    if isinstance(motif, Beat):
+        active_state, sub_values = np.array(motif.active_state), np.array([motif.subdivision])
+    elif isinstance(motif, Measure):
+        active_state, sub_values = np.array(motif.active_state), np.array(motif.subdivision_values, dtype=int)
+    elif isinstance(motif, Part):
+        buffer = motif._as_buffer()
+        active_state, sub_values = buffer.active_state, buffer.sub_values
+    elif all(isinstance(b, Beat) for b in motif):
+        active_state = np.array([v for b in motif for v in b.active_state], dtype=np.int8)
+        sub_values = np.array([b.subdivision for b in motif], dtype=int)
+    else:
+        msg = "`motif` must be a Beat, Measure, Part, or a sequence of Beats."
+        raise TypeError(msg)
+
+    if sub_values.size == 0:
+        msg = "`motif` must contain at least one Beat."
+        raise ValueError(msg)
+    return active_state, sub_values
+
+
+def _candidate_beats(sub_values: np.ndarray, motif_sub_values: np.ndarray) -> np.ndarray:
+    """
+    Index of every Beat which starts a run of Beats with the subdivisions of the motif.
+    """
+    k = motif_sub_values.size
+    if sub_values.size < k:
+        return np.empty(shape=(0,), dtype=int)
+    return np.flatnonzero(np.all(sliding_window_view(sub_values, k) == motif_sub_values, axis=1))
+
+
+def find_motif(part: Part, motif: MotifLike) -> np.ndarray:
+    """
+    Returns the index of the first Beat of every occurrence of `motif` in `part`, in ascending order. Beats are
+    indexed across the whole Part (see `PartBuffer.measure_beats` to map them to measures).
+
+    A motif is a sequence of consecutive Beats, ie. a subdivision per Beat and a value per TimeUnit. An occurrence
+    is a run of consecutive Beats (possibly spanning measures) with the same subdivisions and values. Candidates are
+    located by comparing strided windows of the Part's subdivisions to the motif's, and only those candidates are
+    compared to the motif's values.
+    """
+    motif_active, motif_sub = motif_layout(motif)
+    buffer = part._as_buffer()
+
+    candidates = _candidate_beats(buffer.sub_values, motif_sub)
+    if candidates.size == 0:
+        return candidates
+    unit_windows = sliding_window_view(buffer.active_state, motif_active.size)
+    match = np.all(unit_windows[buffer.unit_offsets[candidates]] == motif_active, axis=1)
+    return candidates[match]
+
+
+def find_motif_batch(parts: Union[Sequence[Part], RhythmEnsemble],
+                     motif: MotifLike) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds every occurrence of `motif` in a batch of Parts at once.
+
+    Returns two arrays: the index of the Part, and the index of the first Beat (within that Part) of every
+    occurrence, sorted by Part then Beat.
+
+    The Parts of a `RhythmEnsemble` share their layout, so candidates are only located once. Otherwise, the Parts
+    are concatenated, and windows spanning two Parts are discarded.
+    """
+    motif_active, motif_sub = motif_layout(motif)
+
+    if isinstance(parts, RhythmEnsemble):
+        layout = parts.layout
+        candidates = _candidate_beats(layout.sub_values, motif_sub)
+        if candidates.size == 0:
+            return np.empty(shape=(0,), dtype=int), candidates
+        unit_windows = sliding_window_view(parts.active_states, motif_active.size, axis=1)
+        match = np.all(unit_windows[:, layout.unit_offsets[candidates]] == motif_active, axis=2)
+        part_idx, candidate_idx = np.nonzero(match)
+        return part_idx, candidates[candidate_idx]
+
+    buffers: List[PartBuffer] = [p._as_buffer() for p in parts]
+    if not buffers:
+        return np.empty(shape=(0,), dtype=int), np.empty(shape=(0,), dtype=int)
+
+    n_beats = np.array([b.n_beats for b in buffers])
+    first_beats = np.zeros(shape=(n_beats.size,), dtype=int)
+    np.cumsum(n_beats[:-1], out=first_beats[1:])
+    sub_values = np.concatenate([b.sub_values for b in buffers])
+    active_state = np.concatenate([b.active_state for b in buffers])
+    beat_parts = np.repeat(np.arange(n_beats.size), n_beats)
+
+    unit_offsets = np.zeros(shape=(sub_values.size + 1,), dtype=int)
+    np.cumsum(sub_values, out=unit_offsets[1:])
+
+    candidates = _candidate_beats(sub_values, motif_sub)
+    candidates = candidates[beat_parts[candidates] == beat_parts[candidates + motif_sub.size - 1]]
+    if candidates.size == 0:
+        return np.empty(shape=(0,), dtype=int), candidates
+
+    unit_windows = sliding_window_view(active_state, motif_active.size)
+    candidates = candidates[np.all(unit_windows[unit_offsets[candidates]] == motif_active, axis=1)]
+    part_idx = beat_parts[candidates]
+    return part_idx, candidates - first_beats[part_idx]
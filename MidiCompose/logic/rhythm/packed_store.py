@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Union, Iterable
+
+import numpy as np
+
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.part_buffer import PartBuffer
+
+_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+
+def pack_units(active_state: np.ndarray) -> np.ndarray:
+    """
+    Pack TimeUnit values (0, 1 or 2) into bytes, 4 per byte. `active_state.size` must be a multiple of 4.
+    """
+    units = active_state.reshape(-1, 4).astype(np.uint8)
+    return np.bitwise_or.reduce(units << _SHIFTS, axis=1)
+
+
+def unpack_units(packed: np.ndarray) -> np.ndarray:
+    """
+    Inverse of `pack_units`. Returns 4 TimeUnit values per byte of `packed`.
+    """
+    return ((packed[:, None] >> _SHIFTS) & 3).reshape(-1).astype(np.int8)
+
+
+class PackedRhythmStoreIterator:
+
+    def __init__(self, store):
+        self._Store = store
+        self._index = 0
+        self._len_Store = len(self._Store)
+
+    def __next__(self) -> Part:
+        if self._index < self._len_Store:
+            result = self._Store[self._index]
+            self._index += 1
+            return result
+        else:
+            raise StopIteration
+
+
+class PackedRhythmStore:
+    """
+    Compact in-memory storage for the figures of many Parts.
+
+    TimeUnit values only need 2 bits, so they are packed 4 per byte in `packed`. The layout of the Parts
+    (measures, beats and subdivisions) is kept separately, once per distinct layout, in `layouts`: a PartBuffer
+    whose TimeUnits are all 0.
+
+    The values of each Part start on a byte boundary, so a single Part is unpacked without touching the others:
+        - `layout_ids`: index into `layouts` of the layout of each Part.
+        - `byte_offsets`: index within `packed` of the first byte of each Part, followed by the total number of
+          bytes.
+
+    Parts are returned as buffered Parts, unpacked on access.
+    """
+
+    def __init__(self):
+        self.layouts: List[PartBuffer] = []
+        self._layout_keys: Dict[bytes, int] = dict()
+
+        self.layout_ids: np.ndarray = np.empty(shape=(0,), dtype=np.int32)
+        self.byte_offsets: np.ndarray = np.zeros(shape=(1,), dtype=np.int64)
+        self.packed: np.ndarray = np.empty(shape=(0,), dtype=np.uint8)
+
+    @classmethod
+    def from_parts(cls, parts: Iterable[Part]) -> PackedRhythmStore:
+        store = cls()
+        store.extend(parts)
+        return store
+
+    @classmethod
+    def from_states(cls,
+                    states: Union[np.ndarray, Sequence[Union[np.ndarray, Sequence[int]]]],
+                    validate: bool = True) -> PackedRhythmStore:
+        """
+        Returns a store of the given flagged figures, which are parsed in one pass (see `PartBuffer.from_states`).
+        """
+        store = cls()
+        store._extend_buffers(PartBuffer.from_states(states, validate=validate))
+        return store
+
+    @classmethod
+    def from_ensemble(cls, ensemble) -> PackedRhythmStore:
+        """
+        Returns a store of every Part of a `RhythmEnsemble`. Since all Parts share one layout, every row is packed at
+        once.
+        """
+        store = cls()
+        layout_id = store._get_layout_id(ensemble.layout)
+        active_states = ensemble.active_states
+        n_parts, n_units = active_states.shape
+        store._append(layout_ids=np.full(shape=(n_parts,), fill_value=layout_id),
+                      active_state=active_states.reshape(-1),
+                      n_units=np.full(shape=(n_parts,), fill_value=n_units))
+        return store
+
+    #### PACKING ####
+
+    def _get_layout_id(self, buffer: PartBuffer) -> int:
+        layout = buffer.data.copy()
+        layout[buffer.unit_index] = 0
+        key = layout.tobytes()
+        layout_id = self._layout_keys.get(key)
+        if layout_id is None:
+            layout_id = len(self.layouts)
+            self._layout_keys[key] = layout_id
+            self.layouts.append(buffer.with_data(layout))
+        return layout_id
+
+    def _append(self,
+                layout_ids: np.ndarray,
+                active_state: np.ndarray,
+                n_units: np.ndarray):
+        """
+        Pack the concatenated TimeUnit values of several Parts, padding each Part to a whole number of bytes.
+        """
+        n_bytes = (n_units + 3) // 4
+        byte_offsets = np.zeros(shape=(n_bytes.size + 1,), dtype=np.int64)
+        np.cumsum(n_bytes, out=byte_offsets[1:])
+        unit_offsets = np.zeros(shape=(n_units.size + 1,), dtype=np.int64)
+        np.cumsum(n_units, out=unit_offsets[1:])
+
+        padded = np.zeros(shape=(4 * byte_offsets[-1],), dtype=np.int8)
+        padded[np.repeat(4 * byte_offsets[:-1] - unit_offsets[:-1], n_units) + np.arange(unit_offsets[-1])] = \
+            active_state
+
+        self.packed = np.concatenate([self.packed, pack_units(padded)])
+        self.byte_offsets = np.concatenate([self.byte_offsets, self.byte_offsets[-1] + byte_offsets[1:]])
+        self.layout_ids = np.concatenate([self.layout_ids, layout_ids.astype(np.int32)])
+
+    def _extend_buffers(self, buffers: List[PartBuffer]):
+        if not buffers:
+            return
+        layout_ids = np.array([self._get_layout_id(b) for b in buffers])
+        active_states = [b.active_state for b in buffers]
+        self._append(layout_ids=layout_ids,
+                     active_state=np.concatenate(active_states),
+                     n_units=np.array([a.size for a in active_states]))
+
+    def extend(self, parts: Iterable[Part]):
+        """
+        Pack several Parts at once. Prefer this to repeated calls to `append`, which copy `packed` every time.
+        """
+        buffers = [p._as_buffer().bounded() for p in parts]
+        self._extend_buffers(buffers)
+
+    def append(self, part: Part):
+        self.extend([part])
+
+    #### ACCESS ####
+
+    def _check_index(self, item: int) -> int:
+        try:
+            return range(len(self))[item]
+        except IndexError:
+            msg = f"Part index {item} out of range for PackedRhythmStore with {len(self)} Parts."
+            raise IndexError(msg) from None
+
+    def layout(self, item: int) -> PartBuffer:
+        return self.layouts[self.layout_ids[self._check_index(item)]]
+
+    def active_state(self, item: int) -> np.ndarray:
+        """
+        TimeUnit values of the `item`-th Part.
+        """
+        item = self._check_index(item)
+        layout = self.layouts[self.layout_ids[item]]
+        packed = self.packed[self.byte_offsets[item]:self.byte_offsets[item + 1]]
+        return unpack_units(packed)[:layout.n_time_units]
+
+    def state(self, item: int) -> np.ndarray:
+        """
+        Flagged figure of the `item`-th Part (same layout as `Part.state`).
+        """
+        layout = self.layout(item)
+        state = layout.data.copy()
+        state[layout.unit_index] = self.active_state(item)
+        return state
+
+    def states(self, items: Sequence[int]) -> List[np.ndarray]:
+        """
+        Flagged figures of several Parts. The bytes of all Parts are gathered and unpacked in a single call.
+        """
+        indices = np.array([self._check_index(i) for i in items], dtype=np.int64)
+        starts = self.byte_offsets[indices]
+        n_bytes = self.byte_offsets[indices + 1] - starts
+        gathered = np.zeros(shape=(n_bytes.size + 1,), dtype=np.int64)
+        np.cumsum(n_bytes, out=gathered[1:])
+
+        units = unpack_units(self.packed[np.repeat(starts - gathered[:-1], n_bytes) + np.arange(gathered[-1])])
+
+        states = []
+        for i, item in enumerate(indices):
+            layout = self.layouts[self.layout_ids[item]]
+            state = layout.data.copy()
+            state[layout.unit_index] = units[4 * gathered[i]:4 * gathered[i] + layout.n_time_units]
+            states.append(state)
+        return states
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the packed values and offset arrays (excluding layouts).
+        """
+        return self.packed.nbytes + self.byte_offsets.nbytes + self.layout_ids.nbytes
+
+    #### MAGIC METHODS ####
+
+    def __getitem__(self, item: int) -> Part:
+        return Part.from_buffer(self.layout(item).with_data(self.state(item)))
+
+    def __iter__(self):
+        return PackedRhythmStoreIterator(self)
+
+    def __len__(self):
+        return self.layout_ids.size
+
+    def __repr__(self):
+        return f"PackedRhythmStore(n_parts={len(self)}, n_layouts={len(self.layouts)}, nbytes={self.nbytes})"
@@ -1,16 +1,14 @@
 from __future__ import annotations
 
 from copy import deepcopy
-from typing import Collection, Optional, List, Sequence
-import random
+from typing import Collection, Optional, List, Sequence, Dict, Union, overload
 
 import numpy as np
-from icecream import ic
 
 from MidiCompose.logic.rhythm.measure import Measure
-from MidiCompose.logic.rhythm.measure import Beat
+from MidiCompose.logic.rhythm.part_buffer import PartBuffer
 
-from MidiCompose.utilities import ctx_random_seed
+from MidiCompose.utilities import get_generator
 
 
 class PartIterator:
@@ -22,7 +20,7 @@ class PartIterator:
 
     def __next__(self) -> Measure:
         if self._index < self._len_Part:
-            result = self._Part.measures[self._index]
+            result = self._Part[self._index]
             self._index += 1
             return result
         else:
@@ -32,46 +30,209 @@ class PartIterator:
 class Part:
     """
     Container for Measures
+
+    By default, a Part holds a list of Measure objects. A buffered Part (`buffered=True`) instead owns a single
+    contiguous figure array (see `PartBuffer`), and the Measures, Beats and TimeUnits it returns are lightweight
+    views into that array. Buffered Parts are much cheaper to store and their `state` is returned without
+    concatenation.
+
+    Otherwise, `state` and `n_note_on` are cached, and mutating a contained Measure (or any of its Beats) only
+    refreshes that Measure's slice of the cached figure.
+
+    Parts are equal (and hash equally) if their figures are equal, regardless of whether they are buffered.
     """
 
-    def __init__(self, measures: Optional[Collection[Measure]] = None):
+    def __init__(self,
+                 measures: Optional[Collection[Measure]] = None,
+                 buffered: bool = False):
+        self._buffer: Optional[PartBuffer] = PartBuffer.from_measures([]) if buffered else None
+        self._measures: List[Measure] = []
+        self._has_views: bool = False  # True if any Measure is (or contains) a view into a PartBuffer
+        self._clear_cache()
         self.measures = measures
 
+    @classmethod
+    def from_buffer(cls, buffer: PartBuffer) -> Part:
+        """
+        Returns a buffered Part backed by `buffer` (not copied).
+        """
+        part = cls.__new__(cls)
+        part._buffer = buffer
+        part._measures = []
+        part._has_views = False
+        part._clear_cache()
+        return part
+
+    @classmethod
+    def from_state(cls,
+                   state: Union[np.ndarray, Sequence[int]],
+                   validate: bool = True) -> Part:
+        """
+        Returns a buffered Part parsed from its flagged figure (ie. the output of `Part.state`).
+
+        Flags are located with vectorized index arithmetic, so no Measure, Beat or TimeUnit objects are built.
+
+        :param validate: If True, raises ValueError if `state` isn't a valid figure.
+        """
+        return cls.from_buffer(PartBuffer.from_state(state, validate=validate))
+
+    @classmethod
+    def from_states(cls,
+                    states: Union[np.ndarray, Sequence[Union[np.ndarray, Sequence[int]]]],
+                    validate: bool = True) -> List[Part]:
+        """
+        Returns a list of buffered Parts parsed from a batch of flagged figures in one pass.
+
+        `states` is either a sequence of figures (of any length), or a 2d array whose rows share the same layout.
+        """
+        return [cls.from_buffer(buffer) for buffer in PartBuffer.from_states(states, validate=validate)]
+
+    #### CACHE ####
+
+    def _clear_cache(self):
+        self._cache_state: Optional[np.ndarray] = None
+        self._cache_positions: Dict[int, List[int]] = dict()  # id(measure) -> offsets of measure in cached figure
+        self._cache_views: List[int] = list()  # offsets of Measures which are (or contain) views into a PartBuffer
+        self._dirty_measures: Dict[int, Measure] = dict()
+        self._cache_n_note_on: Optional[int] = None
+
+    def _set_measures(self, measures: List[Measure]):
+        for m in self._measures:
+            m._unregister_owner(self)
+        for m in measures:
+            m._register_owner(self)
+        self._measures = measures
+        self._has_views = any([m.has_views for m in measures])
+        self._clear_cache()
+
+    def _measure_changed(self, measure: Measure, layout_changed: bool):
+        """
+        Called by a contained Measure after it (or one of its Beats) is mutated.
+        """
+        if layout_changed:
+            self._has_views = any([m.has_views for m in self._measures])
+            self._clear_cache()
+        elif self._cache_state is not None:
+            self._dirty_measures[id(measure)] = measure
+        self._cache_n_note_on = None
+
+    def _refresh_state(self) -> np.ndarray:
+        """
+        Rebuild the cached figure if the layout changed, otherwise copy only the slices of mutated Measures.
+        """
+        if self._cache_state is None:
+            measure_states = [m.state for m in self._measures]
+            size = 2 + sum([m_state.size for m_state in measure_states])
+            state = np.empty(shape=(size,), dtype=np.int8)
+            state[0], state[-1] = -1, -1
+            offset = 1
+            for m, m_state in zip(self._measures, measure_states):
+                state[offset:offset + m_state.size] = m_state
+                if m.has_views:
+                    self._cache_views.append(offset)
+                else:
+                    self._cache_positions.setdefault(id(m), []).append(offset)
+                offset += m_state.size
+            self._cache_state = state
+            self._dirty_measures = dict()
+
+        else:
+            for measure_id, m in self._dirty_measures.items():
+                m_state = m.state  # only refreshes the measure's dirty beats
+                for offset in self._cache_positions.get(measure_id, []):
+                    self._cache_state[offset:offset + m_state.size] = m_state
+            self._dirty_measures = dict()
+
+            # views into a PartBuffer can't notify their owners
+            if self._cache_views:
+                views = [m for m in self._measures if m.has_views]
+                for offset, m in zip(self._cache_views, views):
+                    m_state = m.state
+                    self._cache_state[offset:offset + m_state.size] = m_state
+
+        return self._cache_state
+
+    @property
+    def is_buffered(self) -> bool:
+        return self._buffer is not None
+
+    @property
+    def buffer(self) -> Optional[PartBuffer]:
+        return self._buffer
+
+    def _as_buffer(self) -> PartBuffer:
+        """
+        Returns the buffer of a buffered Part, otherwise a new PartBuffer holding a copy of its figure.
+        """
+        if self._buffer is not None:
+            return self._buffer
+        return PartBuffer(np.array(self.state, dtype=np.int8))
+
+    def to_buffered(self) -> Part:
+        """
+        Returns a buffered copy of the Part.
+        """
+        return Part.from_buffer(PartBuffer(np.array(self.state, dtype=np.int8)))
+
     @property
     def measures(self) -> List[Measure]:
+        if self._buffer is not None:
+            return [self._buffer.measure(i) for i in range(self._buffer.n_measures)]
         return self._measures
 
     @measures.setter
     def measures(self, value):
 
         if value is None:  # initialize empty part
-            self._measures = []
+            _measures = []
+        else:
+            _measures = [measure for measure in value]
+
+        if self._buffer is not None:
+            self._buffer = PartBuffer.from_measures(_measures)
         else:
-            self._measures = [measure for measure in value]
+            self._set_measures(_measures)
 
     @property
     def state(self):
-        measure_states = np.concatenate([m.state for m in self.measures])
-        state = np.empty(shape=(measure_states.size + 2,), dtype=np.int8)
-        state[0], state[-1] = -1, -1
-        state[1:-1] = measure_states
+        if self._buffer is not None:
+            return self._buffer.state
+
+        state = self._refresh_state().view()
+        state.flags.writeable = False
         return state
 
     @property
     def n_note_on(self) -> int:
-        return sum([m.n_note_on for m in self.measures])
+        if self._buffer is not None:
+            return int(np.count_nonzero(self._buffer.active_state == 1))
+
+        if self._cache_n_note_on is None or self._has_views:
+            self._cache_n_note_on = sum([m.n_note_on for m in self.measures])
+        return self._cache_n_note_on
 
     @property
     def n_measures(self) -> int:
+        if self._buffer is not None:
+            return self._buffer.n_measures
         return len(self.measures)
 
     @property
     def n_beats(self) -> int:
+        if self._buffer is not None:
+            return self._buffer.n_beats
         return sum([m.n_beats for m in self.measures])
 
     @property
-    def active_state(self):
-        pass
+    def active_state(self) -> np.ndarray:
+        """
+        Same as `state` array but without part/measure/beat flags.
+        """
+        if self._buffer is not None:
+            return self._buffer.active_state
+        if not self._measures:
+            return np.empty(shape=(0,), dtype=np.int8)
+        return np.concatenate([m.active_state for m in self._measures])
 
     #### UTILITY METHODS ####
     def append_measure(self, measure: Measure):
@@ -80,72 +241,146 @@ class Part:
             e = "`measure` must be a Measure instance."
             raise TypeError(e)
 
-        self.measures.append(measure)
+        if self._buffer is not None:  # reallocates -- existing views keep pointing at the previous buffer
+            self._buffer = self._buffer.appended(measure)
+        else:
+            self._set_measures(self._measures + [measure])
         return self
 
     def activate_random(self,
                         density: float,
-                        random_seed: int = None,
+                        random_seed: Optional[Union[int, np.random.Generator]] = None,
                         measure_idx: Sequence[int] = None) -> Part:
+        """
+        Returns a new buffered Part with the same layout, where each TimeUnit is activated with probability
+        `density`.
 
-        if measure_idx is None:
-            measure_idx = list()
-
-        _measures = []
-        with ctx_random_seed(seed=random_seed):
-            for i, measure in enumerate(self.measures):
-                if i in measure_idx:
-                    _measure = measure
-                else:
-                    _n_beats = measure.n_beats
-                    _sub_values = list(measure.subdivision_values)
-                    ic(_sub_values)
-
-                    choices = random.choices([1,0],
-                                             weights=[density,1-density],
-                                             k=sum(_sub_values))
-                    ic(choices)
-
-                    _beats = []
-                    idx = 0
-                    for sub_val in _sub_values:
-                        _beats.append(Beat(choices[idx:sub_val+1]))
-                        idx += sub_val
-                    _measure = Measure(_beats)
-                _measures.append(_measure)
-
-        return Part(_measures)
-
+        Every onset of the Part is drawn in a single call to a numpy Generator and written straight into the new
+        Part's buffer.
 
+        :param random_seed: Provide a random random_seed (or numpy Generator) for reproducibility.
+        :param measure_idx: If given, these measures are excluded and keep their current figure.
+        """
+        if density < 0 or density > 1:
+            msg = "`density` must be a float between 0 and 1."
+            raise ValueError(msg)
 
+        buffer = PartBuffer(np.array(self.state, dtype=np.int8))
+        buffer.activate_random(density=density,
+                               rng=get_generator(random_seed),
+                               measure_idx=measure_idx)
 
+        return Part.from_buffer(buffer)
 
+    #### GENERATOR METHODS ####
 
+    def get_complement(self,
+                       adherence: float = 1.0,
+                       random_seed: Optional[Union[int, np.random.Generator]] = None,
+                       measure_idx: Optional[Sequence[int]] = None) -> Part:
+        """
+        Returns a new buffered Part which is the complement of "attack" (see `Beat.get_complement`).
 
+        The whole figure is complemented in one pass over the Part's buffer, with the adherence of every TimeUnit
+        drawn in a single call to a numpy Generator.
 
-    #### GENERATOR METHODS ####
+        :param adherence: probability with which each TimeUnit is toggled. Otherwise, it keeps its figure.
+        :param random_seed: Provide a random random_seed (or numpy Generator) for reproducibility.
+        :param measure_idx: If given, only these measures are complemented. Other measures keep their figure.
+        """
+        if adherence > 1 or adherence < 0:
+            msg = "`adherence` must be a float between 0 and 1."
+            raise ValueError(msg)
 
-    def get_complement(self, measure_idx: Optional[Sequence[int]] = None):
+        buffer = PartBuffer(np.array(self.state, dtype=np.int8))
+        buffer.complement(adherence=adherence,
+                          rng=get_generator(random_seed),
+                          measure_idx=measure_idx)
 
-        if measure_idx is not None:
-            e = "Implement measure indexing!"
-            raise NotImplementedError(e)
-        _measures = self._measures
-        complement = Part([m.get_complement() for m in _measures])
-        return complement
+        return Part.from_buffer(buffer)
 
     #### MAGIC METHODS ####
     def __iter__(self):
         return PartIterator(self)
 
-    def __getitem__(self, item: int) -> Measure:
-        return self.measures[item]
+    @overload
+    def __getitem__(self, item: int) -> Measure: ...
+
+    @overload
+    def __getitem__(self, item: slice) -> Part: ...
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Measure, Part]:
+        """
+        An integer gives a single Measure. A slice gives a Part which shares its figure with this Part: a window into
+        the buffer of a buffered Part, otherwise a Part containing the same Measure objects.
+        """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.n_measures)
+            if self._buffer is not None and step == 1:
+                return Part.from_buffer(self._buffer.window(start, max(start, stop)))
+            return Part([self._measure(i) for i in range(start, stop, step)])
+        return self._measure(item)
+
+    def _measure(self, measure_idx: int) -> Measure:
+        if self._buffer is not None:
+            return self._buffer.measure(range(self._buffer.n_measures)[measure_idx])
+        return self._measures[measure_idx]
 
     def __len__(self):
-        return len(self.measures)
+        return self.n_measures
+
+    def __eq__(self, other):
+        if not isinstance(other, Part):
+            return NotImplemented
+        return np.array_equal(self.state, other.state)
+
+    def __hash__(self):
+        # content hash of the figure: mutating a Part changes its hash
+        return hash(self.state.tobytes())
+
+    def copy(self) -> Part:
+        """
+        Returns a copy-on-write copy of the Part, which shares its figure with the original until either one is
+        mutated.
+        """
+        if self._buffer is not None:
+            return Part.from_buffer(self._buffer.copy_on_write())
+        return Part([m.copy() for m in self.measures])
+
+    @classmethod
+    def concat(cls, parts: Collection[Part]) -> Part:
+        """
+        Returns an unbuffered Part containing the Measures of every Part of `parts`, in order.
+
+        Nothing is copied: the Measures of buffered Parts are views into their buffers, and the Measures of
+        unbuffered Parts are shared, so mutating either is reflected in the concatenation.
+        """
+        return cls([m for p in parts for m in p.measures])
+
+    def __add__(self, other: Part) -> Part:
+        if not isinstance(other, Part):
+            return NotImplemented
+        return Part.concat([self, other])
 
     def __mul__(self, other: int):
-        return [deepcopy(self) for _ in range(other)]
+        return [self.copy() for _ in range(other)]
+
+    def __deepcopy__(self, memo):
+        if self._buffer is not None:
+            return Part.from_buffer(self._buffer.copy())
+        return Part([deepcopy(m, memo) for m in self.measures])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache_state"] = None
+        state["_dirty_measures"] = dict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._clear_cache()
+        for m in self._measures:
+            m._register_owner(self)
 
     def __repr__(self):
 
@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+from typing import Collection, Optional, Sequence, List, Union
+
+import numpy as np
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+
+
+class PartBuffer:
+    """
+    Contiguous storage for the figure of a buffered `Part`.
+
+    `data` is the flagged figure of the whole Part (same layout as `Part.state`), so the figure of every Measure
+    and Beat is a contiguous slice of it. Measures and Beats taken from a buffered Part are lightweight views
+    which read from and write to `data`.
+
+    Layout of `data` is fixed for the lifetime of the buffer, and is described by the offset arrays:
+        - `measure_offsets`: index of each measure flag (-2), followed by the index of the closing part flag (-1).
+        - `beat_offsets`: index of each subdivision flag (-3).
+        - `measure_beats`: index of the first Beat of each Measure, followed by the total number of Beats.
+        - `sub_values`: subdivision of each Beat.
+        - `unit_offsets`: index of the first TimeUnit of each Beat within the active figure, followed by the total
+          number of TimeUnits.
+
+    Buffers created with `copy_on_write()` share `data` until one of them is written to. A range of measures is
+    viewed without copying with `window()` (see `PartBufferWindow`).
+    """
+
+    def __init__(self, data: np.ndarray):
+        """
+        :param data: flagged figure array of a Part. Not copied, nor validated (see `from_state`).
+        """
+        self._set_layout(data,
+                         idx_measure_flags=np.flatnonzero(data == -2),
+                         idx_beat_flags=np.flatnonzero(data == -3))
+
+    def _set_layout(self,
+                    data: np.ndarray,
+                    idx_measure_flags: np.ndarray,
+                    idx_beat_flags: np.ndarray):
+        self._data: np.ndarray = data
+        self._shared: bool = False  # True if `data` may be shared with a copy-on-write copy
+        self._bounded: bool = True  # False if `data` doesn't include the part flags (see `PartBufferWindow`)
+
+        self.measure_offsets: np.ndarray = np.append(idx_measure_flags, data.size - 1)
+        self.beat_offsets: np.ndarray = idx_beat_flags
+        self.measure_beats: np.ndarray = np.searchsorted(idx_beat_flags, self.measure_offsets)
+        self.sub_values: np.ndarray = data[idx_beat_flags + 1].astype(int)
+
+        self.unit_offsets: np.ndarray = np.zeros(shape=(self.sub_values.size + 1,), dtype=int)
+        np.cumsum(self.sub_values, out=self.unit_offsets[1:])
+
+        self._unit_index: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_state(cls,
+                   state: Union[np.ndarray, Sequence[int]],
+                   validate: bool = True,
+                   copy: bool = True) -> PartBuffer:
+        """
+        Parse the flagged figure of a Part.
+
+        :param validate: If True, raises ValueError if `state` isn't a valid figure. Validation is vectorized.
+        :param copy: If False and `state` already is an int8 array, the buffer is backed by `state` itself.
+        """
+        data = np.array(state, dtype=np.int8, copy=copy)
+        if validate:
+            validate_states(data, np.array([0, data.size]))
+        return cls(data)
+
+    @classmethod
+    def from_states(cls,
+                    states: Union[np.ndarray, Sequence[Union[np.ndarray, Sequence[int]]]],
+                    validate: bool = True) -> List[PartBuffer]:
+        """
+        Parse a batch of flagged figures in one pass.
+
+        If `states` is a 2d array, every row must share the same layout, and the returned buffers share their
+        offset arrays. Otherwise, `states` is concatenated and all flags are located at once, then split by Part.
+        """
+        if isinstance(states, np.ndarray) and states.ndim == 2:
+            data = np.array(states, dtype=np.int8)
+            layout = cls.from_state(data[0], validate=validate, copy=False)
+            if validate:
+                layout.validate_batch(data)
+            return [layout.with_data(row) for row in data]
+
+        sizes = np.array([len(s) for s in states], dtype=int)
+        bounds = np.zeros(shape=(sizes.size + 1,), dtype=int)
+        np.cumsum(sizes, out=bounds[1:])
+        data = np.concatenate([np.asarray(s, dtype=np.int8) for s in states]) if len(sizes) else np.empty(0, np.int8)
+        if validate:
+            validate_states(data, bounds)
+
+        idx_measure_flags = np.flatnonzero(data == -2)
+        idx_beat_flags = np.flatnonzero(data == -3)
+        split_measures = np.searchsorted(idx_measure_flags, bounds)
+        split_beats = np.searchsorted(idx_beat_flags, bounds)
+
+        buffers = []
+        for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            buffer = cls.__new__(cls)
+            buffer._set_layout(data[start:stop],
+                               idx_measure_flags=idx_measure_flags[split_measures[i]:split_measures[i + 1]] - start,
+                               idx_beat_flags=idx_beat_flags[split_beats[i]:split_beats[i + 1]] - start)
+            buffers.append(buffer)
+        return buffers
+
+    def validate_batch(self, states: np.ndarray):
+        """
+        Raises ValueError unless every row of the 2d array `states` has the same layout as this buffer, and only
+        contains valid TimeUnit values.
+        """
+        if states.ndim != 2 or states.shape[1] != self.data.size:
+            msg = "Every figure in `states` must have the same layout."
+            raise ValueError(msg)
+        layout_mask = np.ones(shape=(self.data.size,), dtype=bool)
+        layout_mask[self.unit_index] = False
+        if np.any(states[:, layout_mask] != self.data[layout_mask]):
+            msg = "Every figure in `states` must have the same layout."
+            raise ValueError(msg)
+        active_states = states[:, self.unit_index]
+        if np.any((active_states < 0) | (active_states > 2)):
+            msg = "TimeUnit values must be in {0, 1, 2}."
+            raise ValueError(msg)
+
+    def with_data(self, data: np.ndarray) -> PartBuffer:
+        """
+        Returns a PartBuffer backed by `data` which shares this buffer's layout (offset arrays), skipping the
+        parsing step. `data` must have the same layout as `self.data`.
+        """
+        buffer = PartBuffer.__new__(PartBuffer)
+        buffer.__dict__.update(self.__dict__)
+        buffer.data = data
+        buffer._shared = False
+        return buffer
+
+    @classmethod
+    def from_measures(cls, measures: Collection[Measure]) -> PartBuffer:
+        data = np.concatenate([[-1]] + [m.state for m in measures] + [[-1]]).astype(np.int8)
+        return cls(data)
+
+    #### LAYOUT ####
+
+    @property
+    def n_measures(self) -> int:
+        return self.measure_offsets.size - 1
+
+    @property
+    def n_beats(self) -> int:
+        return self.sub_values.size
+
+    @property
+    def n_time_units(self) -> int:
+        return int(self.unit_offsets[-1])
+
+    @property
+    def unit_index(self) -> np.ndarray:
+        """
+        Index within `data` of every TimeUnit.
+        """
+        if self._unit_index is None:
+            first_unit = self.beat_offsets + 2
+            self._unit_index = np.repeat(first_unit - self.unit_offsets[:-1], self.sub_values) \
+                + np.arange(self.n_time_units)
+        return self._unit_index
+
+    def measure_beat_range(self, measure_idx: int) -> range:
+        return range(self.measure_beats[measure_idx], self.measure_beats[measure_idx + 1])
+
+    def unit_mask(self,
+                  measure_idx: Optional[Sequence[int]] = None,
+                  beat_idx: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Returns boolean array (one element per TimeUnit) which is True for every TimeUnit contained in the given
+        measures or beats. `beat_idx` indexes beats across the whole buffer.
+        """
+        beat_mask = np.zeros(shape=(self.n_beats,), dtype=bool)
+        if beat_idx is not None:
+            beat_mask[list(beat_idx)] = True
+        if measure_idx is not None:
+            measure_mask = np.zeros(shape=(self.n_measures,), dtype=bool)
+            measure_mask[list(measure_idx)] = True
+            beat_mask |= np.repeat(measure_mask, np.diff(self.measure_beats))
+        return np.repeat(beat_mask, self.sub_values)
+
+    #### FIGURE ####
+
+    @property
+    def state(self) -> np.ndarray:
+        """
+        Flagged figure of the Part. Read-only view of `data`, or a copy if `data` doesn't include the part flags.
+        """
+        if self._bounded:
+            state = self.data.view()
+        else:
+            state = np.empty(shape=(self.data.size + 2,), dtype=np.int8)
+            state[0], state[-1] = -1, -1
+            state[1:-1] = self.data
+        state.flags.writeable = False
+        return state
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._data
+
+    @data.setter
+    def data(self, value: np.ndarray):
+        self._data = value
+
+    @property
+    def active_state(self) -> np.ndarray:
+        return self.data[self.unit_index]
+
+    def _writable_data(self) -> np.ndarray:
+        if self._shared:
+            self.data = self.data.copy()
+            self._shared = False
+        return self.data
+
+    def beat_state(self, beat_idx: int, writable: bool = False) -> np.ndarray:
+        data = self._writable_data() if writable else self.data
+        start = self.beat_offsets[beat_idx]
+        return data[start:start + 2 + self.sub_values[beat_idx]]
+
+    def measure_state(self, measure_idx: int) -> np.ndarray:
+        state = self.data[self.measure_offsets[measure_idx]:self.measure_offsets[measure_idx + 1]]
+        state.flags.writeable = False
+        return state
+
+    def measure_active_state(self, measure_idx: int) -> np.ndarray:
+        first_beat, last_beat = self.measure_beats[measure_idx], self.measure_beats[measure_idx + 1]
+        unit_index = self.unit_index[self.unit_offsets[first_beat]:self.unit_offsets[last_beat]]
+        return self.data[unit_index]
+
+    def expand_measure_values(self, values: np.ndarray) -> np.ndarray:
+        """
+        Repeat one value per Measure so that there is one value per TimeUnit.
+        """
+        units_per_measure = np.diff(self.unit_offsets[self.measure_beats])
+        return np.repeat(values, units_per_measure)
+
+    def set_active_state(self,
+                         active_state: np.ndarray,
+                         mask: Optional[np.ndarray] = None):
+        """
+        Write TimeUnit values into `data`. If `mask` is given, only TimeUnits where `mask` is True are written.
+        """
+        data = self._writable_data()
+        if mask is None:
+            data[self.unit_index] = active_state
+        else:
+            data[self.unit_index[mask]] = active_state[mask]
+
+    def activate_random(self,
+                        density: float,
+                        rng: np.random.Generator,
+                        measure_idx: Optional[Sequence[int]] = None,
+                        beat_idx: Optional[Sequence[int]] = None):
+        """
+        Activate every TimeUnit with probability `density`, in place. All onsets are drawn in a single call to
+        `rng`; TimeUnits of excluded measures/beats keep their figure.
+        """
+        choices = (rng.random(self.n_time_units) < density).astype(np.int8)
+        if measure_idx is None and beat_idx is None:
+            self.set_active_state(choices)
+        else:
+            self.set_active_state(choices, mask=~self.unit_mask(measure_idx=measure_idx, beat_idx=beat_idx))
+
+    def complement(self,
+                   adherence: float,
+                   rng: np.random.Generator,
+                   measure_idx: Optional[Sequence[int]] = None,
+                   beat_idx: Optional[Sequence[int]] = None):
+        """
+        Complement the figure in place: "on" becomes "off", "off" and "sustain" become "on". Each TimeUnit is
+        toggled with probability `adherence`, drawn in a single call to `rng`. If `measure_idx` or `beat_idx` is
+        given, only TimeUnits of those measures/beats are toggled.
+        """
+        active_state = self.active_state
+        toggle = rng.random(self.n_time_units) < adherence
+        if measure_idx is not None or beat_idx is not None:
+            toggle &= self.unit_mask(measure_idx=measure_idx, beat_idx=beat_idx)
+        self.set_active_state(np.where(active_state == 1, 0, 1).astype(np.int8), mask=toggle)
+
+    def measure_sub_values(self, measure_idx: int) -> np.ndarray:
+        return self.sub_values[self.measure_beats[measure_idx]:self.measure_beats[measure_idx + 1]]
+
+    def set_measure_state(self, measure_idx: int, state: np.ndarray):
+        """
+        Overwrite the figure of a single measure. The layout of the measure (number of beats and their
+        subdivisions) cannot change.
+        """
+        current = self._writable_data()[self.measure_offsets[measure_idx]:self.measure_offsets[measure_idx + 1]]
+        idx_layout = np.flatnonzero(current < 0)
+        idx_layout = np.union1d(idx_layout, np.flatnonzero(current == -3) + 1)
+        if state.size != current.size or np.any(state[idx_layout] != current[idx_layout]):
+            msg = "Cannot change the layout of a Measure which is a view into a buffered Part."
+            raise ValueError(msg)
+        current[:] = state
+
+    #### VIEWS ####
+
+    def beat(self, beat_idx: int) -> Beat:
+        return Beat._from_buffer(self, beat_idx)
+
+    def measure(self, measure_idx: int) -> Measure:
+        return Measure._from_buffer(self, measure_idx)
+
+    def appended(self, measure: Measure) -> PartBuffer:
+        """
+        Returns a new PartBuffer with `measure` appended. Existing views keep pointing at this buffer.
+        """
+        data = np.concatenate([self.state[:-1], measure.state, [-1]]).astype(np.int8)
+        return PartBuffer(data)
+
+    def window(self, start: int, stop: int) -> PartBuffer:
+        """
+        Returns a PartBuffer viewing measures `start` to `stop` (exclusive) of this buffer, without copying.
+        """
+        return PartBufferWindow(self, start, stop)
+
+    def bounded(self) -> PartBuffer:
+        """
+        Returns this buffer if `data` includes the part flags, otherwise a standalone copy which does.
+        """
+        if self._bounded:
+            return self
+        buffer = PartBuffer.__new__(PartBuffer)
+        buffer.data = np.array(self.state)
+        buffer._shared = False
+        buffer._bounded = True
+        buffer.measure_offsets = self.measure_offsets + 1
+        buffer.beat_offsets = self.beat_offsets + 1
+        buffer.measure_beats = self.measure_beats
+        buffer.sub_values = self.sub_values
+        buffer.unit_offsets = self.unit_offsets
+        buffer._unit_index = None
+        return buffer
+
+    def copy(self) -> PartBuffer:
+        return self.with_data(self.data.copy())
+
+    def copy_on_write(self) -> PartBuffer:
+        """
+        Returns a PartBuffer which shares `data` with this buffer until either one is written to.
+        """
+        buffer = self.with_data(self.data)
+        buffer._shared = True
+        self._shared = True
+        return buffer
+
+    def __len__(self):
+        return self.n_measures
+
+
+class PartBufferWindow(PartBuffer):
+    """
+    A PartBuffer which views a contiguous range of measures of a root PartBuffer.
+
+    `data` is a slice of the root's `data` (without the part flags), and the offset arrays are those of the root
+    rebased to the first measure of the window. Nothing is copied, so writes through the window (or the Measures
+    and Beats it returns) are visible in the root and vice versa. Only `state`, which has to add the part flags,
+    is a copy.
+    """
+
+    def __init__(self, root: PartBuffer, start: int, stop: int):
+        if not 0 <= start <= stop <= root.n_measures:
+            msg = f"Invalid window [{start}:{stop}] of a Part with {root.n_measures} measures."
+            raise IndexError(msg)
+
+        self._root = root
+        self._start = start
+        self._origin = root.measure_offsets[start]
+        self._end = root.measure_offsets[stop]
+        self._shared = False
+        self._bounded = False
+
+        first_beat, last_beat = root.measure_beats[start], root.measure_beats[stop]
+        self.measure_offsets = root.measure_offsets[start:stop + 1] - self._origin
+        self.beat_offsets = root.beat_offsets[first_beat:last_beat] - self._origin
+        self.measure_beats = root.measure_beats[start:stop + 1] - first_beat
+        self.sub_values = root.sub_values[first_beat:last_beat]
+        self.unit_offsets = root.unit_offsets[first_beat:last_beat + 1] - root.unit_offsets[first_beat]
+        self._unit_index = None
+
+    @property
+    def data(self) -> np.ndarray:
+        # looked up on every access, so the window follows the root if it copies its data on write
+        return self._root.data[self._origin:self._end]
+
+    @data.setter
+    def data(self, value: np.ndarray):
+        # the slice of the root can't be rebound, so the values are written through instead
+        self._writable_data()[:] = value
+
+    def _writable_data(self) -> np.ndarray:
+        return self._root._writable_data()[self._origin:self._end]
+
+    def window(self, start: int, stop: int) -> PartBuffer:
+        if not 0 <= start <= stop <= self.n_measures:
+            msg = f"Invalid window [{start}:{stop}] of a Part with {self.n_measures} measures."
+            raise IndexError(msg)
+        return PartBufferWindow(self._root, self._start + start, self._start + stop)
+
+    def copy(self) -> PartBuffer:
+        return self.bounded()
+
+    def copy_on_write(self) -> PartBuffer:
+        return PartBufferWindow(self._root.copy_on_write(), self._start, self._start + self.n_measures)
+
+
+def validate_states(data: np.ndarray, bounds: np.ndarray):
+    """
+    Raises ValueError unless `data` is a concatenation of valid flagged Part figures, where the i-th figure spans
+    `data[bounds[i]:bounds[i + 1]]`. All checks are vectorized over the flag indices.
+    """
+    if data.ndim != 1:
+        msg = "A figure must be a 1d array."
+        raise ValueError(msg)
+
+    idx_flags = np.flatnonzero(data < 0)
+    flags = data[idx_flags]
+
+    if np.any((flags != -1) & (flags != -2) & (flags != -3)):
+        msg = "Figure flags must be -1 (part), -2 (measure) or -3 (subdivision)."
+        raise ValueError(msg)
+
+    # every figure must start and end with a part flag, with no other part flag in between
+    is_part_flag = flags == -1
+    expected_part_flags = np.sort(np.concatenate([bounds[:-1], bounds[1:] - 1]))
+    if not np.array_equal(idx_flags[is_part_flag], expected_part_flags) or np.any(bounds[1:] - bounds[:-1] < 2):
+        msg = "A figure must start and end with a part flag (-1)."
+        raise ValueError(msg)
+
+    # beats must belong to a measure
+    is_beat_flag = flags == -3
+    if np.any(is_beat_flag[1:] & is_part_flag[:-1]):
+        msg = "Subdivision flags (-3) must follow a measure flag (-2)."
+        raise ValueError(msg)
+
+    # subdivision flags are followed by a positive subdivision, and exactly that many TimeUnits
+    sub_values = data[np.minimum(idx_flags + 1, data.size - 1)].astype(int)
+    if np.any(sub_values[is_beat_flag] <= 0):
+        msg = "Subdivision flags (-3) must be followed by a positive subdivision value."
+        raise ValueError(msg)
+    expected_gaps = np.where(is_beat_flag[:-1], sub_values[:-1] + 2, 1)
+    if np.any(np.diff(idx_flags) != expected_gaps):
+        msg = "The number of TimeUnits in each beat must match its subdivision value."
+        raise ValueError(msg)
+
+    is_unit = data >= 0
+    is_unit[idx_flags[is_beat_flag] + 1] = False
+    if np.any(data[is_unit] > 2):
+        msg = "TimeUnit values must be in {0, 1, 2}."
+        raise ValueError(msg)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.part_buffer import PartBuffer
+from MidiCompose.utilities import get_generator
+
+
+class StreamingPartIterator:
+
+    def __init__(self, part):
+        self._Part = part
+
+    def __next__(self) -> Measure:
+        measure = next(self._Part._source)  # raises StopIteration once the source is exhausted
+        if not isinstance(measure, Measure):
+            e = "A StreamingPart can only be fed Measure instances."
+            raise TypeError(e)
+        self._Part.n_measures_consumed += 1
+        return measure
+
+    def __iter__(self):
+        return self
+
+
+class StreamingPart:
+    """
+    A Part whose Measures are produced on demand by a generator (or any iterable) of Measures, rather than held in
+    memory. Useful for unbounded generative pieces.
+
+    The source is consumed as the StreamingPart is iterated, so each Measure is produced exactly once and nothing
+    is retained: iterating yields Measures (same protocol as `PartIterator`), and `windows()` yields buffered Parts
+    of `window_size` consecutive Measures, which can be translated one window at a time.
+    """
+
+    def __init__(self,
+                 measures: Iterable[Measure],
+                 window_size: int = 16):
+        """
+        :param measures: generator (or iterable) of Measure objects. May be unbounded.
+        :param window_size: default number of Measures per window yielded by `windows()`.
+        """
+        if not isinstance(window_size, int) or window_size < 1:
+            msg = "`window_size` must be a positive integer."
+            raise ValueError(msg)
+
+        self._source: Iterator[Measure] = iter(measures)
+        self.window_size: int = window_size
+        self.n_measures_consumed: int = 0
+
+    @classmethod
+    def activate_random(cls,
+                        template: Measure,
+                        density: float,
+                        random_seed: Optional[Union[int, np.random.Generator]] = None,
+                        n_measures: Optional[int] = None,
+                        window_size: int = 16) -> StreamingPart:
+        """
+        Returns a StreamingPart of randomly activated copies of `template` (see `Measure.activate_random`), which
+        is unbounded unless `n_measures` is given.
+        """
+        if density < 0 or density > 1:
+            msg = "`density` must be a float between 0 and 1."
+            raise ValueError(msg)
+
+        rng = get_generator(random_seed)
+
+        def _generate():
+            i = 0
+            while n_measures is None or i < n_measures:
+                yield template.activate_random(density=density, random_seed=rng)
+                i += 1
+
+        return cls(_generate(), window_size=window_size)
+
+    def windows(self, window_size: Optional[int] = None) -> Iterator[Part]:
+        """
+        Yields buffered Parts of `window_size` consecutive Measures (defaults to `self.window_size`). The last
+        window of a bounded source may be shorter.
+        """
+        window_size = self.window_size if window_size is None else window_size
+        if not isinstance(window_size, int) or window_size < 1:
+            msg = "`window_size` must be a positive integer."
+            raise ValueError(msg)
+
+        iterator = iter(self)
+        while True:
+            window = list(islice(iterator, window_size))
+            if not window:
+                return
+            yield Part.from_buffer(PartBuffer.from_measures(window))
+
+    #### MAGIC METHODS ####
+
+    def __iter__(self):
+        return StreamingPartIterator(self)
+
+    def __repr__(self):
+        return f"StreamingPart(n_measures_consumed={self.n_measures_consumed}, window_size={self.window_size})"
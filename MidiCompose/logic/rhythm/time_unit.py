@@ -1,41 +1,64 @@
+from typing import ClassVar, Dict, Tuple
+
+import numpy as np
+
 
 class TimeUnit:
     """
     Contains the time_units of a subdivision within a Beat.
 
     State can be 1 (attack), 2 (sustain), or 0 (release).
+
+    TimeUnits are immutable flyweights: there is a single shared instance per state (and verbosity), so
+    `TimeUnit(1) is TimeUnit(1)`. Methods which would change the state (`activate`, `toggle`, ...) return the
+    TimeUnit of the new state instead. To change a subdivision of a Beat, assign to it (ie. `beat[0] = 1`).
     """
 
-    def __init__(self,
-                 state: int = 0,
-                 verbose: bool = False):
+    __slots__ = ("_state", "_verbose")
 
-        # definitive attribute
-        self.state: int = state
-        self._validate()
+    _state: int
+    _verbose: bool
 
-        # __repr__ verbosity
-        self.verbose: bool = verbose
+    _instances: ClassVar[Dict[Tuple[int, bool], "TimeUnit"]] = dict()
 
-    def _validate(self):
-        if not isinstance(self.state, int):
+    def __new__(cls,
+                state: int = 0,
+                verbose: bool = False):
+        """
+        :param verbose: determines format of output
+        """
+        if not isinstance(state, (int, np.integer)):
             msg = "`time_units` must be an integer."
             raise TypeError(msg)
-        if self.state not in {0, 1, 2}:
+        try:
+            return cls._instances[(int(state), bool(verbose))]
+        except KeyError:
             msg = "`time_units` can only be either 0, 1, or 2."
-            raise ValueError(msg)
+            raise ValueError(msg) from None
+
+    @classmethod
+    def _create(cls, state: int, verbose: bool):
+        time_unit = object.__new__(cls)
+        object.__setattr__(time_unit, "_state", state)
+        object.__setattr__(time_unit, "_verbose", verbose)
+        cls._instances[(state, verbose)] = time_unit
+
+    @property
+    def state(self) -> int:
+        return self._state
+
+    @property
+    def verbose(self) -> bool:
+        return self._verbose
 
     def activate(self):
-        self.state = 1
-        return self
+        return TimeUnit(1, self._verbose)
 
     def sustain(self):
-        self.state = 2
-        return self
+        return TimeUnit(2, self._verbose)
 
     def deactivate(self):
-        self.state = 0
-        return self
+        return TimeUnit(0, self._verbose)
 
     def toggle(self):
         """
@@ -43,36 +66,54 @@ class TimeUnit:
 
         Sustain toggles to "on"
         """
-        if self.state in (0,2):
-            self.state = 1
-        elif self.state == 1:
-            self.state = 0
-
-        return self
+        if self._state in (0, 2):
+            return TimeUnit(1, self._verbose)
+        else:
+            return TimeUnit(0, self._verbose)
 
     def set_state(self, value: int):
         if not value in {0, 1, 2}:
             msg = f"Invalid value. TimeUnit `figure` must be in {0, 1, 2}."
             raise ValueError(msg)
-        else:
-            self.state = value
-        return self
+        return TimeUnit(value, self._verbose)
 
     def set_verbose(self, verbose: bool):
-        self.verbose = verbose
+        return TimeUnit(self._state, verbose)
+
+    def __setattr__(self, key, value):
+        msg = "TimeUnit is immutable. Use the return value of `activate`, `toggle`, etc. instead."
+        raise AttributeError(msg)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return TimeUnit, (self._state, self._verbose)
 
     def __eq__(self, other):
-        if type(other) == int:
-            return self.state == other
+        if isinstance(other, (int, np.integer)):
+            return self._state == other
         else:
-            return self.state == other.state
+            return self._state == other.state
+
+    def __hash__(self):
+        return hash(self._state)
 
     def __int__(self):
-        return int(self.state)
+        return self._state
 
     def __repr__(self):
-        if self.verbose:
-            r = f"TimeUnit(time_units={self.state})"
+        if self._verbose:
+            r = f"TimeUnit(time_units={self._state})"
         else:
-            r = str(self.state)
-        return r
\ No newline at end of file
+            r = str(self._state)
+        return r
+
+
+for _state in (0, 1, 2):
+    for _verbose in (False, True):
+        TimeUnit._create(_state, _verbose)
+del _state, _verbose
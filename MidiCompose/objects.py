@@ -17,8 +17,16 @@ from MidiCompose.logic.rhythm.time_unit import TimeUnit
 from MidiCompose.logic.rhythm.beat import Beat
 from MidiCompose.logic.rhythm.measure import Measure
 from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+from MidiCompose.logic.rhythm.packed_store import PackedRhythmStore
+from MidiCompose.logic.rhythm.dedup_index import DedupIndex
+from MidiCompose.logic.rhythm.streaming_part import StreamingPart
+from MidiCompose.logic.rhythm.motif_search import find_motif, find_motif_batch
 
 from MidiCompose.translation.track_builder import TrackBuilder
+from MidiCompose.translation.incremental_builder import IncrementalTrackBuilder
+from MidiCompose.translation.batch_builder import BatchTrackBuilder
+from MidiCompose.translation.event_table import EventTable
 
 from MidiCompose.playback import play_mid
 
@@ -0,0 +1,255 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from mido import bpm2tempo
+
+from MidiCompose.logic.harmony.note import Note
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.translation import midi_translation as mt
+from MidiCompose.translation import smf_writer as smf
+from MidiCompose.translation import state_translation as st
+
+# (Part or Parts, Note/Melody or Notes/Melodies), as given to TrackBuilder
+Job = Tuple[Union[Part, Sequence[Part]], Union[Note, Melody, Sequence[Union[Note, Melody]]]]
+
+# attributes, note values, velocities and channels of a validated job
+_Rendering = Tuple[Union[st.StateAttributes, st.ParallelAttributes], List[np.ndarray], List[np.ndarray], List[int]]
+
+_DEFAULT_VELOCITY = 64
+
+
+def _group_events(renderings: List[_Rendering]) -> List[np.ndarray]:
+    """
+    Returns the events of jobs sharing the same attributes, translated at once by stacking the voices of every job.
+    """
+    attrs = renderings[0][0]
+    n_voices = [len(r[1]) for r in renderings]
+    if isinstance(attrs, st.ParallelAttributes):
+        msg_types = mt._parallel_msg_types(attrs, melodies=renderings[0][1], channels=renderings[0][3])
+        msg_types = np.tile(msg_types, (1, len(renderings)))
+        cons_attrs = attrs.cons_attributes
+        ticks, total_ticks, off_velocity = cons_attrs.cons_timestamp, cons_attrs.total_ticks, 64
+    else:
+        msg_types = np.broadcast_to(attrs.msg_types[:, None], (attrs.msg_types.size, sum(n_voices)))
+        ticks, total_ticks, off_velocity = np.cumsum(attrs.timedelta), attrs.total_ticks, None
+
+    events, voices = mt._events_from_voices(ticks=ticks,
+                                            msg_types=msg_types,
+                                            notes=[n for r in renderings for n in r[1]],
+                                            velocities=[v for r in renderings for v in r[2]],
+                                            channels=[c for r in renderings for c in r[3]],
+                                            off_velocity=off_velocity,
+                                            return_voices=True)
+
+    # events of each job keep their order
+    job = np.repeat(np.arange(len(renderings)), n_voices)[voices]
+    events = events[np.argsort(job, kind="stable")]
+    bounds = np.cumsum(np.bincount(job, minlength=len(renderings)))[:-1]
+    return [mt._with_final_note_off(e, total_ticks) for e in np.split(events, bounds)]
+
+
+def _render_jobs(renderings: List[_Rendering],
+                 tempo: int) -> List[bytes]:
+    """
+    Encodes the track of each job. Module-level, so that it can be sent to worker processes.
+    """
+    groups: Dict[int, List[int]] = {}
+    for i, r in enumerate(renderings):
+        groups.setdefault(id(r[0]), []).append(i)
+
+    events_by_job: Dict[int, np.ndarray] = {}
+    for indices in groups.values():
+        for i, events in zip(indices, _group_events([renderings[i] for i in indices])):
+            events_by_job[i] = events
+
+    job_events = [events_by_job[i] for i in range(len(renderings))]
+    return smf.encode_tracks(np.concatenate(job_events), sizes=[e.size for e in job_events], tempo=tempo)
+
+
+class BatchTrackBuilder:
+    """
+    Renders a batch of jobs to midi files, where each job is the (parts, melodies) pair a TrackBuilder would be
+    given, with the same bpm and tpb for every job. The file of each job is identical to `get_smf_bytes` of the
+    equivalent TrackBuilder.
+
+    Unlike constructing one TrackBuilder per job:
+        - every job is validated up front, and a single error lists every invalid job.
+        - Notes are expanded to arrays of note values, without creating Melody objects.
+        - the attributes of each distinct state (and set of parallel states) are computed once for the batch.
+        - jobs sharing the same attributes are translated at once, and the tracks of a chunk of jobs are encoded
+          in a single pass, with the header and tempo computed once.
+        - chunks of jobs are rendered by a bounded number of workers.
+    """
+
+    def __init__(self,
+                 jobs: Sequence[Job],
+                 bpm: int = 60,
+                 tpb: int = 480):
+
+        self.bpm = bpm
+        self.tpb = tpb
+
+        self._renderings: List[_Rendering] = self._validate(jobs)
+
+    def _validate(self, jobs: Sequence[Job]) -> List[_Rendering]:
+        errors: Dict[int, str] = {}
+        normalized: List[Tuple[List[Part], List[Union[Note, Melody]]]] = []
+        for i, job in enumerate(jobs):
+            try:
+                job_parts, job_melodies = job
+            except (TypeError, ValueError):
+                errors[i] = "must be a pair of (parts, melodies)"
+                normalized.append(([], []))
+                continue
+
+            parts = [job_parts] if isinstance(job_parts, Part) else list(job_parts)
+            melodies = [job_melodies] if isinstance(job_melodies, (Note, Melody)) else list(job_melodies)
+            if not parts or not all(isinstance(p, Part) for p in parts):
+                errors[i] = "`parts` must consist only of `Part` instances"
+            elif not melodies or not all(isinstance(m, (Note, Melody)) for m in melodies):
+                errors[i] = "`melodies` must consist only of `Note` and `Melody` instances"
+            elif len(parts) > 1 and len(melodies) != len(parts):
+                errors[i] = "there must be as many items in `melodies` as in `parts`"
+            elif all(isinstance(m, Note) for m in melodies) and len(set(melodies)) != len(melodies):
+                errors[i] = "all Notes must be unique"
+            normalized.append((parts, melodies))
+
+        # attributes of each distinct Part, then of each distinct state
+        states: Dict[int, np.ndarray] = {}
+        state_keys: Dict[int, bytes] = {}
+        state_attrs: Dict[bytes, st.StateAttributes] = {}
+        for i, (parts, _) in enumerate(normalized):
+            if i in errors:
+                continue
+            for p in parts:
+                if id(p) not in state_keys:
+                    state = np.asarray(p.state, dtype=np.int8)
+                    key = st._state_key([state], self.tpb)
+                    states[id(p)], state_keys[id(p)] = state, key
+                    if key not in state_attrs:
+                        state_attrs[key] = st.cached_state_attributes(state, tpb=self.tpb)
+        n_note_on = {k: int(np.count_nonzero(mt._is_on(a.msg_types))) for k, a in state_attrs.items()}
+
+        # size of every Melody against the number of notes its Part plays, for all jobs at once
+        voice_jobs: List[int] = []
+        voice_required: List[int] = []
+        voice_given: List[int] = []
+        for i, (parts, melodies) in enumerate(normalized):
+            if i in errors:
+                continue
+            voice_parts = parts if len(parts) > 1 else [parts[0] for _ in melodies]
+            voice_jobs.extend(i for _ in melodies)
+            voice_required.extend(n_note_on[state_keys[id(p)]] for p in voice_parts)
+            voice_given.extend(len(m) if isinstance(m, Melody) else -1 for m in melodies)
+        job_idx = np.array(voice_jobs, dtype=np.int64)
+        required = np.array(voice_required, dtype=np.int64)
+        given = np.array(voice_given, dtype=np.int64)
+        for i in np.unique(job_idx[(given >= 0) & (given != required)]).tolist():
+            errors[i] = "the size of each `Melody` must match `n_note_on` of its `Part`"
+
+        if errors:
+            listed = "; ".join(f"job {i}: {errors[i]}" for i in sorted(errors)[:10])
+            msg = f"{len(errors)} of {len(normalized)} jobs are invalid ({listed}" \
+                  f"{'; ...' if len(errors) > 10 else ''})."
+            raise ValueError(msg)
+
+        parallel_attrs: Dict[Tuple[bytes, ...], st.ParallelAttributes] = {}
+        renderings: List[_Rendering] = []
+        first_voice = 0
+        for parts, melodies in normalized:
+            keys = tuple(state_keys[id(p)] for p in parts)
+            attrs: Union[st.StateAttributes, st.ParallelAttributes]
+            if len(parts) > 1:
+                if keys not in parallel_attrs:
+                    parallel_attrs[keys] = st.cached_parallel_attrs([states[id(p)] for p in parts], tpb=self.tpb)
+                attrs = parallel_attrs[keys]
+            else:
+                attrs = state_attrs[keys[0]]
+
+            notes: List[np.ndarray] = []
+            velocities: List[np.ndarray] = []
+            n_notes = required[first_voice:first_voice + len(melodies)].tolist()
+            first_voice += len(melodies)
+            for m, n in zip(melodies, n_notes):
+                if isinstance(m, Note):
+                    notes.append(np.full(shape=(n,), fill_value=m.value, dtype=int))
+                    velocities.append(np.full(shape=(n,), fill_value=_DEFAULT_VELOCITY, dtype=int))
+                else:
+                    notes.append(m.note_values)
+                    velocities.append(np.asarray(m.velocity, dtype=int))
+            renderings.append((attrs, notes, velocities, [0 for _ in melodies]))
+
+        return renderings
+
+    def __len__(self) -> int:
+        return len(self._renderings)
+
+    def get_events(self, job_idx: int) -> np.ndarray:
+        """
+        Returns the messages of the `job_idx`-th job (see `TrackBuilder.get_events`).
+        """
+        return _group_events([self._renderings[job_idx]])[0]
+
+    def iter_smf_bytes(self,
+                       max_workers: Optional[int] = None,
+                       chunksize: int = 64) -> Iterator[bytes]:
+        """
+        Yields the bytes of the midi file of each job, in order.
+
+        Jobs are encoded `chunksize` at a time in a pool of `max_workers` processes (defaults to the number of
+        CPUs), with at most two chunks per worker in flight, so that memory does not grow with the size of the
+        batch. With a single worker, jobs are encoded in this process.
+        """
+        if chunksize < 1:
+            msg = "`chunksize` must be positive."
+            raise ValueError(msg)
+
+        header = smf.encode_header(1, tpb=self.tpb)
+        tempo = bpm2tempo(self.bpm)
+        chunks = [self._renderings[i:i + chunksize] for i in range(0, len(self._renderings), chunksize)]
+
+        n_workers = min(max_workers or os.cpu_count() or 1, len(chunks))
+        if n_workers <= 1:
+            for chunk in chunks:
+                for track in _render_jobs(chunk, tempo):
+                    yield header + track
+            return
+
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            pending: Deque[Future[List[bytes]]] = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_render_jobs, chunk, tempo))
+                if len(pending) >= 2 * n_workers:
+                    for track in pending.popleft().result():
+                        yield header + track
+            while pending:
+                for track in pending.popleft().result():
+                    yield header + track
+
+    def get_smf_bytes(self,
+                      max_workers: Optional[int] = None,
+                      chunksize: int = 64) -> List[bytes]:
+        """
+        Returns the bytes of the midi file of each job (see `iter_smf_bytes`).
+        """
+        return list(self.iter_smf_bytes(max_workers=max_workers, chunksize=chunksize))
+
+    def save(self,
+             paths: Sequence[str],
+             max_workers: Optional[int] = None,
+             chunksize: int = 64) -> None:
+        """
+        Writes the midi file of each job to the path of the same index, as soon as it is encoded (see
+        `iter_smf_bytes`).
+        """
+        if len(paths) != len(self):
+            msg = "Must give one path per job."
+            raise ValueError(msg)
+
+        for path, data in zip(paths, self.iter_smf_bytes(max_workers=max_workers, chunksize=chunksize)):
+            with open(path, "wb") as f:
+                f.write(data)
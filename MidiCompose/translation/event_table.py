@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+from typing import ClassVar, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+from mido import Message, MetaMessage, MidiTrack
+
+from MidiCompose.translation.state_translation import MsgType
+from MidiCompose.translation.midi_translation import EVENT_DTYPE, messages_from_events
+from MidiCompose.translation import smf_writer as smf
+
+#### OBJECTS ####
+
+# one row per note. `tick` is the absolute tick of the "note_on", and `duration` the number of ticks until its
+# "note_off". Explicit little-endian types, so that `EventTable.to_bytes` is portable.
+NOTE_DTYPE = np.dtype([("tick", "<i8"),
+                       ("duration", "<i8"),
+                       ("pitch", "u1"),
+                       ("velocity", "u1"),
+                       ("channel", "u1"),
+                       ("track", "<u2")])
+
+_HEADER = np.dtype([("end_tick", "<i8"),
+                    ("n_notes", "<i8")])
+
+
+#### NOTE PAIRING ####
+
+def _pair_notes(tick: np.ndarray,
+                is_on: np.ndarray,
+                key: np.ndarray) -> np.ndarray:
+    """
+    Returns, for each "note_on" (in order), the index of the "note_off" which releases it, or -1 if it is never
+    released.
+
+    Messages are grouped by `key` (eg. track, channel and pitch), and within a group the k-th "note_on" is released
+    by the k-th "note_off" (first in, first out). A "note_off" while no note of its group is sounding is ignored.
+    """
+    n = tick.size
+    idx_on = np.flatnonzero(is_on)
+    pairs = np.full(shape=(idx_on.size,), fill_value=-1, dtype=np.int64)
+    if n == 0:
+        return pairs
+
+    # group by key, then tick, with "note_off" before "note_on" at equal ticks (re-attacked notes)
+    order = np.lexsort((np.arange(n), is_on, tick, key))
+    sorted_key = key[order]
+    sorted_on = is_on[order]
+    step = np.where(sorted_on, 1, -1)
+
+    group_start = np.ones(shape=(n,), dtype=bool)
+    group_start[1:] = sorted_key[1:] != sorted_key[:-1]
+    group_id = np.cumsum(group_start) - 1
+    n_groups = group_id[-1] + 1
+
+    # number of sounding notes of the group after each message, not accounting for stray "note_off"
+    depth = np.cumsum(step)
+    depth -= (depth - step)[group_start][group_id]
+
+    # a "note_off" is stray when it takes the depth to a new low. Descending offsets per group make a single
+    # running minimum restart at every group.
+    offset = (n_groups - group_id) * (2 * n + 2)
+    running_min = np.minimum(np.minimum.accumulate(depth + offset), offset) - offset
+    previous_min = np.where(group_start, 0, np.roll(running_min, 1))
+    valid = sorted_on | (running_min >= previous_min)
+
+    # within a group, the k-th "note_on" is released by the k-th valid "note_off"
+    sorted_idx, group_id, sorted_on = order[valid], group_id[valid], sorted_on[valid]
+    on_idx, on_group = sorted_idx[sorted_on], group_id[sorted_on]
+    off_idx, off_group = sorted_idx[~sorted_on], group_id[~sorted_on]
+
+    groups = np.arange(n_groups)
+    first_on = np.searchsorted(on_group, groups)
+    first_off = np.searchsorted(off_group, groups)
+    n_off = np.searchsorted(off_group, groups, side="right") - first_off
+
+    k = np.arange(on_idx.size) - first_on[on_group]
+    matched = k < n_off[on_group]
+
+    # map back to the order of the "note_on" messages
+    on_position = np.searchsorted(idx_on, on_idx)
+    pairs[on_position[matched]] = off_idx[first_off[on_group[matched]] + k[matched]]
+
+    return pairs
+
+
+#### EVENT TABLE ####
+
+class EventTable:
+    """
+    Columnar, note-based representation of midi content, between the logic objects and `mido`.
+
+    Each row of `notes` (see `NOTE_DTYPE`) is a note: absolute `tick`, `duration`, `pitch`, `velocity`, `channel`
+    and `track`. Transformations (transposition, velocity shaping, merging, timing offsets...) are array operations
+    on the columns, and the table is only converted to Messages (or bytes) once, at the end.
+
+    `end_tick` is the length of the content, which may extend past the last "note_off".
+
+    "note_off" velocities are not kept: converting back to Messages gives "note_off" messages of velocity 64.
+    """
+
+    def __init__(self,
+                 notes: Optional[np.ndarray] = None,
+                 end_tick: Optional[int] = None):
+        if notes is None:
+            notes = np.empty(shape=(0,), dtype=NOTE_DTYPE)
+        elif notes.dtype != NOTE_DTYPE:
+            msg = "`notes` must be a structured array of dtype `NOTE_DTYPE`."
+            raise TypeError(msg)
+        if notes["duration"].min(initial=0) < 0:
+            msg = "`duration` of every note must be non-negative."
+            raise ValueError(msg)
+
+        self.notes: np.ndarray = notes
+        last_tick = int((notes["tick"] + notes["duration"]).max(initial=0))
+        self.end_tick: int = last_tick if end_tick is None else max(int(end_tick), last_tick)
+
+    @classmethod
+    def from_columns(cls,
+                     tick: Sequence[int],
+                     duration: Sequence[int],
+                     pitch: Sequence[int],
+                     velocity: Union[int, Sequence[int]] = 64,
+                     channel: Union[int, Sequence[int]] = 0,
+                     track: Union[int, Sequence[int]] = 0,
+                     end_tick: Optional[int] = None) -> EventTable:
+        ticks = np.asarray(tick)
+        notes = np.empty(shape=ticks.shape, dtype=NOTE_DTYPE)
+        notes["tick"] = ticks
+        notes["duration"] = duration
+        notes["pitch"] = pitch
+        notes["velocity"] = velocity
+        notes["channel"] = channel
+        notes["track"] = track
+        return cls(cls._sorted(notes), end_tick=end_tick)
+
+    @classmethod
+    def from_events(cls,
+                    events: np.ndarray,
+                    track: int = 0) -> EventTable:
+        """
+        Returns the EventTable of a structured array of messages (see `midi_translation.EVENT_DTYPE`), pairing each
+        "note_on" with the "note_off" of the same channel and pitch which releases it.
+        """
+        tick = events["tick"].astype(np.int64)
+        is_on = (events["type"] == MsgType.NOTE_ON) & (events["velocity"] > 0)
+        key = events["channel"].astype(np.int64) * 128 + events["note"]
+        end_tick = int(tick.max(initial=0))
+
+        pairs = _pair_notes(tick, is_on, key)
+        on = events[is_on]
+        off_tick = np.where(pairs >= 0, tick[pairs], end_tick)
+
+        notes = np.empty(shape=on.shape, dtype=NOTE_DTYPE)
+        notes["tick"] = on["tick"]
+        notes["duration"] = off_tick - on["tick"]
+        notes["pitch"] = on["note"]
+        notes["velocity"] = on["velocity"]
+        notes["channel"] = on["channel"]
+        notes["track"] = track
+        return cls(cls._sorted(notes), end_tick=end_tick)
+
+    @classmethod
+    def from_messages(cls,
+                      messages: Iterable[Union[Message, MetaMessage]],
+                      track: int = 0) -> EventTable:
+        """
+        Returns the EventTable of the "note_on"/"note_off" messages of `messages` (with delta times). Other messages
+        only count towards `end_tick`.
+        """
+        ticks, types, note, velocity, channel = [], [], [], [], []
+        tick = 0
+        for m in messages:
+            tick += m.time
+            if m.type == "note_on" or m.type == "note_off":
+                ticks.append(tick)
+                types.append(MsgType.NOTE_ON if m.type == "note_on" else MsgType.NOTE_OFF)
+                note.append(m.note)
+                velocity.append(m.velocity)
+                channel.append(m.channel)
+
+        events = np.empty(shape=(len(ticks),), dtype=EVENT_DTYPE)
+        events["tick"] = ticks
+        events["type"] = types
+        events["note"] = note
+        events["velocity"] = velocity
+        events["channel"] = channel
+
+        table = cls.from_events(events, track=track)
+        table.end_tick = max(table.end_tick, tick)
+        return table
+
+    @classmethod
+    def from_track(cls,
+                   track: MidiTrack,
+                   track_index: int = 0) -> EventTable:
+        return cls.from_messages(track, track=track_index)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> EventTable:
+        """
+        Inverse of `to_bytes`.
+        """
+        header = np.frombuffer(data, dtype=_HEADER, count=1)[0]
+        notes = np.frombuffer(data, dtype=NOTE_DTYPE, count=int(header["n_notes"]), offset=_HEADER.itemsize)
+        return cls(notes.copy(), end_tick=int(header["end_tick"]))
+
+    @classmethod
+    def merge(cls, tables: Sequence[EventTable]) -> EventTable:
+        """
+        Returns a single EventTable of the notes of every table of `tables`.
+        """
+        notes = np.concatenate([t.notes for t in tables]) if tables else None
+        end_tick = max([t.end_tick for t in tables], default=0)
+        return cls(cls._sorted(notes) if notes is not None else None, end_tick=end_tick)
+
+    @staticmethod
+    def _sorted(notes: np.ndarray) -> np.ndarray:
+        return notes[np.argsort(notes["tick"], kind="stable")]
+
+    #### COLUMNS ####
+
+    @property
+    def tick(self) -> np.ndarray:
+        return self.notes["tick"]
+
+    @property
+    def duration(self) -> np.ndarray:
+        return self.notes["duration"]
+
+    @property
+    def pitch(self) -> np.ndarray:
+        return self.notes["pitch"]
+
+    @property
+    def velocity(self) -> np.ndarray:
+        return self.notes["velocity"]
+
+    @property
+    def channel(self) -> np.ndarray:
+        return self.notes["channel"]
+
+    @property
+    def track(self) -> np.ndarray:
+        return self.notes["track"]
+
+    @property
+    def tracks(self) -> List[int]:
+        return np.unique(self.notes["track"]).tolist()
+
+    #### TRANSFORMATIONS ####
+
+    def copy(self) -> EventTable:
+        return EventTable(self.notes.copy(), end_tick=self.end_tick)
+
+    def transpose(self, semitones: int) -> EventTable:
+        pitch = self.notes["pitch"].astype(int) + semitones
+        if pitch.size and (pitch.min() < 0 or pitch.max() > 127):
+            msg = f"Transposing by {semitones} semitones takes notes out of the midi range."
+            raise ValueError(msg)
+        table = self.copy()
+        table.notes["pitch"] = pitch
+        return table
+
+    def shift(self, ticks: int) -> EventTable:
+        """
+        Returns a copy of `self` with every note (and `end_tick`) delayed by `ticks`.
+        """
+        if ticks < 0 and self.notes.size and self.notes["tick"].min() + ticks < 0:
+            msg = f"Shifting by {ticks} ticks moves notes before tick 0."
+            raise ValueError(msg)
+        table = self.copy()
+        table.notes["tick"] += ticks
+        table.end_tick = max(self.end_tick + ticks, 0)
+        return table
+
+    def select(self, mask: np.ndarray) -> EventTable:
+        return EventTable(self.notes[mask], end_tick=self.end_tick)
+
+    #### CONVERSION ####
+
+    def to_events(self, track: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the messages of `self` (or of a single track) as a structured array (see
+        `midi_translation.EVENT_DTYPE`), sorted by tick. At equal ticks, "note_off" messages come before "note_on"
+        messages, so that re-attacked notes are released first, except for the "note_off" of notes of zero
+        `duration`, which come after their "note_on".
+        """
+        notes = self.notes if track is None else self.notes[self.notes["track"] == track]
+        n = notes.size
+
+        events = np.empty(shape=(2 * n,), dtype=EVENT_DTYPE)
+        events["tick"][:n] = notes["tick"] + notes["duration"]
+        events["type"][:n] = MsgType.NOTE_OFF
+        events["velocity"][:n] = 64
+        events["tick"][n:] = notes["tick"]
+        events["type"][n:] = MsgType.NOTE_ON
+        events["velocity"][n:] = notes["velocity"]
+        events["note"] = np.tile(notes["pitch"], 2)
+        events["channel"] = np.tile(notes["channel"], 2)
+
+        # order within a tick: "note_off", "note_on", then "note_off" of zero-length notes
+        rank = np.empty(shape=(2 * n,), dtype=np.int8)
+        rank[:n] = np.where(notes["duration"] == 0, 2, 0)
+        rank[n:] = 1
+
+        return events[np.lexsort((rank, events["tick"]))]
+
+    def to_messages(self, track: Optional[int] = None) -> List[Union[Message, MetaMessage]]:
+        """
+        Returns the Messages (with delta times) of `self` or of a single track, ending with an "end_of_track" at
+        `end_tick`.
+        """
+        events = self.to_events(track=track)
+        messages = messages_from_events(events)
+        last_tick = int(events["tick"][-1]) if events.size else 0
+        messages.append(MetaMessage(type="end_of_track", time=self.end_tick - last_tick))
+        return messages
+
+    def to_track(self, track: Optional[int] = None) -> MidiTrack:
+        return MidiTrack(self.to_messages(track=track))
+
+    def to_smf_track(self,
+                     track: Optional[int] = None,
+                     tempo: Optional[int] = None) -> bytes:
+        """
+        Returns the encoded "MTrk" chunk of `self` or of a single track (see `smf_writer.encode_track`).
+        """
+        return smf.encode_track(self.to_events(track=track), end_tick=self.end_tick, tempo=tempo)
+
+    def to_smf(self,
+               tpb: int = 480,
+               tempo: Optional[int] = None) -> bytes:
+        """
+        Returns the bytes of a type 1 midi file with one track per value of the `track` column.
+        """
+        tracks = [self.to_smf_track(track=t, tempo=tempo if i == 0 else None) for i, t in enumerate(self.tracks)]
+        return smf.encode_smf(tracks or [self.to_smf_track(tempo=tempo)], tpb=tpb)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes `self` into a compact binary buffer (see `from_bytes`).
+        """
+        header = np.array([(self.end_tick, self.notes.size)], dtype=_HEADER)
+        return header.tobytes() + np.ascontiguousarray(self.notes).tobytes()
+
+    #### MAGIC METHODS ####
+
+    def __len__(self):
+        return self.notes.size
+
+    def __eq__(self, other):
+        if not isinstance(other, EventTable):
+            return NotImplemented
+        return self.end_tick == other.end_tick and np.array_equal(self.notes, other.notes)
+
+    __hash__: ClassVar[None] = None  # type: ignore[assignment]
+
+    def __repr__(self):
+        return f"EventTable(n_notes={len(self)}, n_tracks={len(self.tracks)}, end_tick={self.end_tick})"
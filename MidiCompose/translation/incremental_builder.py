@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from mido import Message
+
+from MidiCompose.logic.harmony.note import Note
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.translation import midi_translation as mt
+from MidiCompose.translation import state_translation as st
+from MidiCompose.translation.state_translation import MsgType
+from MidiCompose.translation.track_builder import TrackBuilder
+
+
+@dataclass
+class _Segment:
+    """
+    Translation of one measure index (of every Part). `ticks` are relative to the start of the measure.
+    """
+    ticks: np.ndarray
+    msg_types: np.ndarray
+
+
+class IncrementalTrackBuilder(TrackBuilder):
+    """
+    TrackBuilder for interactive editing, which keeps the events of every measure (a "segment", spanning every
+    Part) and only re-translates the segments affected by an edit before splicing them together.
+
+    Edits go through `set_measure` and `set_note` (or `mark_dirty` after mutating a Measure in place). A segment is
+    re-translated when:
+        - its measure changed.
+        - the number of notes played by a voice before it changed (a "note_on" was added or removed earlier).
+        - a note started to, or stopped, sound into it (which turns its first "note_on" into an "ofn").
+        - one of the melody notes it plays changed.
+
+    Segments which only move in time are shifted, not re-translated, and consecutive dirty segments are translated
+    in a single call. `n_segments_rendered` counts translated segments.
+    """
+
+    def __init__(self,
+                 parts: Sequence[Part],
+                 melodies: Sequence[Union[Note, Melody]],
+                 channels: Optional[Sequence[int]] = None,
+                 bpm: int = 60,
+                 tpb: int = 480):
+        self._initialized = False
+        self._parts_stale = False
+        super().__init__(parts, melodies, channels=channels, bpm=bpm, tpb=tpb)
+        self._initialized = True
+
+        self.n_segments_rendered: int = 0
+        self._reset()
+
+    #### STATE ####
+
+    @property
+    def parts(self) -> List[Part]:
+        if self._parts_stale:
+            self._parts = [Part(list(measures)) for measures in self._measures]
+            self._parts_stale = False
+        return self._parts
+
+    @parts.setter
+    def parts(self, value: Sequence[Part]):
+        self._set_parts(value)
+        self._parts_stale = False
+        if self._initialized:
+            self._reset()
+
+    @property
+    def melodies(self) -> List[Melody]:
+        return self._melodies
+
+    @melodies.setter
+    def melodies(self, value: Sequence[Union[Note, Melody]]):
+        self._set_melodies(value)
+        # copy-on-write copies, so that `set_note` doesn't edit the caller's Melodies
+        self._melodies = [m.copy() for m in self._melodies]
+        if self._initialized:
+            self._reset()
+
+    @property
+    def is_multi_part(self) -> bool:
+        return len(self._parts) > 1  # without rebuilding stale Parts
+
+    def _reset(self):
+        self._measures: List[List[Measure]] = [list(p.measures) for p in self.parts]
+        n_measures = {len(m) for m in self._measures}
+        if len(n_measures) != 1:
+            msg = "All Parts must contain the same number of Measures."
+            raise ValueError(msg)
+        n_segments = n_measures.pop()
+        n_voices = len(self._melodies)
+
+        self._notes, self._velocities = mt._melody_arrays(self._melodies)
+
+        self._segments: List[Optional[_Segment]] = [None for _ in range(n_segments)]
+        self._dirty = np.ones(shape=(n_segments,), dtype=bool)
+        self._lengths = np.zeros(shape=(n_segments,), dtype=np.int64)
+        self._first_ticks = np.full(shape=(n_segments,), fill_value=-1, dtype=np.int64)
+
+        # events of every segment at their absolute tick, the number of events of each segment, and the tick
+        # offsets of the segments when they were last spliced
+        self._spliced = np.empty(shape=(0,), dtype=mt.EVENT_DTYPE)
+        self._event_counts = np.zeros(shape=(n_segments,), dtype=np.int64)
+        self._spliced_offsets = np.zeros(shape=(n_segments + 1,), dtype=np.int64)
+
+        # per segment and voice, derived from the measures only
+        self._n_note_on = np.zeros(shape=(n_segments, n_voices), dtype=int)
+        self._has_msg = np.zeros(shape=(n_segments, n_voices), dtype=bool)
+        self._last_on = np.zeros(shape=(n_segments, n_voices), dtype=bool)
+        self._first = np.zeros(shape=(n_segments, n_voices), dtype=int)
+        self._first_on = np.zeros(shape=(n_segments, n_voices), dtype=bool)
+
+        # per segment and voice, the context each segment was last translated in
+        self._rendered_n_played = np.full(shape=(n_segments, n_voices), fill_value=-1, dtype=int)
+        self._rendered_sounding = np.zeros(shape=(n_segments, n_voices), dtype=bool)
+        self._rendered_n_notes = np.full(shape=(n_segments, n_voices), fill_value=-1, dtype=int)
+
+        for i in range(n_segments):
+            self._update_segment(i)
+
+    def _update_segment(self, i: int):
+        """
+        Recompute the message types of the `i`-th measure index, and mark it dirty.
+        """
+        states = [measures[i].state for measures in self._measures]
+
+        if self.is_multi_part:
+            lengths = {st.cached_state_attributes(s, tpb=self.tpb).total_ticks for s in states}
+            if len(lengths) != 1:
+                msg = "Measures of the same index must have the same length in every Part."
+                raise ValueError(msg)
+            parallel_attrs = st.cached_parallel_attrs(states, tpb=self.tpb)
+            cons_attrs = parallel_attrs.cons_attributes
+            msg_types = mt._parallel_msg_types(parallel_attrs, melodies=self._melodies, channels=self.channels)
+            segment = _Segment(ticks=cons_attrs.cons_timestamp, msg_types=msg_types)
+            length, first_tick = cons_attrs.total_ticks, -1
+        else:
+            attrs = st.cached_state_attributes(states[0], tpb=self.tpb)
+            msg_types = np.broadcast_to(attrs.msg_types[:, None], (attrs.msg_types.size, len(self._melodies)))
+            segment = _Segment(ticks=attrs.timestamp_comp, msg_types=msg_types)
+            length = attrs.total_ticks
+            first_tick = attrs.timestamp_comp[0] if attrs.timestamp_comp.size else -1
+
+        has_msg, first, last_on = mt._voice_summary(msg_types)
+        self._segments[i] = segment
+        self._lengths[i] = length
+        self._first_ticks[i] = first_tick
+        self._n_note_on[i] = np.count_nonzero(mt._is_on(msg_types), axis=0)
+        self._has_msg[i] = has_msg
+        self._last_on[i] = last_on
+        self._first[i] = first
+        if msg_types.shape[0]:
+            self._first_on[i] = has_msg & (msg_types[first, np.arange(msg_types.shape[1])] == MsgType.NOTE_ON)
+        else:
+            self._first_on[i] = False
+        self._dirty[i] = True
+
+    def _n_played(self) -> np.ndarray:
+        """
+        Number of notes played by each voice before each segment.
+        """
+        n_played = np.zeros(shape=self._n_note_on.shape, dtype=int)
+        np.cumsum(self._n_note_on[:-1], axis=0, out=n_played[1:])
+        return n_played
+
+    def _sounding(self) -> np.ndarray:
+        """
+        Whether each voice still sounds a note at the start of each segment.
+        """
+        n_segments, n_voices = self._has_msg.shape
+        idx_last = np.where(self._has_msg, np.arange(n_segments)[:, None], -1)
+        np.maximum.accumulate(idx_last, axis=0, out=idx_last)
+
+        sounding = np.zeros(shape=(n_segments, n_voices), dtype=bool)
+        previous = idx_last[:-1]
+        sounding[1:] = (previous >= 0) & self._last_on[np.maximum(previous, 0), np.arange(n_voices)]
+        return sounding
+
+    #### EDITING ####
+
+    def set_measure(self,
+                    measure_idx: int,
+                    measure: Measure,
+                    part_idx: int = 0):
+        """
+        Replaces the `measure_idx`-th Measure of the `part_idx`-th Part.
+
+        The Measure may change the number of "note_on" of the Part, as long as every Melody it plays still has a
+        note for each of them. Otherwise (or if its length differs from the other Parts), raises ValueError and
+        leaves the builder unchanged.
+        """
+        if not isinstance(measure, Measure):
+            e = "`measure` must be a Measure instance."
+            raise TypeError(e)
+
+        measures = self._measures[part_idx]
+        measure_idx = range(len(self._segments))[measure_idx]
+
+        voices = [part_idx] if self.is_multi_part else range(len(self._melodies))
+        for v in voices:
+            n_note_on = self._n_note_on[:, v].sum() - self._n_note_on[measure_idx, v] + measure.n_note_on
+            if n_note_on > len(self._melodies[v]):
+                msg = "Every melody must contain at least one note per \"note_on\" of the Part."
+                raise ValueError(msg)
+
+        previous = measures[measure_idx]
+        measures[measure_idx] = measure
+        try:
+            self._update_segment(measure_idx)
+        except ValueError:
+            measures[measure_idx] = previous
+            raise
+        self._parts_stale = True
+
+    def set_note(self,
+                 note_idx: int,
+                 note: Union[int, Note],
+                 velocity: Optional[int] = None,
+                 voice_idx: int = 0):
+        """
+        Replaces the `note_idx`-th note (and optionally its velocity) of the `voice_idx`-th Melody.
+
+        The builder holds copies of the Melodies it was given, so those are left unchanged (see `melodies` for the
+        edited ones).
+        """
+        if velocity is not None and not 0 <= velocity <= 127:
+            msg = "`velocity` must be in range (0,127)"
+            raise ValueError(msg)
+
+        note = note if isinstance(note, Note) else Note(note)
+        melody = self._melodies[voice_idx]
+        note_idx = range(len(melody))[note_idx]
+
+        melody.notes[note_idx] = note
+        self._notes[voice_idx][note_idx] = note.value
+        if velocity is not None:
+            melody.velocity[note_idx] = velocity
+            self._velocities[voice_idx][note_idx] = velocity
+
+        # segments which play the note, release it, or take its velocity for their last "note_off"
+        n_played = self._n_played()[:, voice_idx]
+        n_note_on = self._n_note_on[:, voice_idx]
+        self._dirty |= (n_played - 1 <= note_idx) & (note_idx <= n_played + n_note_on)
+
+    def mark_dirty(self, measure_idx: Optional[int] = None):
+        """
+        Re-reads the `measure_idx`-th Measure of every Part (all Measures if None), eg. after mutating a Measure in
+        place.
+        """
+        self._parts_stale = True
+        indices = range(len(self._segments)) if measure_idx is None else [measure_idx]
+        for i in indices:
+            self._update_segment(i)
+
+    #### RENDERING ####
+
+    def _render(self):
+        n_played = self._n_played()
+        sounding = self._sounding()
+        n_notes = np.minimum([n.size for n in self._notes], self._n_note_on.sum(axis=0))
+
+        # a change of the number of notes changes the velocity of the "note_off" following the last note
+        reaches_end = n_played + self._n_note_on + 1 >= np.minimum(n_notes, self._rendered_n_notes)
+        dirty = self._dirty \
+            | np.any(n_played != self._rendered_n_played, axis=1) \
+            | np.any(sounding != self._rendered_sounding, axis=1) \
+            | np.any((n_notes != self._rendered_n_notes) & reaches_end, axis=1)
+
+        notes = [n[:k] for n, k in zip(self._notes, n_notes)]
+        velocities = [v[:k] for v, k in zip(self._velocities, n_notes)]
+        off_velocity = 64 if self.is_multi_part else None
+
+        offsets = self._tick_offsets()
+        event_offsets = np.zeros(shape=offsets.shape, dtype=np.int64)
+        np.cumsum(self._event_counts, out=event_offsets[1:])
+
+        # events of segments which only moved in time are shifted
+        moved = offsets[:-1] - self._spliced_offsets[:-1]
+        if moved.any():
+            self._spliced["tick"] += np.repeat(moved, self._event_counts)
+        self._spliced_offsets = offsets
+
+        # consecutive dirty segments are translated at once, and replace their previous events
+        chunks, previous = [], 0
+        for run in self._runs(np.flatnonzero(dirty)):
+            segments = [self._segments[i] for i in run]
+            sizes = np.array([s.ticks.size for s in segments], dtype=np.int64)
+            ticks = np.concatenate([s.ticks for s in segments]) + np.repeat(offsets[run], sizes)
+            msg_types = np.concatenate([s.msg_types for s in segments])
+
+            # the first "note_on" of a segment re-attacks a note still sounding from the previous one
+            row_offsets = np.cumsum(sizes) - sizes
+            seg_idx, voice_idx = np.nonzero(sounding[run] & self._first_on[run])
+            msg_types[row_offsets[seg_idx] + self._first[run[seg_idx], voice_idx], voice_idx] = MsgType.OFN
+
+            events = mt._events_from_voices(
+                ticks=ticks,
+                msg_types=msg_types,
+                notes=notes,
+                velocities=velocities,
+                channels=self.channels,
+                off_velocity=off_velocity,
+                n_played=n_played[run[0]])
+            self._event_counts[run] = np.diff(np.searchsorted(events["tick"], offsets[run[0]:run[-1] + 2]))
+
+            chunks.extend([self._spliced[previous:event_offsets[run[0]]], events])
+            previous = event_offsets[run[-1] + 1]
+
+            self._rendered_n_played[run] = n_played[run]
+            self._rendered_sounding[run] = sounding[run]
+            self._rendered_n_notes[run] = n_notes
+            self.n_segments_rendered += run.size
+
+        if chunks:
+            chunks.append(self._spliced[previous:])
+            self._spliced = np.concatenate(chunks)
+        self._dirty[:] = False
+
+    @staticmethod
+    def _runs(indices: np.ndarray) -> List[np.ndarray]:
+        """
+        Splits sorted segment indices into runs of consecutive indices.
+        """
+        return [r for r in np.split(indices, np.flatnonzero(np.diff(indices) != 1) + 1) if r.size]
+
+    def _tick_offsets(self) -> np.ndarray:
+        offsets = np.zeros(shape=(self._lengths.size + 1,), dtype=np.int64)
+        np.cumsum(self._lengths, out=offsets[1:])
+        return offsets
+
+    def get_events(self) -> np.ndarray:
+        """
+        Returns the same events as `TrackBuilder.get_events`, re-translating only the dirty segments.
+        """
+        self._render()
+        offsets = self._tick_offsets()
+        events = mt._with_final_note_off(self._spliced, int(offsets[-1]))
+
+        # a single Part's ticks are relative to its first event
+        if not self.is_multi_part:
+            has_first = np.flatnonzero(self._first_ticks >= 0)
+            if has_first.size:
+                events["tick"][:-1] -= offsets[has_first[0]] + self._first_ticks[has_first[0]]
+
+        return events
+
+    def _parse_single_part(self) -> List[Message]:
+        return mt.messages_from_events(self.get_events())
+
+    def _parse_multi_part(self) -> List[Message]:
+        return mt.messages_from_events(self.get_events())
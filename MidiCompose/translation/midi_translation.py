@@ -1,15 +1,24 @@
-from typing import Collection, Union, List, Optional, Sequence
+from itertools import zip_longest
+from typing import Collection, Union, List, Optional, Sequence, Iterable, Iterator, Tuple
 
 import numpy as np
 from mido import MidiFile, MidiTrack, Message
 
-from MidiCompose.logic.harmony.note import Note
 from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.logic.rhythm.measure import Measure
 from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.streaming_part import StreamingPart
 from MidiCompose.translation import state_translation as st
+from MidiCompose.translation.state_translation import MsgType
 
 #### OBJECTS ####
 
+# one row per midi message, sorted by `tick` (absolute). `type` is MsgType.NOTE_ON or MsgType.NOTE_OFF.
+EVENT_DTYPE = np.dtype([("tick", np.int64),
+                        ("type", np.int8),
+                        ("note", np.uint8),
+                        ("velocity", np.uint8),
+                        ("channel", np.uint8)])
 
 #### MESSAGE PROTOCOLS ####
 
@@ -111,173 +120,393 @@ def save_mid(mid: MidiFile,
 
 #### STATEPARSER HELPERS ####
 
-def translate_single_part(part: Part,
-                          melodies: Union[Melody, Note],
-                          channels: Sequence[int],
-                          tpb: int = 480) -> List[Message]:
-    # get figure attributes
-    state_attrs = st.get_state_attributes(part.state, tpb=tpb)
-
-    # unpack figure attributes
-    timedelta = state_attrs.timedelta
-    msg_types = state_attrs.msg_types
-    total_ticks = state_attrs.total_ticks
-
-    # get messages
-    messages = []
-    idx_melodies = [0 for _ in melodies]
-    for idx_timedelta, _timedelta in enumerate(timedelta):  # for each timedelta
-
-        timedelta_used = False
+def get_single_part_events(part: Part,
+                           melodies: Sequence[Melody],
+                           channels: Sequence[int],
+                           tpb: int = 480) -> np.ndarray:
+    """
+    Returns the structured array (see `EVENT_DTYPE`) of the messages which play `part` with every melody of
+    `melodies` (one per channel), computed for all voices at once.
 
-        for j, melody in enumerate(melodies):
+    Each voice plays its i-th note at the i-th "note_on" of the Part. At each timestamp, messages are ordered by
+    voice, and an "ofn" gives a "note_off" followed by a "note_on". Ticks are relative to the first event of the
+    Part, and the last row is the final "note_off" at `total_ticks`.
+    """
+    state_attrs = st.cached_state_attributes(part.state, tpb=tpb)
+    return events_from_attributes(state_attrs, melodies=melodies, channels=channels)
 
-            # handle concurrent msg_attrs
-            if timedelta_used:
-                _time = 0
-            else:
-                _time = _timedelta
 
-            # parse message types
-            msg_type = msg_types[idx_timedelta]
+def events_from_attributes(state_attrs: st.StateAttributes,
+                           melodies: Sequence[Melody],
+                           channels: Sequence[int],
+                           absolute_ticks: bool = False) -> np.ndarray:
+    """
+    Event table of `get_single_part_events`. If `absolute_ticks`, ticks are relative to the start of the Part
+    rather than to its first event (eg. to align the tracks of several Parts).
+    """
+    n_voices = len(melodies)
+    msg_types = np.broadcast_to(state_attrs.msg_types[:, None], (state_attrs.msg_types.size, n_voices))
+    notes, velocities = _melody_arrays(melodies, n_notes=np.count_nonzero(msg_types != MsgType.NOTE_OFF, axis=0))
+
+    # a "note_off" takes the velocity of the voice's next note (its last note once every note is played)
+    ticks = state_attrs.timestamp_comp if absolute_ticks else np.cumsum(state_attrs.timedelta)
+    events = _events_from_voices(ticks=ticks,
+                                 msg_types=msg_types,
+                                 notes=notes,
+                                 velocities=velocities,
+                                 channels=channels,
+                                 off_velocity=None)
+    return _with_final_note_off(events, state_attrs.total_ticks)
+
+
+def events_from_parallel_attributes(parallel_attrs: st.ParallelAttributes,
+                                    melodies: Sequence[Melody],
+                                    channels: Sequence[int]) -> np.ndarray:
+    cons_attrs = parallel_attrs.cons_attributes
+    msg_types = _parallel_msg_types(parallel_attrs, melodies=melodies, channels=channels)
+    notes, velocities = _melody_arrays(melodies[:msg_types.shape[1]],
+                                       n_notes=np.count_nonzero(_is_on(msg_types), axis=0))
+
+    events = _events_from_voices(ticks=cons_attrs.cons_timestamp,
+                                 msg_types=msg_types,
+                                 notes=notes,
+                                 velocities=velocities,
+                                 channels=channels,
+                                 off_velocity=64)
+    return _with_final_note_off(events, cons_attrs.total_ticks)
+
+
+def _parallel_msg_types(parallel_attrs: st.ParallelAttributes,
+                        melodies: Sequence[Union[Melody, np.ndarray]],
+                        channels: Sequence[int]) -> np.ndarray:
+    """
+    Returns the (n_timestamps, n_parts) message types over the consolidated timeline.
 
-            # current channel
-            channel = channels[j]
+    Only the number of `melodies` (Melodies, or arrays of note values) and `channels` is checked.
+    """
+    n_parts = len(parallel_attrs.adj_attributes)
+    if len(melodies) < n_parts or len(channels) < n_parts:
+        msg = "There must be a melody and a channel for every Part."
+        raise ValueError(msg)
 
-            # current melodies
-            current_idx_melody = idx_melodies[j]
+    msg_types = np.empty(shape=(parallel_attrs.cons_attributes.cons_timestamp.size, n_parts), dtype=np.int8)
+    for i, adj in enumerate(parallel_attrs.adj_attributes):
+        msg_types[:, i] = adj.adj_msg_types
+    return msg_types
 
-            if current_idx_melody < len(melody):
-                current_note = melody.notes[current_idx_melody].value
-                velocity = melody.velocity[current_idx_melody]
 
-            if current_idx_melody > 0:
-                previous_note = melody.notes[current_idx_melody - 1].value
+def _is_on(msg_types: np.ndarray) -> np.ndarray:
+    return (msg_types == MsgType.NOTE_ON) | (msg_types == MsgType.OFN)
 
-            if msg_type == "-4":
-                continue
 
-            elif msg_type == "ofn":
-                messages.extend(ofn(timedelta=_time,
-                                    off_note=previous_note, on_note=current_note,
-                                    channel=channel, velocity=velocity))
-                timedelta_used = True
-                idx_melodies[j] += 1
+def _melody_arrays(melodies: Sequence[Melody],
+                   n_notes: Optional[Union[np.ndarray, Sequence[int]]] = None):
+    """
+    Returns the note values and velocities of each melody, truncated to `n_notes` notes per melody if given.
+    """
+    counts = [len(m) for m in melodies] if n_notes is None else n_notes
+    notes = [m.note_values[:n] for m, n in zip(melodies, counts)]
+    velocities = [np.asarray(m.velocity[:n], dtype=int) for m, n in zip(melodies, counts)]
+    return notes, velocities
+
+
+def _with_final_note_off(events: np.ndarray,
+                         total_ticks: int) -> np.ndarray:
+    final = np.array([(total_ticks, MsgType.NOTE_OFF, 0, 64, 0)], dtype=EVENT_DTYPE)
+    return np.concatenate([events, final])
+
+
+def _events_from_voices(ticks: np.ndarray,
+                        msg_types: np.ndarray,
+                        notes: Sequence[np.ndarray],
+                        velocities: Sequence[np.ndarray],
+                        channels: Sequence[int],
+                        off_velocity: Optional[int] = None,
+                        n_played: Optional[np.ndarray] = None,
+                        return_voices: bool = False):
+    """
+    Builds the event table of several voices sharing a timeline.
+
+    :param ticks: absolute tick of each timestamp.
+    :param msg_types: (n_timestamps, n_voices) `MsgType` codes. EMPTY timestamps produce no message for that voice.
+    :param notes: note values of each voice, in order of "note_on". `velocities` likewise.
+    :param off_velocity: velocity of every "note_off". If None, a "note_off" takes the velocity of the voice's
+                         next note. The "note_off" of an "ofn" always has the default velocity.
+    :param n_played: number of notes each voice already played before `ticks` (when translating in windows).
+    :param return_voices: if True, also returns the index of the voice of every event.
+    """
+    n_steps, n_voices = msg_types.shape
+    n_played = np.zeros(shape=(n_voices,), dtype=int) if n_played is None else np.asarray(n_played, dtype=int)
+
+    is_on = _is_on(msg_types)
+    n_note_on = np.count_nonzero(is_on, axis=0)
+    n_notes = np.array([n.size for n in notes], dtype=int)
+    if np.any(n_notes < n_played + n_note_on):
+        msg = "Every melody must contain at least one note per \"note_on\" of the Part."
+        raise ValueError(msg)
 
-            elif msg_type == "note_on":
+    # index of the current note of every voice at each timestamp
+    idx_note = n_played + np.cumsum(is_on, axis=0) - is_on
+    idx_previous = np.maximum(idx_note - 1, 0)
+    idx_next = np.minimum(idx_note, np.maximum(n_notes - 1, 0))
+
+    # only the notes from each voice's previous note up to its next unplayed note are gathered, zero-padded
+    first = np.maximum(n_played - 1, 0)
+    last = np.minimum(n_played + n_note_on + 1, n_notes)
+    width = max(int((last - first).max(initial=0)), 1)
+    note_window = np.zeros(shape=(n_voices, width), dtype=int)
+    velocity_window = np.zeros(shape=(n_voices, width), dtype=int)
+    for i in range(n_voices):
+        note_window[i, :last[i] - first[i]] = notes[i][first[i]:last[i]]
+        velocity_window[i, :last[i] - first[i]] = velocities[i][first[i]:last[i]]
+    idx_previous = idx_previous - first
+    idx_next = idx_next - first
+    idx_voice = np.arange(n_voices)[None, :]
+
+    # one slot per (timestamp, voice, [note_off, note_on]), flattened in message order. A "note_off" before any
+    # "note_on" has no note to release, so it is dropped.
+    present = np.empty(shape=(n_steps, n_voices, 2), dtype=bool)
+    present[:, :, 0] = ((msg_types == MsgType.NOTE_OFF) & (idx_note > 0)) | (msg_types == MsgType.OFN)
+    present[:, :, 1] = is_on
+
+    shape = present.shape
+    tick = np.broadcast_to(np.asarray(ticks)[:, None, None], shape)
+    types = np.broadcast_to(np.array([MsgType.NOTE_OFF, MsgType.NOTE_ON], dtype=np.int8), shape)
+    channel = np.broadcast_to(np.asarray(channels[:n_voices], dtype=int)[None, :, None], shape)
+
+    next_velocity = velocity_window[idx_voice, idx_next]
+    off_velocities: Union[int, np.ndarray]
+    if off_velocity is None:
+        off_velocities = np.where(msg_types == MsgType.OFN, 64, next_velocity)
+    else:
+        off_velocities = off_velocity
+
+    note = np.empty(shape=shape, dtype=int)
+    velocity = np.empty(shape=shape, dtype=int)
+    note[:, :, 0] = note_window[idx_voice, idx_previous]
+    note[:, :, 1] = note_window[idx_voice, idx_next]
+    velocity[:, :, 0] = off_velocities
+    velocity[:, :, 1] = next_velocity
+
+    events = np.empty(shape=(int(np.count_nonzero(present)),), dtype=EVENT_DTYPE)
+    events["tick"] = tick[present]
+    events["type"] = types[present]
+    events["note"] = note[present]
+    events["velocity"] = velocity[present]
+    events["channel"] = channel[present]
+
+    if return_voices:
+        return events, np.nonzero(present)[1]
+    return events
+
+
+def messages_from_events(events: np.ndarray) -> List[Message]:
+    """
+    Returns the mido Messages of a structured array of events (see `EVENT_DTYPE`), with delta times.
+    """
+    timedelta = np.diff(events["tick"], prepend=0).tolist()
+    _types = ["note_on" if t == MsgType.NOTE_ON else "note_off" for t in events["type"].tolist()]
+    return [Message(type=_type, time=_time, note=_note, velocity=_velocity, channel=_channel)
+            for _type, _time, _note, _velocity, _channel in zip(_types, timedelta, events["note"].tolist(),
+                                                               events["velocity"].tolist(),
+                                                               events["channel"].tolist())]
 
-                messages.append(Message(type=msg_type, time=_time, note=current_note,
-                                        channel=channel, velocity=velocity))
-                timedelta_used = True
-                idx_melodies[j] += 1
 
-            elif msg_type == "note_off":
+def translate_single_part(part: Part,
+                          melodies: Sequence[Melody],
+                          channels: Sequence[int],
+                          tpb: int = 480) -> List[Message]:
+    events = get_single_part_events(part, melodies=melodies, channels=channels, tpb=tpb)
+    return messages_from_events(events)
 
-                messages.append(Message(type=msg_type, time=_time, note=previous_note,
-                                        channel=channel, velocity=velocity))
-                timedelta_used = True
 
-    # send final "note_off" message
-    remaining_ticks = total_ticks - np.sum(timedelta)
-    messages.append(Message(type="note_off", time=remaining_ticks))
+def get_multi_part_events(parts: Sequence[Part],
+                          melodies: Sequence[Melody],
+                          channels: Sequence[int],
+                          tpb: int = 480) -> np.ndarray:
+    """
+    Returns the structured array (see `EVENT_DTYPE`) of the messages which play each Part of `parts` with the
+    melody and channel of the same index, computed for all Parts at once.
 
-    return messages
+    Parts are aligned on their consolidated timeline. At each timestamp, messages are ordered by Part, and an "ofn"
+    gives a "note_off" followed by a "note_on". The last row is the final "note_off" at `total_ticks`.
+    """
+    parallel_attrs = st.cached_parallel_attrs(states=[p.state for p in parts], tpb=tpb)
+    return events_from_parallel_attributes(parallel_attrs, melodies=melodies, channels=channels)
 
 
 def translate_multi_part(parts: Sequence[Part],
                          melodies: Sequence[Melody],
                          channels: Sequence[int],
                          tpb: int = 480) -> List[Message]:
-    # parallel attributes
-    parallel_attrs = st.get_parallel_attrs(states=[p.state for p in parts], tpb=tpb)
-
-    # consolidated attributes (merged timedelta)
-    cons_attrs = parallel_attrs.cons_attributes
-
-    timedelta = cons_attrs.cons_timedelta
-    total_ticks = cons_attrs.total_ticks
-
-    # adjusted attributes (individual message types)
-    adj_attrs = parallel_attrs.adj_attributes
-
-    adj_msg_types = [a.adj_msg_types for a in adj_attrs]
-
-    # melodies attributes
+    events = get_multi_part_events(parts, melodies=melodies, channels=channels, tpb=tpb)
+    return messages_from_events(events)
 
-    # tracks index of each melodies during iteration
-    idx_of_melodies = [0 for _ in range(len(melodies))]
-    idx_of_parts = [0 for _ in range(len(adj_msg_types))]
 
-    messages = list()
-    for idx_td, _timedelta in enumerate(timedelta):
-        timedelta_used = False
+#### STREAMING ####
 
-        for idx_part, types in enumerate(adj_msg_types):
+PartLike = Union[Part, StreamingPart, Iterable[Measure]]
 
-            if timedelta_used:
-                _timedelta = 0
 
-            # ic(idx_part)
-            #
-            # ic(idx_of_melodies,
-            #    idx_of_parts)
-            # ic(types)
-
-            _type = types[idx_of_parts[idx_part]]
-
-            # ic(_type)
-
-            if _type == "-4":
-                idx_of_parts[idx_part] += 1
-                continue
-
-            else:
-
-                current_melody = melodies[idx_part]
-                _channel = channels[idx_part]
-
-                # ic(current_melody,_channel)
-
-                if _type == "ofn":
-
-                    _note = current_melody.notes[idx_of_melodies[idx_part]].value
-                    _note_previous = current_melody.notes[idx_of_melodies[idx_part] - 1].value
-                    _velocity = current_melody.velocity[idx_of_melodies[idx_part]]
-
-                    # ic(_note,_note_previous,_velocity)
-
-                    messages.extend(ofn(timedelta=_timedelta,off_note=_note_previous,
-                                        on_note=_note,channel=_channel,velocity=_velocity))
-
-                    timedelta_used = True
-                    idx_of_melodies[idx_part] += 1
-
-                elif _type == "note_on":
-
-                    _note = current_melody.notes[idx_of_melodies[idx_part]].value
-                    _velocity = current_melody.velocity[idx_of_melodies[idx_part]]
-
-                    messages.append(Message(type=_type,time=_timedelta,note=_note,
-                                            channel=_channel,velocity=_velocity))
-
-                    timedelta_used = True
-                    idx_of_melodies[idx_part] += 1
-
-                elif _type == "note_off":
-
-                    _note_previous = current_melody.notes[idx_of_melodies[idx_part] - 1].value
-
-                    # ic(_note_previous)
+def _measure_windows(part: PartLike,
+                     window_size: int) -> Iterator[Part]:
+    """
+    Yields Parts of `window_size` consecutive Measures of `part`.
+    """
+    if isinstance(part, Part):
+        for i in range(0, len(part), window_size):
+            yield part[i:i + window_size]
+    else:
+        if not isinstance(part, StreamingPart):
+            part = StreamingPart(part)
+        yield from part.windows(window_size)
 
-                    messages.append(Message(type=_type,time=_timedelta,note=_note_previous,
-                                            channel=_channel))
 
-                    timedelta_used = True
+def _voice_summary(msg_types: np.ndarray):
+    """
+    Returns, for each voice of a window, whether it contains a message, the index of its first message, and
+    whether its last message is a "note_on" (ie. a note is still sounding at the end of the window).
+    """
+    idx_voice = np.arange(msg_types.shape[1])
+    nonempty = msg_types != MsgType.EMPTY
+    if msg_types.shape[0] == 0:  # only sustained TimeUnits
+        no_msg = np.zeros(shape=idx_voice.shape, dtype=bool)
+        return no_msg, np.zeros(shape=idx_voice.shape, dtype=int), no_msg
 
-                idx_of_parts[idx_part] += 1
+    has_msg = nonempty.any(axis=0)
+    first = np.argmax(nonempty, axis=0)
+    last = msg_types.shape[0] - 1 - np.argmax(nonempty[::-1], axis=0)
+    return has_msg, first, has_msg & _is_on(msg_types[last, idx_voice])
 
-    # send final "note_off" message
-    remaining_ticks = total_ticks - np.sum(timedelta)
-    messages.append(Message(type="note_off", time=remaining_ticks))
 
-    return messages
\ No newline at end of file
+def _reattack(msg_types: np.ndarray,
+              sounding: np.ndarray) -> np.ndarray:
+    """
+    Returns `msg_types` where the first message of each voice becomes an "ofn" if it is a "note_on" directly
+    following a "note_on" of the previous window (`sounding`).
+    """
+    has_msg, first, _ = _voice_summary(msg_types)
+    idx_voice = np.arange(msg_types.shape[1])
+    reattack = has_msg & sounding
+    reattack[reattack] = msg_types[first[reattack], idx_voice[reattack]] == MsgType.NOTE_ON
+    if reattack.any():
+        msg_types = msg_types.copy()
+        msg_types[first[reattack], idx_voice[reattack]] = MsgType.OFN
+    return msg_types
+
+
+def _iter_voice_events(windows: Iterator[Tuple[np.ndarray, np.ndarray, int]],
+                       notes: Sequence[np.ndarray],
+                       velocities: Sequence[np.ndarray],
+                       channels: Sequence[int],
+                       off_velocity: Optional[int]) -> Iterator[np.ndarray]:
+    """
+    Yields the events of consecutive windows, given as (absolute ticks, msg_types, end tick), carrying the notes
+    played by each voice from one window to the next. The last chunk is the final "note_off".
+    """
+    n_voices = len(notes)
+    n_played = np.zeros(shape=(n_voices,), dtype=int)
+    sounding = np.zeros(shape=(n_voices,), dtype=bool)
+    end_tick = 0
+
+    for ticks, msg_types, end_tick in windows:
+        msg_types = _reattack(msg_types, sounding)
+        events = _events_from_voices(ticks=ticks,
+                                     msg_types=msg_types,
+                                     notes=notes,
+                                     velocities=velocities,
+                                     channels=channels,
+                                     off_velocity=off_velocity,
+                                     n_played=n_played)
+        if events.size:
+            yield events
+
+        has_msg, _, last_on = _voice_summary(msg_types)
+        n_played = n_played + np.count_nonzero(_is_on(msg_types), axis=0)
+        sounding = np.where(has_msg, last_on, sounding)
+
+    yield _with_final_note_off(np.empty(shape=(0,), dtype=EVENT_DTYPE), end_tick)
+
+
+def iter_single_part_events(part: PartLike,
+                            melodies: Sequence[Melody],
+                            channels: Sequence[int],
+                            tpb: int = 480,
+                            window_size: int = 16) -> Iterator[np.ndarray]:
+    """
+    Streaming equivalent of `get_single_part_events`: walks `part` (a Part, a StreamingPart or any iterable of
+    Measures) `window_size` Measures at a time, and yields the events of each window, so that memory does not grow
+    with the length of the Part. Concatenating the chunks gives the same events as `get_single_part_events`, given
+    melodies of exactly one note per "note_on".
+    """
+    notes, velocities = _melody_arrays(melodies)
+
+    def _windows():
+        offset = 0
+        shift = None  # ticks are relative to the first event of the Part
+        for window in _measure_windows(part, window_size):
+            attrs = st.cached_state_attributes(window.state, tpb=tpb)
+            if shift is None and attrs.timestamp_comp.size:
+                shift = offset + int(attrs.timestamp_comp[0])
+            ticks = attrs.timestamp_comp + (offset - (shift or 0))
+            msg_types = np.broadcast_to(attrs.msg_types[:, None], (attrs.msg_types.size, len(melodies)))
+            offset += int(attrs.total_ticks)
+            yield ticks, msg_types, offset
+
+    return _iter_voice_events(_windows(), notes=notes, velocities=velocities, channels=channels,
+                              off_velocity=None)
+
+
+def iter_multi_part_events(parts: Sequence[PartLike],
+                           melodies: Sequence[Melody],
+                           channels: Sequence[int],
+                           tpb: int = 480,
+                           window_size: int = 16) -> Iterator[np.ndarray]:
+    """
+    Streaming equivalent of `get_multi_part_events`, walking every Part `window_size` Measures at a time (see
+    `iter_single_part_events`). The windows of all Parts must span the same number of ticks, ie. Measures of the
+    same index must be of equal length.
+    """
+    if len(melodies) < len(parts) or len(channels) < len(parts):
+        msg = "There must be a melody and a channel for every Part."
+        raise ValueError(msg)
+    notes, velocities = _melody_arrays(melodies[:len(parts)])
+
+    def _windows():
+        offset = 0
+        for windows in zip_longest(*[_measure_windows(p, window_size) for p in parts]):
+            if any(w is None for w in windows):
+                msg = "All Parts must contain the same number of Measures."
+                raise ValueError(msg)
+            states = [w.state for w in windows]
+            if len(set(st.cached_state_attributes(s, tpb=tpb).total_ticks for s in states)) != 1:
+                msg = "Measures of the same index must have the same length in every Part."
+                raise ValueError(msg)
+
+            parallel_attrs = st.cached_parallel_attrs(states, tpb=tpb)
+            msg_types = _parallel_msg_types(parallel_attrs, melodies=melodies, channels=channels)
+            ticks = parallel_attrs.cons_attributes.cons_timestamp + offset
+            offset += int(parallel_attrs.cons_attributes.total_ticks)
+            yield ticks, msg_types, offset
+
+    return _iter_voice_events(_windows(), notes=notes, velocities=velocities, channels=channels,
+                              off_velocity=64)
+
+
+def iter_messages(chunks: Iterable[np.ndarray]) -> Iterator[Message]:
+    """
+    Yields the mido Messages (with delta times) of a stream of event chunks.
+    """
+    previous_tick = 0
+    for events in chunks:
+        if not events.size:
+            continue
+        yield from messages_from_events(_rebased(events, previous_tick))
+        previous_tick = int(events["tick"][-1])
+
+
+def _rebased(events: np.ndarray,
+             tick: int) -> np.ndarray:
+    events = events.copy()
+    events["tick"] -= tick
+    return events
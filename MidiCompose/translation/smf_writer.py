@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+from typing import BinaryIO, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from MidiCompose.translation.state_translation import MsgType
+
+#### CONSTANTS ####
+
+_NOTE_OFF_STATUS = 0x80
+_NOTE_ON_STATUS = 0x90
+
+_SET_TEMPO = b"\xff\x51\x03"
+_END_OF_TRACK = b"\xff\x2f\x00"
+
+# largest value a variable-length quantity (4 bytes) can hold
+_MAX_VLQ = 0x0FFFFFFF
+
+_VLQ_SHIFTS = np.array([21, 14, 7, 0], dtype=np.int64)
+
+
+#### VARIABLE-LENGTH QUANTITIES ####
+
+def _vlq_columns(values: np.ndarray):
+    """
+    Returns the (n, 4) array of the 7-bit groups of each value (most significant first, with the continuation bit
+    set on all but the last group), and the (n, 4) mask of the groups which are written.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if values.size and (values.min() < 0 or values.max() > _MAX_VLQ):
+        msg = f"Variable-length quantities must be between 0 and {_MAX_VLQ}."
+        raise ValueError(msg)
+
+    groups = (values[:, None] >> _VLQ_SHIFTS) & 0x7F
+    groups[:, :3] |= 0x80
+
+    n_bytes = 1 + (values >= 1 << 7) + (values >= 1 << 14) + (values >= 1 << 21)
+    mask = np.arange(4) >= (4 - n_bytes)[:, None]
+
+    return groups.astype(np.uint8), mask
+
+
+def encode_vlq(values: Union[int, np.ndarray, Sequence[int]]) -> bytes:
+    """
+    Encodes every value of `values` (or a single value) as a midi variable-length quantity, concatenated.
+    """
+    groups, mask = _vlq_columns(np.atleast_1d(values))
+    return groups[mask].tobytes()
+
+
+#### TRACK CHUNKS ####
+
+def _event_rows(events: np.ndarray,
+                delta: np.ndarray):
+    """
+    Returns the (n, 7) bytes of every message of `events` (delta time, status and 2 data bytes) and the mask of
+    the bytes which are written, omitting status bytes which repeat the previous one.
+    """
+    if delta.size and delta.min() < 0:
+        msg = "`events` must be sorted by tick."
+        raise ValueError(msg)
+    if events.size and (events["channel"].max() > 15 or events["note"].max() > 127
+                        or events["velocity"].max() > 127):
+        msg = "Channels must be between 0 and 15, and notes and velocities between 0 and 127."
+        raise ValueError(msg)
+
+    groups, mask = _vlq_columns(delta)
+
+    rows = np.empty(shape=(delta.size, 7), dtype=np.uint8)
+    rows[:, :4] = groups
+    rows[:, 4] = np.where(events["type"] == MsgType.NOTE_ON, _NOTE_ON_STATUS, _NOTE_OFF_STATUS) | events["channel"]
+    rows[:, 5] = events["note"]
+    rows[:, 6] = events["velocity"]
+
+    row_mask = np.ones(shape=rows.shape, dtype=bool)
+    row_mask[:, :4] = mask
+    row_mask[1:, 4] = rows[1:, 4] != rows[:-1, 4]
+    return rows, row_mask
+
+
+def _encode_events(events: np.ndarray,
+                   previous_tick: int = 0,
+                   running_status: Optional[int] = None) -> bytes:
+    """
+    Encodes the messages of `events` (without chunk header or "end_of_track"), following a message at
+    `previous_tick` with status byte `running_status`.
+    """
+    delta = np.diff(events["tick"].astype(np.int64), prepend=previous_tick)
+    rows, row_mask = _event_rows(events, delta)
+    if rows.shape[0] and running_status is not None:
+        row_mask[0, 4] = rows[0, 4] != running_status
+
+    return rows[row_mask].tobytes()
+
+
+def _status(events: np.ndarray) -> int:
+    """
+    Status byte of the last message of `events`.
+    """
+    channel = int(events["channel"][-1])
+    return (_NOTE_ON_STATUS if events["type"][-1] == MsgType.NOTE_ON else _NOTE_OFF_STATUS) | channel
+
+
+def _tempo_message(tempo: int) -> bytes:
+    return b"\x00" + _SET_TEMPO + int(tempo).to_bytes(3, "big")
+
+
+def encode_track(events: np.ndarray,
+                 end_tick: Optional[int] = None,
+                 tempo: Optional[int] = None) -> bytes:
+    """
+    Encodes a structured array of messages (see `midi_translation.EVENT_DTYPE`, sorted by tick) into a complete
+    "MTrk" chunk, without creating Message objects.
+
+    Every message is written as a row of at most 7 bytes (delta time, status and 2 data bytes), and the rows are
+    flattened through a single mask. The status byte is omitted when it repeats the previous one ("running status"),
+    as mido does, so the output is identical to saving the equivalent Messages with mido.
+
+    :param end_tick: tick of the "end_of_track" meta message. Defaults to the tick of the last message.
+    :param tempo: if given, a "set_tempo" meta message (microseconds per beat) is written at tick 0.
+    """
+    last_tick = int(events["tick"][-1]) if events.size else 0
+    end_tick = last_tick if end_tick is None else end_tick
+    if end_tick < last_tick:
+        msg = "`end_tick` must not be before the last event."
+        raise ValueError(msg)
+
+    data = b"".join([_tempo_message(tempo) if tempo is not None else b"",
+                     _encode_events(events),
+                     encode_vlq(end_tick - last_tick),
+                     _END_OF_TRACK])
+
+    return b"MTrk" + len(data).to_bytes(4, "big") + data
+
+
+def encode_tracks(events: np.ndarray,
+                  sizes: Sequence[int],
+                  end_ticks: Optional[Sequence[int]] = None,
+                  tempo: Optional[int] = None) -> List[bytes]:
+    """
+    Encodes several tracks at once (see `encode_track`), where `events` holds the events of every track one after
+    the other and `sizes` the number of events of each track. The messages of all tracks are encoded in a single
+    pass, and then split into chunks.
+    """
+    track_sizes = np.asarray(sizes, dtype=np.int64)
+    stops = np.cumsum(track_sizes)
+    starts = stops - track_sizes
+    nonempty = track_sizes > 0
+    ticks = events["tick"].astype(np.int64)
+
+    # delta times and running status restart with every track
+    delta = np.diff(ticks, prepend=0)
+    delta[starts[nonempty]] = ticks[starts[nonempty]]
+    rows, row_mask = _event_rows(events, delta)
+    row_mask[starts[nonempty], 4] = True
+
+    data = rows[row_mask].tobytes()
+    byte_offsets = np.zeros(shape=(track_sizes.size + 1,), dtype=np.int64)
+    row_bytes = np.zeros(shape=(ticks.size + 1,), dtype=np.int64)
+    np.cumsum(np.count_nonzero(row_mask, axis=1), out=row_bytes[1:])
+    byte_offsets[1:] = row_bytes[stops]
+
+    last_ticks = np.where(nonempty, ticks[np.maximum(stops - 1, 0)] if ticks.size else 0, 0)
+    track_end_ticks = last_ticks if end_ticks is None else np.asarray(end_ticks, dtype=np.int64)
+    if np.any(track_end_ticks < last_ticks):
+        msg = "`end_tick` must not be before the last event."
+        raise ValueError(msg)
+    groups, mask = _vlq_columns(track_end_ticks - last_ticks)
+
+    tempo_message = _tempo_message(tempo) if tempo is not None else b""
+    tracks = []
+    for i in range(track_sizes.size):
+        chunk = b"".join([tempo_message,
+                          data[byte_offsets[i]:byte_offsets[i + 1]],
+                          groups[i][mask[i]].tobytes(),
+                          _END_OF_TRACK])
+        tracks.append(b"MTrk" + len(chunk).to_bytes(4, "big") + chunk)
+    return tracks
+
+
+def write_track_stream(file: BinaryIO,
+                       chunks: Iterable[np.ndarray],
+                       end_tick: Optional[int] = None,
+                       tempo: Optional[int] = None) -> int:
+    """
+    Writes an "MTrk" chunk to a seekable binary file, encoding and writing one chunk of events (see
+    `encode_track`) at a time, so that memory does not grow with the length of the track. The length of the chunk
+    is patched once every event is written.
+
+    Returns the number of bytes written.
+    """
+    start = file.tell()
+    file.write(b"MTrk\x00\x00\x00\x00")
+    n_bytes = 0
+    if tempo is not None:
+        n_bytes += file.write(_tempo_message(tempo))
+
+    last_tick, running_status = 0, None
+    for events in chunks:
+        if not events.size:
+            continue
+        n_bytes += file.write(_encode_events(events, previous_tick=last_tick, running_status=running_status))
+        last_tick, running_status = int(events["tick"][-1]), _status(events)
+
+    end_tick = last_tick if end_tick is None else end_tick
+    if end_tick < last_tick:
+        msg = "`end_tick` must not be before the last event."
+        raise ValueError(msg)
+    n_bytes += file.write(encode_vlq(end_tick - last_tick) + _END_OF_TRACK)
+
+    end = file.tell()
+    file.seek(start + 4)
+    file.write(n_bytes.to_bytes(4, "big"))
+    file.seek(end)
+    return n_bytes + 8
+
+
+def encode_tempo_track(tempo: int) -> bytes:
+    """
+    Encodes an "MTrk" chunk holding only a "set_tempo" meta message, used as the shared first track of type 1
+    files.
+    """
+    data = _tempo_message(tempo) + b"\x00" + _END_OF_TRACK
+    return b"MTrk" + len(data).to_bytes(4, "big") + data
+
+
+#### FILE ####
+
+def encode_header(n_tracks: int,
+                  tpb: int,
+                  midi_type: int = 1) -> bytes:
+    if midi_type not in (0, 1):
+        msg = "`midi_type` must be 0 or 1."
+        raise ValueError(msg)
+    if midi_type == 0 and n_tracks != 1:
+        msg = "A type 0 midi file must contain exactly one track."
+        raise ValueError(msg)
+    return b"MThd" + (6).to_bytes(4, "big") + midi_type.to_bytes(2, "big") + n_tracks.to_bytes(2, "big") \
+        + int(tpb).to_bytes(2, "big")
+
+
+def encode_smf(tracks: Sequence[bytes],
+               tpb: int,
+               midi_type: int = 1) -> bytes:
+    """
+    Returns the bytes of a Standard MIDI File made of encoded track chunks (see `encode_track`).
+    """
+    return encode_header(len(tracks), tpb=tpb, midi_type=midi_type) + b"".join(tracks)
+
+
+def write_smf(file: Union[str, BinaryIO],
+              tracks: Sequence[bytes],
+              tpb: int,
+              midi_type: int = 1) -> None:
+    """
+    Writes a Standard MIDI File made of encoded track chunks to a path or binary file object, with one `write` per
+    track.
+    """
+    header = encode_header(len(tracks), tpb=tpb, midi_type=midi_type)
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            f.write(header)
+            for t in tracks:
+                f.write(t)
+    else:
+        file.write(header)
+        for t in tracks:
+            file.write(t)
+
+
+def write_smf_stream(file: Union[str, BinaryIO],
+                     chunks: Iterable[np.ndarray],
+                     tpb: int,
+                     tempo: Optional[int] = None) -> None:
+    """
+    Writes a single-track midi file from a stream of event chunks (see `write_track_stream`) to a path or seekable
+    binary file object.
+    """
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            write_smf_stream(f, chunks, tpb=tpb, tempo=tempo)
+        return
+
+    file.write(encode_header(1, tpb=tpb))
+    write_track_stream(file, chunks, tempo=tempo)
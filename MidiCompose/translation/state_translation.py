@@ -1,8 +1,27 @@
-from dataclasses import dataclass
+import hashlib
+from dataclasses import dataclass, field, fields
+from enum import IntEnum
 from typing import List, Collection
 
 import numpy as np
 
+from MidiCompose.utilities import LRUCache
+
+
+#### MESSAGE TYPES ####
+
+class MsgType(IntEnum):
+    """
+    Codes of the message types in `msg_types`/`adj_msg_types` arrays, which have dtype int8.
+
+    NOTE_OFF and NOTE_ON match the TimeUnit values of the active figure. OFN ("off on") is a "note_on" directly
+    following another "note_on", and EMPTY pads the adjusted message types of parallel figures.
+    """
+    EMPTY = -4
+    NOTE_OFF = 0
+    NOTE_ON = 1
+    OFN = 2
+
 
 #### CONTAINER OBJECTS ####
 
@@ -37,6 +56,7 @@ class ConsolidatedAttributes:
     cons_timedelta: np.ndarray
     total_ticks: int
     ticks_per_beat: int
+    index_maps: List[np.ndarray] = field(default_factory=list)
 
 
 @dataclass
@@ -137,6 +157,9 @@ def get_timestamp_comp(active_st: np.ndarray,
 
 
 def get_msg_types(active_st_comp: np.ndarray):
+    """
+    Returns int8 array of `MsgType` codes.
+    """
     asc = active_st_comp
 
     idx_off = np.where(asc == 0)[0]
@@ -146,10 +169,10 @@ def get_msg_types(active_st_comp: np.ndarray):
     idx_elements_equal = np.where(asc[1:] == asc[:-1])[0] + 1
     idx_ofn = np.intersect1d(idx_on, idx_elements_equal)
 
-    msg_types = np.empty(shape=asc.shape, dtype=object)
-    msg_types[idx_on] = "note_on"
-    msg_types[idx_off] = "note_off"
-    msg_types[idx_ofn] = "ofn"
+    msg_types = np.empty(shape=asc.shape, dtype=np.int8)
+    msg_types[idx_on] = MsgType.NOTE_ON
+    msg_types[idx_off] = MsgType.NOTE_OFF
+    msg_types[idx_ofn] = MsgType.OFN
 
     return msg_types
 
@@ -166,18 +189,31 @@ def get_timedelta(timestamp_comp: np.ndarray):
 
 #### MULTI-STATE ####
 
+def merge_timestamps(abs_times: Collection[np.ndarray]):
+    """
+    Given 2 or more abs_time arrays, return the consolidated array along with an index map per array, such that
+    `consolidated[index_maps[i]] == abs_times[i]`.
+
+    All arrays are concatenated and sorted once, rather than merged one at a time.
+    """
+    abs_times = [np.asarray(_abs, dtype=int) for _abs in abs_times]
+    sizes = [_abs.size for _abs in abs_times]
+
+    # consolidated timeline always starts at 0
+    consolidated, inverse = np.unique(np.concatenate([np.zeros(shape=(1,), dtype=int), *abs_times]),
+                                      return_inverse=True)
+    index_maps = np.split(inverse[1:], np.cumsum(sizes)[:-1])
+
+    return consolidated, index_maps
+
+
 def get_cons_abs_ts_comp(abs_times: Collection[np.ndarray]):
     """
     Given 2 or more abs_time arrays, return consolidated array.
 
     Used for mapping parallel states into a single track.
     """
-
-    consolidated = np.zeros(shape=(1,), dtype=int)
-    for _abs in abs_times:
-        consolidated = np.union1d(_abs, consolidated, )
-
-    return consolidated
+    return merge_timestamps(abs_times)[0]
 
 
 #### ATTRIBUTE-CONTAINER SETTERS ####
@@ -190,8 +226,8 @@ def _get_multiple_state_attributes(states: Collection[np.ndarray],
 
 
 def _get_consolidated_attrs(state_attrs: List[StateAttributes]) -> ConsolidatedAttributes:
-    # get consolidated absolute timestamps
-    cons_timestamp = get_cons_abs_ts_comp([sa.timestamp_comp for sa in state_attrs])
+    # get consolidated absolute timestamps, and the position of each state's timestamps within them
+    cons_timestamp, index_maps = merge_timestamps([sa.timestamp_comp for sa in state_attrs])
     # get consolidated timedelta
     cons_timedelta = get_timedelta(cons_timestamp)
 
@@ -218,28 +254,31 @@ def _get_consolidated_attrs(state_attrs: List[StateAttributes]) -> ConsolidatedA
     return ConsolidatedAttributes(cons_timestamp=cons_timestamp,
                                   cons_timedelta=cons_timedelta,
                                   total_ticks=total_ticks,
-                                  ticks_per_beat=tpb)
+                                  ticks_per_beat=tpb,
+                                  index_maps=index_maps)
 
 
 def _get_adjusted_attrs(state_attrs: List[StateAttributes],
                         cons_attrs: ConsolidatedAttributes) -> List[AdjustedAttributes]:
     adjusted_attrs = list()
 
-    # adjust active_state, msg_type, etc to match consolidated timedelta by comparing absolute timestamps
-    for sa in state_attrs:
-        # boolean mask to match indeces of individual states with consolidated timestamps
-        mask_ts_in_cons = np.in1d(cons_attrs.cons_timestamp,
-                                  sa.timestamp_comp)
+    cons_timestamp = cons_attrs.cons_timestamp
+    index_maps = cons_attrs.index_maps
+    if len(index_maps) != len(state_attrs):
+        index_maps = [np.searchsorted(cons_timestamp, sa.timestamp_comp) for sa in state_attrs]
 
+    # adjust active_state, msg_type, etc to match consolidated timedelta by scattering into consolidated positions
+    for sa, idx_adj in zip(state_attrs, index_maps):
         # adjusted absolute timestamp
-        adj_abs_ts_comp = np.where(mask_ts_in_cons,
-                                   cons_attrs.cons_timestamp,
-                                   -4)
+        adj_abs_ts_comp = np.full(shape=cons_timestamp.shape,
+                                  fill_value=-4,
+                                  dtype=cons_timestamp.dtype)
+        adj_abs_ts_comp[idx_adj] = sa.timestamp_comp
+
         # adjusted msg type
-        adj_msg_types = np.full(shape=cons_attrs.cons_timestamp.shape,
-                                fill_value="-4",
-                                dtype=object)
-        idx_adj = np.where(adj_abs_ts_comp != -4)
+        adj_msg_types = np.full(shape=cons_timestamp.shape,
+                                fill_value=MsgType.EMPTY,
+                                dtype=np.int8)
         adj_msg_types[idx_adj] = sa.msg_types
 
         adj_attrs = AdjustedAttributes(adj_timestamp=adj_abs_ts_comp,
@@ -261,7 +300,58 @@ def _get_parallel_attrs(cons_attrs: ConsolidatedAttributes,
 def get_state_attributes(state: np.ndarray,
                          tpb: int) -> StateAttributes:
     """
+    Fused equivalent of the attribute getter functions above (see `_get_state_attributes_chained`).
+
+    Every attribute is derived from a single mask over `state` and a single cumulative sum, written into
+    preallocated arrays rather than through `union1d`/`intersect1d` temporaries.
+    """
+    state = np.asarray(state)
+
+    # subdivision flags are the only negative values followed by a non-flag value
+    idx_sub_values = np.flatnonzero(state == -3) + 1
+    sub_values = state[idx_sub_values]
+
+    mask_active = state >= 0
+    mask_active[idx_sub_values] = False
+    active_state = state[mask_active]
+
+    ticks_per_sub = np.repeat(tpb // sub_values, sub_values)
+
+    timestamp = np.empty(shape=(active_state.size + 1,), dtype=int)
+    timestamp[0] = 0
+    np.cumsum(ticks_per_sub, out=timestamp[1:])
+    total_ticks = timestamp[-1]
+
+    mask_comp = active_state != 2
+    active_state_comp = active_state[mask_comp]
+    timestamp_comp = timestamp[:-1][mask_comp]
+
+    timedelta = np.empty(shape=timestamp_comp.shape, dtype=int)
+    timedelta[:1] = 0
+    np.subtract(timestamp_comp[1:], timestamp_comp[:-1], out=timedelta[1:])
+
+    # TimeUnit values are the NOTE_OFF/NOTE_ON codes, and a note_on following a note_on becomes OFN
+    msg_types = active_state_comp.astype(np.int8)
+    msg_types[1:] += (active_state_comp[1:] == 1) & (active_state_comp[:-1] == 1)
+
+    return StateAttributes(
+        active_state=active_state,
+        sub_values=sub_values,
+        ticks_per_sub=ticks_per_sub,
+        total_ticks=total_ticks,
+        timestamp=timestamp,
+        active_state_comp=active_state_comp,
+        timestamp_comp=timestamp_comp,
+        timedelta=timedelta,
+        msg_types=msg_types,
+        ticks_per_beat=tpb
+    )
+
 
+def _get_state_attributes_chained(state: np.ndarray,
+                                  tpb: int) -> StateAttributes:
+    """
+    Reference implementation of `get_state_attributes`, chaining the individual attribute getters.
     """
     sub_values = get_subdivision_values(state=state)
     active_state = get_active_state(state=state)
@@ -303,3 +393,66 @@ def get_parallel_attrs(states: Collection[np.ndarray],
     adj_attrs = _get_adjusted_attrs(state_attrs, cons_attrs)
 
     return _get_parallel_attrs(cons_attrs, adj_attrs)
+
+
+#### CACHING ####
+
+# attributes of recently translated states, keyed by a digest of the state and `tpb`
+STATE_ATTRIBUTES_CACHE = LRUCache(maxsize=512)
+PARALLEL_ATTRIBUTES_CACHE = LRUCache(maxsize=64)
+
+
+def _state_key(states: Collection[np.ndarray],
+               tpb: int) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(int(tpb).to_bytes(8, "little", signed=True))
+    for s in states:
+        s = np.ascontiguousarray(s, dtype=np.int8)
+        h.update(s.size.to_bytes(8, "little"))
+        h.update(s.tobytes())
+    return h.digest()
+
+
+def _freeze(container):
+    """
+    Makes the arrays of an attribute container read-only, since cached containers are shared between callers.
+    """
+    for f in fields(container):
+        value = getattr(container, f.name)
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        elif isinstance(value, list):
+            for v in value:
+                if isinstance(v, np.ndarray):
+                    v.flags.writeable = False
+                else:
+                    _freeze(v)
+        elif hasattr(value, "__dataclass_fields__"):
+            _freeze(value)
+    return container
+
+
+def cached_state_attributes(state: np.ndarray,
+                            tpb: int) -> StateAttributes:
+    """
+    Memoized `get_state_attributes` (see `STATE_ATTRIBUTES_CACHE`). The arrays of the result are read-only.
+    """
+    key = _state_key([state], tpb)
+    return STATE_ATTRIBUTES_CACHE.get_or_compute(key, lambda: _freeze(get_state_attributes(state, tpb)))
+
+
+def cached_parallel_attrs(states: Collection[np.ndarray],
+                          tpb: int) -> ParallelAttributes:
+    """
+    Memoized `get_parallel_attrs` (see `PARALLEL_ATTRIBUTES_CACHE`), which also reuses the cached attributes of
+    each state. The arrays of the result are read-only.
+    """
+    states = list(states)
+
+    def _compute():
+        state_attrs = [cached_state_attributes(s, tpb) for s in states]
+        cons_attrs = _get_consolidated_attrs(state_attrs)
+        adj_attrs = _get_adjusted_attrs(state_attrs, cons_attrs)
+        return _freeze(_get_parallel_attrs(cons_attrs, adj_attrs))
+
+    return PARALLEL_ATTRIBUTES_CACHE.get_or_compute(_state_key(states, tpb), _compute)
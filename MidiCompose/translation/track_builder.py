@@ -1,14 +1,34 @@
-from typing import Union, Sequence, List, Optional
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Union, Sequence, List, Optional, Iterator
 
-from mido import Message, MidiTrack, bpm2tempo, MetaMessage
+import numpy as np
+from mido import Message, MidiFile, MidiTrack, bpm2tempo, MetaMessage
 
 from MidiCompose.logic.harmony.note import Note
 from MidiCompose.logic.melody.melody import Melody
 from MidiCompose.logic.rhythm.part import Part
 from MidiCompose.translation import midi_translation as mt
+from MidiCompose.translation import state_translation as st
+from MidiCompose.translation.event_table import EventTable
+from MidiCompose.translation import smf_writer as smf
 
 from icecream import ic as ice, ic
 
+
+def _render_voice_track(state: np.ndarray,
+                        melody: Melody,
+                        channel: int,
+                        tpb: int) -> bytes:
+    """
+    Encodes the track of a single Part/Melody pair. Module-level, so that it can be sent to worker processes.
+    """
+    state_attrs = st.cached_state_attributes(state, tpb=tpb)
+    events = mt.events_from_attributes(state_attrs, [melody], [channel], absolute_ticks=True)
+    return smf.encode_track(events)
+
 # TODO: to_track() -> MidiTrack
 class TrackBuilder:
     """
@@ -23,7 +43,8 @@ class TrackBuilder:
         - Multiple figure (of equal size), single melodies per figure
         - Multiple figure, multiple melodies per figure
 
-    When multiple states (ie. multiple voices), option to "decouple" voices into separate tracks.
+    When multiple states (ie. multiple voices), option to "decouple" voices into separate tracks (see
+    `get_track_chunks`).
 
     Requires "rhythmic container(s)" as well as appropriately-sized "Melody-like" arrays of notes.
 
@@ -54,9 +75,12 @@ class TrackBuilder:
 
     @parts.setter
     def parts(self, value: Sequence[Part]):
+        self._set_parts(value)
+
+    def _set_parts(self, value: Sequence[Part]):
 
         _parts = None
-        if set([type(v) for v in value]) == {Part}:
+        if len(value) > 0 and all([isinstance(v, Part) for v in value]):
             _parts = list(value)
         else:
             msg = "`part` must consist only of `Part` instances."
@@ -70,6 +94,9 @@ class TrackBuilder:
 
     @melodies.setter
     def melodies(self, value: Sequence[Union[Note, Melody]]):
+        self._set_melodies(value)
+
+    def _set_melodies(self, value: Sequence[Union[Note, Melody]]):
 
         _melodies = None
 
@@ -193,15 +220,13 @@ class TrackBuilder:
 
     def get_messages(self) -> List[Union[Message,MetaMessage]]:
 
-        messages = None
+        _tempo = bpm2tempo(self.bpm)
+        messages = [MetaMessage(type="set_tempo",tempo=_tempo)]
 
         if self.is_multi_part:
-            messages = self._parse_multi_part()
+            messages.extend(self._parse_multi_part())
         elif not self.is_multi_part:
-            messages = self._parse_single_part()
-
-        _tempo = bpm2tempo(self.bpm)
-        messages.insert(0,MetaMessage(type="set_tempo",tempo=_tempo))
+            messages.extend(self._parse_single_part())
 
         return messages
 
@@ -213,6 +238,99 @@ class TrackBuilder:
 
         return MidiTrack(_messages)
 
+    def get_events(self) -> np.ndarray:
+        """
+        Returns the messages of `self` as a structured array (see `midi_translation.EVENT_DTYPE`).
+        """
+        if self.is_multi_part:
+            return mt.get_multi_part_events(self.parts, self.melodies, self.channels, self.tpb)
+        else:
+            return mt.get_single_part_events(self.parts[0], self.melodies, self.channels, self.tpb)
+
+    def get_event_table(self, track: int = 0) -> EventTable:
+        """
+        Returns the notes of `self` as an EventTable, on track `track`.
+        """
+        return EventTable.from_events(self.get_events(), track=track)
+
+    def get_smf_bytes(self) -> bytes:
+        """
+        Returns the bytes of a midi file of `self` (same content as a MidiFile of `get_track()`), encoded directly
+        from the event array rather than through Message objects.
+        """
+        track = smf.encode_track(self.get_events(), tempo=bpm2tempo(self.bpm))
+        return smf.encode_smf([track], tpb=self.tpb)
+
+    def iter_events(self, window_size: int = 16) -> Iterator[np.ndarray]:
+        """
+        Yields the messages of `self` in chunks of `window_size` measures (see
+        `midi_translation.iter_single_part_events`).
+        """
+        if self.is_multi_part:
+            return mt.iter_multi_part_events(self.parts, self.melodies, self.channels, self.tpb, window_size)
+        else:
+            return mt.iter_single_part_events(self.parts[0], self.melodies, self.channels, self.tpb, window_size)
+
+    def get_track_chunks(self, max_workers: Optional[int] = None) -> List[bytes]:
+        """
+        Returns the encoded tracks of a type 1 midi file with one track per Part/Melody pair (or per Melody, for a
+        single Part), preceded by a shared tempo track.
+
+        Each voice is translated on its own, without merging the voices into a consolidated timeline, and the
+        voices are rendered concurrently in a pool of `max_workers` processes (defaults to the number of CPUs).
+        With a single worker, voices are rendered in this process.
+        """
+        if self.is_multi_part:
+            parts = self.parts
+        else:
+            parts = [self.parts[0] for _ in self.melodies]
+        states = [np.asarray(p.state, dtype=np.int8) for p in parts]
+
+        n_workers = min(max_workers or os.cpu_count() or 1, len(states))
+        if n_workers <= 1:
+            tracks = [_render_voice_track(*args) for args in zip(states, self.melodies, self.channels,
+                                                                 repeat(self.tpb))]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                tracks = list(pool.map(_render_voice_track, states, self.melodies, self.channels,
+                                       repeat(self.tpb, len(states))))
+
+        return [smf.encode_tempo_track(bpm2tempo(self.bpm))] + tracks
+
+    def get_midi_file(self,
+                      multi_track: bool = False,
+                      max_workers: Optional[int] = None) -> MidiFile:
+        """
+        Returns a MidiFile of `self`: a single track (see `get_track`), or one track per voice if `multi_track`
+        (see `get_track_chunks`).
+        """
+        if multi_track:
+            data = smf.encode_smf(self.get_track_chunks(max_workers=max_workers), tpb=self.tpb)
+        else:
+            data = self.get_smf_bytes()
+        return MidiFile(file=io.BytesIO(data))
+
+    def save(self,
+             path: str,
+             window_size: Optional[int] = None,
+             multi_track: bool = False,
+             max_workers: Optional[int] = None) -> None:
+        """
+        Writes `self` to a midi file. If `window_size` is given, the file is translated and written `window_size`
+        measures at a time, so that memory does not grow with the length of the parts. If `multi_track`, each voice
+        is written to its own track (see `get_track_chunks`).
+        """
+        if multi_track:
+            if window_size is not None:
+                msg = "`window_size` is not supported when writing multiple tracks."
+                raise ValueError(msg)
+            smf.write_smf(path, self.get_track_chunks(max_workers=max_workers), tpb=self.tpb)
+        elif window_size is None:
+            track = smf.encode_track(self.get_events(), tempo=bpm2tempo(self.bpm))
+            smf.write_smf(path, [track], tpb=self.tpb)
+        else:
+            smf.write_smf_stream(path, self.iter_events(window_size), tpb=self.tpb, tempo=bpm2tempo(self.bpm))
+
     def _parse_single_part(self) -> List[Message]:
 
         ice("parsing single-part")
@@ -1,6 +1,7 @@
 import contextlib
 import random
-from typing import Optional
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Union
 
 import numpy as np
 
@@ -32,6 +33,77 @@ def ctx_random_seed(seed: Optional[int]):
             random.setstate(random_state)
 
 
+def get_generator(seed: Optional[Union[int, np.random.Generator]] = None) -> np.random.Generator:
+    """
+    Returns `seed` if it already is a numpy Generator, otherwise a new Generator seeded with `seed`.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+class LRUCache:
+    """
+    Bounded mapping which evicts the least recently used entry once `maxsize` entries are stored, and counts its
+    hits, misses and evictions.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            msg = "`maxsize` must be a positive integer."
+            raise ValueError(msg)
+
+        self.maxsize: int = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Returns the value of `key`, computing it with `func()` (and storing it) on a miss.
+        """
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = func()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the counters.
+        """
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"LRUCache(size={len(self)}, maxsize={self.maxsize}, hits={self.hits}, misses={self.misses}, " \
+               f"evictions={self.evictions})"
 
 
 class TwoWayDict(dict):
@@ -0,0 +1,52 @@
+"""
+Compare the fused `get_state_attributes` kernel with the chained attribute getters.
+
+Run from the repository root:
+    python -m benchmarks.bench_state_attributes
+"""
+import timeit
+
+import numpy as np
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.translation.state_translation import get_state_attributes, _get_state_attributes_chained
+
+N_TIME_UNITS = 100_000
+TPB = 480
+REPEAT = 20
+
+
+def make_state(n_time_units: int, random_seed: int = 0) -> np.ndarray:
+    """
+    Random figure of roughly `n_time_units` TimeUnits, in 4/4 measures with mixed subdivisions.
+    """
+    rng = np.random.default_rng(random_seed)
+    template = Measure([Beat(4), Beat(3), Beat(2), Beat(6)])
+    n_measures = n_time_units // 15
+    part = Part([template] * n_measures).activate_random(density=.5, random_seed=rng)
+
+    # sprinkle sustains, so that every message type is present
+    state = np.array(part.state)
+    units = part.buffer.unit_index
+    sustain = rng.random(units.size) < .2
+    state[units[sustain]] = 2
+    return state
+
+
+def main():
+    state = make_state(N_TIME_UNITS)
+    n_units = int(np.count_nonzero(state >= 0) - np.count_nonzero(state == -3))
+    print(f"state: {state.size} elements, {n_units} TimeUnits, best of {REPEAT} runs")
+
+    results = {}
+    for name, func in [("chained", _get_state_attributes_chained), ("fused", get_state_attributes)]:
+        results[name] = min(timeit.repeat(lambda: func(state, TPB), number=1, repeat=REPEAT))
+        print(f"{name:>8}: {results[name] * 1e3:8.2f} ms")
+
+    print(f"speedup: {results['chained'] / results['fused']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -59,3 +59,25 @@ def test_velocity_setter(melodies, velocity, error):
 def test_iterator():
     pass
 
+
+
+def test_mul_copy_on_write():
+    melody = Melody([60, 62])
+    m1, m2 = melody * 2
+    m1.append_note(Note(64), velocity=80)
+
+    assert len(melody) == 2 and len(melody.velocity) == 2
+    assert len(m2) == 2
+    assert m1.notes == [Note(60), Note(62), Note(64)]
+    assert m1.velocity[-1] == 80
+
+
+def test_copy_mutated_through_getters():
+    melody = Melody([60, 62])
+    copy = melody.copy()
+    copy.notes[0] = Note(70)
+    copy.velocity[0] = 100
+
+    assert melody.notes == [Note(60), Note(62)]
+    assert melody.velocity == [64, 64]
+    assert copy[0] == Note(70)
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 from numpy.testing import assert_array_equal
 
 from MidiCompose.logic.rhythm.time_unit import TimeUnit
@@ -98,3 +99,46 @@ def test_short_all():
     b.shorten_all()
     assert_array_equal(b.state,np.array([-3,8,  1,0,0,1,0,0,1,0]))
 
+
+
+def test_mul_copy_on_write():
+    b = Beat([1, 0, 1])
+    c1, c2 = b * 2
+
+    c1[0] = 0
+    b[2] = TimeUnit(2)
+
+    assert_array_equal(b.active_state, [1, 0, 2])
+    assert_array_equal(c1.active_state, [0, 0, 1])
+    assert_array_equal(c2.active_state, [1, 0, 1])
+
+
+def test_time_unit_flyweight():
+    b = Beat([1, 0, 1])
+
+    assert b.time_units[0] is TimeUnit(1)
+    assert b.time_units[0].toggle() is b.time_units[1]
+    assert b.time_units[1].activate() == 1
+    assert_array_equal(b.active_state, [1, 0, 1])  # returned TimeUnits don't mutate the Beat
+
+    with pytest.raises(AttributeError):
+        b.time_units[0].verbose = True
+
+    b[1] = TimeUnit(2)
+    assert b.time_units[1] is TimeUnit(2)
+
+
+def test_eq_hash():
+    b = Beat([1, 0, 2])
+
+    assert b == Beat([1, 0, 2])
+    assert b != Beat([1, 0, 2, 0])
+    assert b != [1, 0, 2]
+    assert {b: 1}[Beat([1, 0, 2])] == 1
+
+
+def test_get_complement():
+    b = Beat([1, 0, 2, 1])
+
+    assert_array_equal(b.get_complement().active_state, [0, 1, 1, 0])
+    assert_array_equal(b.get_complement(adherence=0.).active_state, b.active_state)
@@ -0,0 +1,42 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+from MidiCompose.logic.rhythm.dedup_index import DedupIndex
+
+
+def test_update():
+    m1 = Measure([Beat([1, 0]), Beat([1, 2, 2])])
+    m2 = Measure([Beat([1, 0]), Beat([1, 0, 0])])
+    index = DedupIndex()
+    index.update([m1, m2, m1.copy(), Part([m1]), Part([m1], buffered=True)])
+
+    assert len(index) == 3
+    assert index.n_total == 5
+    assert index.count(m1) == 2
+    assert index.count(Part([m1])) == 2
+    assert m2 in index
+    assert Beat([1, 0]) not in index
+
+    state, count = index.most_common(1)[0]
+    assert_array_equal(state, m1.state)
+    assert count == 2
+
+
+def test_update_states():
+    template = Part([Measure([Beat([0, 0, 0, 0])])])
+    ensemble = RhythmEnsemble.activate_random(template, n=200, density=.5, random_seed=1)
+
+    index = DedupIndex()
+    index.update_states(ensemble.states)
+    index.update_states([template.state, Part().state])
+
+    assert index.n_total == 202
+    assert len(index) <= 16 + 1
+    assert index.counts.sum() == 202
+    assert np.isclose(index.frequencies.sum(), 1.)
+    assert index.count(Part()) == 1
+    assert index.count(ensemble[0]) >= 1
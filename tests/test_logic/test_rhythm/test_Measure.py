@@ -72,3 +72,51 @@ def test_shorten_all():
     pass
 
 
+
+
+#### CACHE ####
+
+def test_state_cache_invalidation():
+    b = Beat([1, 0, 0])
+    m = Measure([b, Beat([2, 2]), b])
+
+    assert m.n_note_on == 2
+    assert m.state is not None
+
+    b[1] = 1
+    assert_array_equal(m.state, np.array([-2, -3, 3, 1, 1, 0, -3, 2, 2, 2, -3, 3, 1, 1, 0]))
+    assert m.n_note_on == 4
+
+    b.set_state([1])
+    assert_array_equal(m.subdivision_values, np.array([1, 2, 1]))
+    assert_array_equal(m.state, np.array([-2, -3, 1, 1, -3, 2, 2, 2, -3, 1, 1]))
+
+
+def test_activate_random():
+    m = Measure([Beat([1, 2, 1, 2]), Beat([0, 0, 0])])
+    activated = m.activate_random(density=1., beat_idx=[0])
+
+    assert_array_equal(activated.state, np.array([-2, -3, 4, 1, 2, 1, 2, -3, 3, 1, 1, 1]))
+    assert m.activate_random(density=0.).n_note_on == 0
+    assert_array_equal(Measure([]).activate_random(density=.5).state, [-2])
+
+
+def test_from_state():
+    m = Measure([Beat([1, 2, 1, 2]), Beat([0, 0, 0])])
+    parsed = Measure.from_state(m.state)
+
+    assert_array_equal(parsed.state, m.state)
+    assert not parsed.is_view
+    assert parsed.n_beats == 2
+
+    with pytest.raises(ValueError):
+        Measure.from_state(np.concatenate([m.state, m.state]))
+
+
+def test_get_complement():
+    m = Measure([Beat([1, 2, 0, 1]), Beat([0, 0, 1])])
+
+    assert_array_equal(m.get_complement().active_state, [0, 1, 1, 0, 1, 1, 0])
+    assert_array_equal(m.get_complement(beat_idx=[1]).active_state, [1, 2, 0, 1, 1, 1, 0])
+    assert_array_equal(m.get_complement(adherence=0., random_seed=1).state, m.state)
+    assert_array_equal(Measure([]).get_complement().state, [-2])
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+from MidiCompose.logic.rhythm.packed_store import PackedRhythmStore, pack_units, unpack_units
+
+
+@pytest.fixture
+def parts():
+    m1 = Measure([Beat([1, 2, 1, 2]), Beat([1, 0, 0])])
+    m2 = Measure([Beat([2, 2, 1])])
+    return [Part([m1, m2]), Part([m2]), Part(), Part([m1, m2])]
+
+
+def test_pack_units():
+    units = np.array([0, 1, 2, 1, 2, 2, 0, 0], dtype=np.int8)
+    packed = pack_units(units)
+
+    assert packed.size == 2
+    assert_array_equal(unpack_units(packed), units)
+
+
+def test_from_parts(parts):
+    store = PackedRhythmStore.from_parts(parts)
+
+    assert len(store) == 4
+    assert len(store.layouts) == 3  # parts 0 and 3 share a layout
+    assert_array_equal(np.diff(store.byte_offsets), [3, 1, 0, 3])
+    for i, p in enumerate(parts):
+        assert_array_equal(store.state(i), p.state)
+        assert_array_equal(store[i].state, p.state)
+    assert_array_equal(store[-1].active_state, parts[-1].active_state)
+
+    with pytest.raises(IndexError):
+        store.state(4)
+
+
+def test_states(parts):
+    store = PackedRhythmStore.from_states([p.state for p in parts])
+    states = store.states([3, 0, 1])
+
+    for state, i in zip(states, [3, 0, 1]):
+        assert_array_equal(state, parts[i].state)
+
+
+def test_from_ensemble(parts):
+    ensemble = RhythmEnsemble.activate_random(parts[0], n=5, density=.5, random_seed=3)
+    store = PackedRhythmStore.from_ensemble(ensemble)
+
+    assert len(store.layouts) == 1
+    for i in range(5):
+        assert_array_equal(store.active_state(i), ensemble.active_states[i])
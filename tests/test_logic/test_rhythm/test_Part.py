@@ -1,4 +1,6 @@
+import numpy as np
 import pytest
+from numpy.testing import assert_array_equal
 
 from MidiCompose.logic.rhythm.beat import Beat
 from MidiCompose.logic.rhythm.measure import Measure
@@ -33,3 +35,191 @@ def test_iterator(part_1):
 
 
 
+
+
+#### BUFFERED ####
+
+def test_buffered_state(part_1):
+    buffered = Part(part_1.measures, buffered=True)
+
+    assert buffered.is_buffered
+    assert_array_equal(buffered.state, part_1.state)
+    assert_array_equal(buffered.active_state, part_1.active_state)
+    assert buffered.n_note_on == part_1.n_note_on
+    assert buffered.n_beats == part_1.n_beats
+
+
+def test_empty_active_state():
+    assert Part([]).active_state.size == 0
+    assert Part([], buffered=True).active_state.size == 0
+
+
+def test_buffered_views_write_through(part_1):
+    buffered = part_1.to_buffered()
+
+    measure = buffered[1]
+    assert measure.is_view
+    measure[0][0] = 0
+
+    assert buffered.state[buffered.buffer.measure_offsets[1] + 3] == 0
+    assert buffered.n_note_on == part_1.n_note_on
+    assert part_1[1][0][0] == 2  # source Part is untouched
+
+
+def test_buffered_layout_is_fixed(part_1):
+    buffered = part_1.to_buffered()
+    with pytest.raises(ValueError):
+        buffered[0][0].set_state([1, 1])
+
+
+#### CACHE ####
+
+def test_state_cache_invalidation(part_1):
+    expected = part_1.state.copy()
+    n_note_on = part_1.n_note_on
+
+    part_1[1][1][0] = 1
+    expected[-5] = 1
+
+    assert_array_equal(part_1.state, expected)
+    assert part_1.n_note_on == n_note_on + 1
+
+    part_1.append_measure(Measure([Beat([1])]))
+    assert part_1.state.size == expected.size + 4
+    assert part_1.n_note_on == n_note_on + 2
+
+
+def test_state_cache_view_beats(part_1):
+    buffered = part_1.to_buffered()
+    measure = Measure([buffered[0][0], Beat([1, 0])])
+    part = Part([measure])
+    assert measure.has_views
+    assert part.state[5] == 2
+    assert measure.n_note_on == 3
+
+    buffered[0][0][1] = 1
+    assert part.state[5] == 1
+    assert measure.n_note_on == 4
+
+
+#### RANDOM ACTIVATION ####
+
+def test_activate_random(part_1):
+    activated = part_1.activate_random(density=.5, random_seed=1, measure_idx=[1])
+
+    assert activated.is_buffered
+    assert_array_equal(activated[1].state, part_1[1].state)  # excluded measure is untouched
+    assert set(activated[0].active_state).issubset({0, 1})
+
+    # reproducible
+    again = part_1.activate_random(density=.5, random_seed=1, measure_idx=[1])
+    assert_array_equal(activated.state, again.state)
+
+    assert part_1.activate_random(density=1.).n_note_on == 16
+    assert part_1.activate_random(density=0.).n_note_on == 0
+
+    with pytest.raises(ValueError):
+        part_1.activate_random(density=1.5)
+
+
+#### COPY-ON-WRITE ####
+
+@pytest.mark.parametrize("buffered", [False, True])
+def test_mul_copy_on_write(part_1, buffered):
+    if buffered:
+        part_1 = part_1.to_buffered()
+    expected = part_1.state.copy()
+
+    copies = part_1 * 3
+    copies[0][0][1][0] = 0
+
+    assert_array_equal(part_1.state, expected)
+    assert_array_equal(copies[1].state, expected)
+    assert copies[0].n_note_on == part_1.n_note_on - 1
+
+
+def test_from_state(part_1):
+    part = Part.from_state(part_1.state)
+
+    assert part.is_buffered
+    assert_array_equal(part.state, part_1.state)
+    assert part.n_note_on == part_1.n_note_on
+
+
+def test_from_states(part_1):
+    parts = Part.from_states([part_1.state, Part().state, [-1, -1]])
+
+    assert len(parts) == 3
+    assert_array_equal(parts[0].state, part_1.state)
+    assert parts[1].n_measures == 0
+    assert parts[2].n_measures == 0
+
+    with pytest.raises(ValueError):
+        Part.from_states([part_1.state, part_1.state[1:]])
+
+
+def test_eq_hash(part_1):
+    buffered = part_1.to_buffered()
+
+    assert buffered == part_1
+    assert hash(buffered) == hash(part_1)
+    assert len({part_1, buffered, part_1.copy()}) == 1
+
+    buffered[0][0][0] = 2
+    assert buffered != part_1
+
+
+def test_get_complement(part_1):
+    complement = part_1.get_complement()
+
+    assert complement.is_buffered
+    assert_array_equal(complement.active_state, np.where(part_1.active_state == 1, 0, 1))
+    assert_array_equal(complement[1].state, part_1[1].get_complement().state)
+
+    partial = part_1.get_complement(measure_idx=[0])
+    assert_array_equal(partial[0].state, complement[0].state)
+    assert_array_equal(partial[1].state, part_1[1].state)
+
+    a = part_1.get_complement(adherence=.5, random_seed=3)
+    b = part_1.get_complement(adherence=.5, random_seed=3)
+    assert a == b
+
+
+@pytest.mark.parametrize("buffered", [True, False])
+def test_slice(part_1, buffered):
+    part = Part(part_1.measures * 2, buffered=buffered)
+    section = part[1:3]
+
+    assert section.n_measures == 2
+    assert section.is_buffered == buffered
+    assert_array_equal(section.state, Part([part_1[1], part_1[0]]).state)
+    assert_array_equal(part[::2].state, Part([part_1[0], part_1[0]]).state)
+
+    section[0][0][0] = 0  # shares the figure of `part`
+    assert part[1][0][0] == 0
+    part[2][1][0] = 2
+    assert section[1][1][0] == 2
+    assert section[1:].state[-5] == 2
+
+
+def test_concat(part_1):
+    buffered = part_1.to_buffered()
+    joined = part_1 + buffered
+
+    assert joined.n_measures == 4
+    assert_array_equal(joined.active_state, np.concatenate([part_1.active_state, buffered.active_state]))
+
+    buffered[0][0][0] = 0
+    part_1[1][1][0] = 1
+    assert joined[2][0][0] == 0
+    assert joined[1][1][0] == 1
+    assert Part.concat([part_1, part_1, buffered]).n_measures == 6
+
+
+def test_concat_n_note_on_before_state(part_1):
+    buffered = part_1.to_buffered()
+    joined = Part.concat([buffered])
+    assert joined.n_note_on == 6
+
+    buffered[1][1][0] = 1
+    assert joined.n_note_on == 7
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part_buffer import PartBuffer
+
+
+def test_offsets():
+    m1 = Measure([Beat([1, 2, 1, 2]), Beat([1, 0])])
+    m2 = Measure([Beat([2, 2, 1])])
+    buffer = PartBuffer.from_measures([m1, m2])
+
+    assert buffer.n_measures == 2
+    assert buffer.n_beats == 3
+    assert buffer.n_time_units == 9
+    assert_array_equal(buffer.sub_values, [4, 2, 3])
+    assert_array_equal(buffer.measure_beats, [0, 2, 3])
+    assert_array_equal(buffer.data[buffer.measure_offsets], [-2, -2, -1])
+    assert_array_equal(buffer.data[buffer.beat_offsets], [-3, -3, -3])
+    assert_array_equal(buffer.active_state, [1, 2, 1, 2, 1, 0, 2, 2, 1])
+
+
+def test_views():
+    m1 = Measure([Beat([1, 2, 1, 2]), Beat([1, 0])])
+    buffer = PartBuffer.from_measures([m1, m1])
+
+    assert_array_equal(buffer.measure(1).state, m1.state)
+    assert_array_equal(buffer.measure_active_state(1), m1.active_state)
+    assert_array_equal(buffer.beat(3).state, np.array([-3, 2, 1, 0]))
+
+
+def test_window_data():
+    m1 = Measure([Beat([1, 2, 1, 2]), Beat([1, 0])])
+    buffer = PartBuffer.from_measures([m1, m1])
+    window = buffer.window(1, 2)
+
+    data = window.data.copy()
+    data[window.unit_index] = 0
+    window.data = data  # written through to the root buffer
+    assert_array_equal(buffer.measure_active_state(1), np.zeros(6))
+    assert_array_equal(buffer.measure_active_state(0), m1.active_state)
+
+
+def test_from_states():
+    m1 = Measure([Beat([1, 2, 1, 2]), Beat([1, 0])])
+    m2 = Measure([Beat([2, 2, 1])])
+    states = [PartBuffer.from_measures([m1, m2]).data,
+              PartBuffer.from_measures([]).data,
+              PartBuffer.from_measures([m2]).data]
+    buffers = PartBuffer.from_states(states)
+
+    assert [b.n_measures for b in buffers] == [2, 0, 1]
+    for buffer, state in zip(buffers, states):
+        assert_array_equal(buffer.data, state)
+    assert_array_equal(buffers[2].sub_values, [3])
+    assert_array_equal(buffers[2].active_state, [2, 2, 1])
+
+
+@pytest.mark.parametrize("state", [
+    [-2, -3, 2, 1, 0, -1],  # missing opening part flag
+    [-1, -3, 2, 1, 0, -1],  # beat outside of a measure
+    [-1, -2, -3, 3, 1, 0, -1],  # too few time units
+    [-1, -2, -3, 2, 1, 0, 1, -1],  # too many time units
+    [-1, -2, -3, 0, -1],  # empty subdivision
+    [-1, -2, -3, 2, 1, 3, -1],  # invalid time unit value
+    [-1, -2, -4, 2, 1, 0, -1],  # invalid flag
+    [-1, -2, -3, 2, 1, 0, -1, -1],  # extra part flag
+])
+def test_from_state_invalid(state):
+    with pytest.raises(ValueError):
+        PartBuffer.from_state(state)
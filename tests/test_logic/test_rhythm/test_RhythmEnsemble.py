@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+
+
+@pytest.fixture
+def template():
+    m1 = Measure([Beat([1, 2, 1, 2]), Beat([0, 0, 0])])
+    m2 = Measure([Beat([2, 2, 2, 2])])
+    return Part([m1, m2, m1])
+
+
+def test_activate_random(template):
+    ensemble = RhythmEnsemble.activate_random(template, n=5, density=.5, random_seed=0, measure_idx=[1])
+
+    assert len(ensemble) == 5
+    assert ensemble.active_states.shape == (5, 18)
+    assert ensemble.active_states.dtype == np.int8
+    assert_array_equal(ensemble.active_states[:, 7:11], np.full((5, 4), 2))  # excluded measure
+
+    for i, part in enumerate(ensemble):
+        assert part.is_buffered
+        assert_array_equal(part.state, ensemble.states[i])
+        assert part.n_note_on == ensemble.n_note_on[i]
+
+
+def test_density_schedule(template):
+    ensemble = RhythmEnsemble.activate_random(template, n=3, density=[1., 0., 0.])
+
+    assert_array_equal(ensemble.n_note_on, [7, 7, 7])
+    assert_array_equal(ensemble[0][2].active_state, np.zeros(7))
+
+    with pytest.raises(ValueError):
+        RhythmEnsemble.activate_random(template, n=3, density=[1., 0.])
+
+
+def test_part_views_write_through(template):
+    ensemble = RhythmEnsemble.activate_random(template, n=2, density=0.)
+    ensemble[1][0][0][0] = 1
+
+    assert ensemble.n_note_on[1] == 1
+    assert ensemble.n_note_on[0] == 0
+
+
+def test_from_states(template):
+    states = RhythmEnsemble.activate_random(template, n=4, density=.5, random_seed=1).states
+    ensemble = RhythmEnsemble.from_states(states)
+
+    assert_array_equal(ensemble.states, states)
+    assert_array_equal(ensemble[3].state, states[3])
+
+    states[1, 1] = -3  # corrupt the layout of a single row
+    with pytest.raises(ValueError):
+        RhythmEnsemble.from_states(states)
@@ -0,0 +1,48 @@
+from itertools import islice
+
+import pytest
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.streaming_part import StreamingPart
+
+
+@pytest.fixture
+def measures():
+    return [Measure([Beat([1, 0]), Beat([i % 3, 2])]) for i in range(7)]
+
+
+def test_iterator(measures):
+    part = StreamingPart(m for m in measures)
+
+    for m, expected in zip(part, measures):
+        assert isinstance(m, Measure)
+        assert m is expected
+    assert part.n_measures_consumed == 7
+    assert list(part) == []
+
+
+def test_windows(measures):
+    part = StreamingPart(iter(measures), window_size=3)
+    windows = list(part.windows())
+
+    assert [w.n_measures for w in windows] == [3, 3, 1]
+    assert all(w.is_buffered for w in windows)
+    assert_array_equal(windows[1].state, Part(measures[3:6]).state)
+
+    with pytest.raises(ValueError):
+        StreamingPart(measures, window_size=0)
+
+
+def test_activate_random():
+    template = Measure([Beat([0, 0, 0, 0])] * 2)
+    unbounded = StreamingPart.activate_random(template, density=.5, random_seed=1, window_size=4)
+    windows = list(islice(unbounded.windows(), 3))
+
+    assert [w.n_measures for w in windows] == [4, 4, 4]
+    assert unbounded.n_measures_consumed == 12
+
+    bounded = StreamingPart.activate_random(template, density=1., n_measures=5)
+    assert sum(m.n_note_on for m in bounded) == 40
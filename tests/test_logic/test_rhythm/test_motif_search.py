@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+from MidiCompose.logic.rhythm.motif_search import find_motif, find_motif_batch
+
+
+@pytest.fixture
+def part():
+    m1 = Measure([Beat([1, 0, 1, 0]), Beat([1, 2, 2])])
+    m2 = Measure([Beat([1, 0, 1, 0]), Beat([1, 0, 1, 0])])
+    return Part([m1, m2, m1])
+
+
+def test_find_motif(part):
+    assert_array_equal(find_motif(part, Beat([1, 0, 1, 0])), [0, 2, 3, 4])
+    assert_array_equal(find_motif(part.to_buffered(), [Beat([1, 0, 1, 0]), Beat([1, 2, 2])]), [0, 4])
+
+    # same values, different layout
+    assert find_motif(part, Beat([1, 0])).size == 0
+    assert find_motif(part, Beat([1, 2])).size == 0
+
+    # spanning measures
+    motif = [Beat([1, 2, 2]), Beat([1, 0, 1, 0])]
+    assert_array_equal(find_motif(part, motif), [1])
+
+
+def test_find_motif_batch(part):
+    parts = [part, Part(), Part([part[1]]), part]
+    part_idx, beat_idx = find_motif_batch(parts, Measure([Beat([1, 0, 1, 0]), Beat([1, 2, 2])]))
+
+    assert_array_equal(part_idx, [0, 0, 3, 3])
+    assert_array_equal(beat_idx, [0, 4, 0, 4])
+
+    # windows spanning two parts are discarded
+    part_idx, _ = find_motif_batch([Part([part[1]]), Part([part[1]])], [Beat([1, 0, 1, 0])] * 3)
+    assert part_idx.size == 0
+
+
+def test_find_motif_ensemble(part):
+    ensemble = RhythmEnsemble.activate_random(part, n=20, density=.5, random_seed=2)
+    motif = Beat([1, 0, 1, 0])
+    part_idx, beat_idx = find_motif_batch(ensemble, motif)
+
+    for i in range(20):
+        assert_array_equal(beat_idx[part_idx == i], find_motif(ensemble[i], motif))
@@ -0,0 +1,66 @@
+import pytest
+
+from MidiCompose.logic.harmony.note import Note
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation.batch_builder import BatchTrackBuilder
+from MidiCompose.translation.track_builder import TrackBuilder
+
+PART_1 = Part([Measure([Beat([1, 0]), Beat([1, 2, 1])])] * 3)  # 9 notes
+PART_2 = Part([Measure([Beat([2, 1]), Beat([0, 1, 1])])] * 3)  # 9 notes
+
+JOBS = [([PART_1], [Melody(list(range(60, 69)))]),
+        ([PART_1], [Note(60), Note(64)]),
+        ([PART_1, PART_2], [Melody(list(range(50, 59)), velocity=90), Melody(list(range(40, 49)))]),
+        ([PART_2], [Melody(list(range(40, 49))), Note(72)]),
+        ([PART_1], [Melody(list(range(70, 79)))])]
+
+
+@pytest.mark.parametrize("max_workers,chunksize", [(1, 64), (1, 2), (2, 1)])
+def test_smf_bytes(max_workers, chunksize):
+    batch = BatchTrackBuilder(JOBS, bpm=90)
+    expected = [TrackBuilder(parts, melodies, bpm=90).get_smf_bytes() for parts, melodies in JOBS]
+
+    assert batch.get_smf_bytes(max_workers=max_workers, chunksize=chunksize) == expected
+
+
+def test_get_events():
+    batch = BatchTrackBuilder([(PART_1, Note(60))])
+    assert (batch.get_events(0) == TrackBuilder([PART_1], [Note(60)]).get_events()).all()
+
+
+def test_save(tmp_path):
+    paths = [str(tmp_path / f"{i}.mid") for i in range(len(JOBS))]
+    batch = BatchTrackBuilder(JOBS)
+    batch.save(paths, max_workers=1)
+
+    for path, expected in zip(paths, batch.get_smf_bytes(max_workers=1)):
+        with open(path, "rb") as f:
+            assert f.read() == expected
+
+    with pytest.raises(ValueError):
+        batch.save(paths[:1])
+
+
+def test_validation():
+    jobs = [([PART_1], [Melody([60, 62])]),  # too few notes
+            ([PART_1], [Note(60)]),
+            ([PART_1, PART_2], [Note(60)]),  # one melody per part
+            ([PART_1], [Note(60), Note(60)]),  # Notes must be unique
+            (["not a part"], [Note(60)])]
+
+    with pytest.raises(ValueError) as e:
+        BatchTrackBuilder(jobs)
+    assert "4 of 5 jobs" in str(e.value)
+    assert all(f"job {i}:" in str(e.value) for i in (0, 2, 3, 4))
+
+
+def test_part_subclass():
+    class _Part(Part):
+        pass
+
+    part = _Part(PART_1.measures)
+    expected = TrackBuilder([part], [Note(60)]).get_smf_bytes()
+    assert BatchTrackBuilder([([part], [Note(60)])]).get_smf_bytes(max_workers=1) == [expected]
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from mido import Message, MidiTrack
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation import midi_translation as mt
+from MidiCompose.translation.event_table import EventTable, NOTE_DTYPE
+from MidiCompose.translation.state_translation import MsgType
+from MidiCompose.translation.track_builder import TrackBuilder
+
+
+@pytest.fixture
+def table():
+    parts = [Part([Measure([Beat([1, 1, 0, 2])])]), Part([Measure([Beat([0, 1, 2])])])]
+    melodies = [Melody([60, 60], velocity=[90, 100]), Melody([48], velocity=[70])]
+    events = mt.get_multi_part_events(parts, melodies=melodies, channels=[0, 1], tpb=480)
+    return EventTable.from_events(events)
+
+
+def test_from_events(table):
+    assert table.notes.dtype == NOTE_DTYPE
+    assert_array_equal(table.tick, [0, 120, 160])
+    assert_array_equal(table.duration, [120, 120, 320])  # re-attacked note 60 is released at 120
+    assert_array_equal(table.pitch, [60, 60, 48])
+    assert_array_equal(table.velocity, [90, 100, 70])
+    assert_array_equal(table.channel, [0, 0, 1])
+    assert table.end_tick == 480
+
+
+def test_conversions(table):
+    assert EventTable.from_bytes(table.to_bytes()) == table
+
+    track = table.to_track()
+    assert isinstance(track, MidiTrack)
+    assert sum(m.time for m in track) == table.end_tick
+    assert EventTable.from_track(track) == table
+
+    # "note_off" before "note_on" at equal ticks
+    assert [(m.type, m.time) for m in track[:4]] == [("note_on", 0), ("note_off", 120), ("note_on", 0),
+                                                     ("note_on", 40)]
+
+
+def test_from_messages_stray_note_off():
+    messages = [Message("note_off", note=60, time=0),
+                Message("note_on", note=60, velocity=80, time=10),
+                Message("note_on", note=62, velocity=0, time=0),  # velocity 0 is a "note_off"
+                Message("note_off", note=60, time=10)]
+    table = EventTable.from_messages(messages)
+
+    assert_array_equal(table.tick, [10])
+    assert_array_equal(table.duration, [10])
+
+
+def test_zero_duration():
+    table = EventTable.from_columns(tick=[0, 0], duration=[0, 10], pitch=[60, 62])
+    events = table.to_events()
+    assert [(int(e["tick"]), int(e["type"]), int(e["note"])) for e in events] == [
+        (0, MsgType.NOTE_ON, 60), (0, MsgType.NOTE_ON, 62), (0, MsgType.NOTE_OFF, 60),
+        (10, MsgType.NOTE_OFF, 62)]
+
+    with pytest.raises(ValueError):
+        EventTable.from_columns(tick=[10], duration=[-1], pitch=[60])
+
+
+def test_transformations(table):
+    assert_array_equal(table.transpose(12).pitch, table.pitch + 12)
+    with pytest.raises(ValueError):
+        table.transpose(100)
+
+    shifted = table.shift(480)
+    assert_array_equal(shifted.tick, table.tick + 480)
+    assert shifted.end_tick == 960
+
+    merged = EventTable.merge([table, shifted])
+    assert len(merged) == 2 * len(table)
+    assert np.all(np.diff(merged.tick) >= 0)
+
+
+def test_track_builder_event_table():
+    part = Part([Measure([Beat([1, 0, 1, 2])])])
+    tb = TrackBuilder([part], [Melody([60, 64])])
+    table = tb.get_event_table()
+
+    assert_array_equal(table.pitch, [60, 64])
+    assert_array_equal(table.duration, [120, 240])
+    assert table.end_tick == 480
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation import midi_translation as mt
+from MidiCompose.translation.incremental_builder import IncrementalTrackBuilder
+from MidiCompose.translation.state_translation import MsgType
+from MidiCompose.translation.track_builder import TrackBuilder
+
+
+def _measures():
+    return [Measure([Beat([1, 0]), Beat([1, 2])]),
+            Measure([Beat([2, 1]), Beat([0, 1])]),
+            Measure([Beat([1, 1]), Beat([2, 2])]),
+            Measure([Beat([0, 1]), Beat([1, 0])])]
+
+
+@pytest.fixture
+def builder():
+    part = Part(_measures())
+    return IncrementalTrackBuilder([part], [Melody([60, 62, 64, 65, 67, 69, 71, 72])])
+
+
+def _expected(builder):
+    return TrackBuilder(builder.parts, builder.melodies, tpb=builder.tpb).get_events()
+
+
+def test_initial_events(builder):
+    assert np.array_equal(builder.get_events(), _expected(builder))
+    assert builder.n_segments_rendered == 4
+
+
+def test_set_note(builder):
+    builder.get_events()
+    builder.set_note(5, 80, velocity=100)
+    assert builder.melodies[0][5].value == 80
+
+    assert np.array_equal(builder.get_events(), _expected(builder))
+    assert builder.n_segments_rendered == 4 + 2  # the measures playing and releasing the note
+
+
+def test_set_measure(builder):
+    builder.get_events()
+    builder.set_measure(1, Measure([Beat([1, 0]), Beat([0, 1])]))
+
+    assert np.array_equal(builder.get_events(), _expected(builder))
+    assert len(builder.parts[0].measures) == 4
+
+    # one "note_on" less, so every following note changes
+    builder.set_measure(0, Measure([Beat([1, 0]), Beat([0, 2])]))
+    expected = mt.get_single_part_events(builder.parts[0], melodies=builder.melodies, channels=builder.channels)
+    assert np.array_equal(builder.get_events(), expected)
+
+
+def test_reattack():
+    # the first "note_on" of the second measure follows a sounding note, and becomes an "ofn"
+    part = Part([Measure([Beat([0, 1]), Beat([0, 0])]), Measure([Beat([1, 0]), Beat([0, 0])])])
+    builder = IncrementalTrackBuilder([part], [Melody([60, 62])])
+    builder.get_events()
+
+    builder.set_measure(0, Measure([Beat([0, 0]), Beat([0, 1])]))
+    events = builder.get_events()
+
+    assert np.array_equal(events, _expected(builder))
+    assert events["type"][:3].tolist() == [MsgType.NOTE_ON, MsgType.NOTE_OFF, MsgType.NOTE_ON]
+    assert events["tick"][1] == events["tick"][2]
+
+
+def test_multi_part():
+    parts = [Part(_measures()), Part(_measures()[::-1])]
+    melodies = [Melody(list(range(60, 68))), Melody(list(range(40, 48)))]
+    builder = IncrementalTrackBuilder(parts, melodies)
+    builder.get_events()
+
+    builder.set_measure(2, Measure([Beat([0, 1]), Beat([2, 1])]), part_idx=1)
+    builder.set_note(0, 72, voice_idx=0)
+
+    assert np.array_equal(builder.get_events(), _expected(builder))
+
+
+def test_errors(builder):
+    with pytest.raises(TypeError):
+        builder.set_measure(0, [Beat([1, 0])])
+    with pytest.raises(ValueError):
+        builder.set_note(4, 50, velocity=300)
+    assert builder.melodies[0][4].value == 67
+    assert np.array_equal(builder.get_events(), _expected(builder))
+
+    # 10 "note_on" for a Melody of 8 notes
+    expected = builder.get_events()
+    with pytest.raises(ValueError):
+        builder.set_measure(2, Measure([Beat([1, 1]), Beat([1, 1])]))
+    assert builder.parts[0].n_note_on == 8
+    assert np.array_equal(builder.get_events(), expected)
+
+
+def test_set_note_copies_melodies():
+    melody = Melody([60, 62, 64, 65, 67, 69, 71, 72])
+    builder = IncrementalTrackBuilder([Part(_measures())], [melody])
+    builder.set_note(0, 80, velocity=100)
+
+    assert melody[0].value == 60 and melody.velocity[0] == 64
+    assert np.array_equal(builder.get_events(), _expected(builder))
@@ -1,12 +1,62 @@
+import numpy as np
 import pytest
 from icecream import ic
 from mido import Message
+from numpy.testing import assert_array_equal
 
 from MidiCompose.logic.harmony.note import Note
 from MidiCompose.logic.rhythm.beat import Beat
 from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation.state_translation import MsgType
 from MidiCompose.translation import midi_translation as mt
 from tests.test_translation import TEST_CONSTANTS as TC
 
 
+def test_get_single_part_events():
+    part = Part([Measure([Beat([1, 1, 0, 2])])])  # note_on, ofn, note_off
+    melodies = [Melody([60, 62], velocity=[90, 100]), Melody([48, 50], velocity=[70, 80])]
+    events = mt.get_single_part_events(part, melodies=melodies, channels=[0, 1], tpb=480)
 
+    assert_array_equal(events["tick"], [0, 0, 120, 120, 120, 120, 240, 240, 480])
+    assert_array_equal(events["type"], [MsgType.NOTE_ON] * 2 + [MsgType.NOTE_OFF, MsgType.NOTE_ON] * 2
+                       + [MsgType.NOTE_OFF] * 3)
+    assert_array_equal(events["note"], [60, 48, 60, 62, 48, 50, 62, 50, 0])
+    assert_array_equal(events["velocity"][[0, 1, 3, 5]], [90, 70, 100, 80])
+    assert_array_equal(events["channel"], [0, 1, 0, 0, 1, 1, 0, 1, 0])
+
+    messages = mt.translate_single_part(part, melodies=melodies, channels=[0, 1], tpb=480)
+    assert [m.time for m in messages] == [0, 0, 120, 0, 0, 0, 120, 0, 240]
+    assert messages[2].type == "note_off" and messages[3].type == "note_on"
+
+
+def test_get_single_part_events_leading_rest():
+    part = Part([Measure([Beat([0, 1, 0, 0])])])
+    events = mt.get_single_part_events(part, melodies=[Melody([60])], channels=[0], tpb=480)
+
+    # the leading "note_off" has nothing to release
+    assert_array_equal(events["type"], [MsgType.NOTE_ON, MsgType.NOTE_OFF, MsgType.NOTE_OFF, MsgType.NOTE_OFF])
+    assert_array_equal(events["tick"], [120, 240, 360, 480])
+
+    with pytest.raises(ValueError):
+        mt.get_single_part_events(part, melodies=[Melody()], channels=[0])
+
+
+def test_get_multi_part_events():
+    parts = [Part([Measure([Beat([1, 0])])]), Part([Measure([Beat([0, 1, 1])])])]
+    melodies = [Melody([60], velocity=[90]), Melody([48, 50], velocity=[70, 80])]
+    events = mt.get_multi_part_events(parts, melodies=melodies, channels=[0, 1], tpb=480)
+
+    assert_array_equal(events["tick"], [0, 160, 240, 320, 320, 480])
+    assert_array_equal(events["type"], [MsgType.NOTE_ON, MsgType.NOTE_ON, MsgType.NOTE_OFF,
+                                        MsgType.NOTE_OFF, MsgType.NOTE_ON, MsgType.NOTE_OFF])
+    assert_array_equal(events["note"], [60, 48, 60, 48, 50, 0])
+    assert_array_equal(events["velocity"], [90, 70, 64, 64, 80, 64])
+    assert_array_equal(events["channel"], [0, 1, 0, 1, 1, 0])
+
+    messages = mt.translate_multi_part(parts, melodies=melodies, channels=[0, 1], tpb=480)
+    assert [m.time for m in messages] == [0, 160, 80, 80, 0, 160]
+
+    with pytest.raises(ValueError):
+        mt.get_multi_part_events(parts, melodies=melodies[:1], channels=[0, 1])
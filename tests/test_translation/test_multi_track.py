@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pytest
+from mido import MidiFile
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation.event_table import EventTable
+from MidiCompose.translation.track_builder import TrackBuilder
+
+
+@pytest.fixture
+def track_builder():
+    parts = [Part([Measure([Beat([2, 1]), Beat([1, 0, 1])])] * 4),  # starts with a rest
+             Part([Measure([Beat([1, 1]), Beat([0, 2, 2])])] * 4)]
+    melodies = [Melody([60, 62, 64] * 4), Melody([48, 50] * 4)]
+    return TrackBuilder(parts, melodies, bpm=90)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_get_track_chunks(track_builder, max_workers):
+    mid = track_builder.get_midi_file(multi_track=True, max_workers=max_workers)
+
+    assert mid.type == 1
+    assert len(mid.tracks) == 3
+    assert [m.type for m in mid.tracks[0]] == ["set_tempo", "end_of_track"]
+
+    # the voices of the merged track, split into one track per voice
+    merged = track_builder.get_event_table()
+    tables = [EventTable.from_track(t) for t in mid.tracks[1:]]
+    for table, pitches in zip(tables, [{60, 62, 64}, {48, 50}]):
+        assert table == merged.select(np.isin(merged.pitch, list(pitches)))
+
+
+def test_single_part_multi_track():
+    part = Part([Measure([Beat([1, 1, 0, 1])])])
+    tb = TrackBuilder([part], [Melody([60, 62, 64]), Melody([67, 69, 71])])
+    mid = tb.get_midi_file(multi_track=True, max_workers=1)
+
+    assert len(mid.tracks) == 3
+    assert [m.note for m in mid.tracks[2] if m.type == "note_on"] == [67, 69, 71]
+
+
+def test_save_multi_track(track_builder, tmp_path):
+    path = str(tmp_path / "multi.mid")
+    track_builder.save(path, multi_track=True, max_workers=1)
+    assert len(MidiFile(path).tracks) == 3
+
+    with pytest.raises(ValueError):
+        track_builder.save(path, window_size=2, multi_track=True)
@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+from mido import MidiFile
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation import smf_writer as smf
+from MidiCompose.translation.event_table import EventTable
+from MidiCompose.translation.track_builder import TrackBuilder
+
+
+@pytest.mark.parametrize("value,expected", [
+    (0, "00"),
+    (127, "7f"),
+    (128, "81 00"),
+    (0x3FFF, "ff 7f"),
+    (0x200000, "81 80 80 00"),
+    (0x0FFFFFFF, "ff ff ff 7f")
+])
+def test_encode_vlq(value, expected):
+    assert smf.encode_vlq([value]) == bytes.fromhex(expected)
+
+
+def test_encode_vlq_out_of_range():
+    with pytest.raises(ValueError):
+        smf.encode_vlq([0x10000000])
+    with pytest.raises(ValueError):
+        smf.encode_vlq([-1])
+
+
+@pytest.mark.parametrize("parts,melodies", [
+    ([Part([Measure([Beat([1, 1, 0, 2]), Beat([1, 2, 0])])] * 40)], [Melody([60, 62, 64] * 40)]),
+    ([Part([Measure([Beat([1, 0]), Beat([1, 1, 1])])] * 40), Part([Measure([Beat([0, 1, 2, 0]), Beat([1])])] * 40)],
+     [Melody([60, 62, 64, 65] * 40), Melody([48, 50] * 40)])
+])
+def test_track_builder_smf_bytes(parts, melodies):
+    tb = TrackBuilder(parts, melodies)
+
+    mid = MidiFile()
+    mid.ticks_per_beat = tb.tpb
+    mid.tracks.append(tb.get_track())
+    buffer = io.BytesIO()
+    mid.save(file=buffer)
+
+    assert tb.get_smf_bytes() == buffer.getvalue()
+
+
+def test_event_table_smf():
+    table = EventTable.from_columns(tick=[0, 0, 480], duration=[480, 960, 200], pitch=[60, 64, 67],
+                                    channel=[0, 0, 1], track=[0, 1, 1], end_tick=1920)
+    mid = MidiFile(file=io.BytesIO(table.to_smf(tpb=480, tempo=500000)))
+
+    assert mid.type == 1 and len(mid.tracks) == 2
+    assert mid.tracks[0][0].type == "set_tempo"
+    assert EventTable.merge([EventTable.from_track(t, track_index=i) for i, t in enumerate(mid.tracks)]) == table
+
+
+def test_encode_tracks():
+    events = [TrackBuilder([Part([Measure([Beat([1, 1, 0, 2])])] * n)], [Melody([60, 62] * n)]).get_events()
+              for n in (1, 3, 2)]
+    events.insert(1, events[0][:0])  # an empty track
+
+    tracks = smf.encode_tracks(np.concatenate(events), sizes=[e.size for e in events], tempo=500000)
+
+    assert tracks == [smf.encode_track(e, tempo=500000) for e in events]
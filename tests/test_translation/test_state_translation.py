@@ -1,3 +1,18 @@
+from dataclasses import fields
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.ensemble import RhythmEnsemble
+from MidiCompose.translation.state_translation import get_state_attributes, _get_state_attributes_chained
+from MidiCompose.translation.state_translation import get_parallel_attrs, MsgType, merge_timestamps
+from MidiCompose.translation import state_translation as st
+from MidiCompose.utilities import LRUCache
+
 #### NEEDED ####
 # stateful Beat, Measure, Part objects
 
@@ -6,3 +21,89 @@
 def test_get_active_state():
     pass
 
+
+_template = Part([Measure([Beat(4), Beat(3)]), Measure([Beat(1), Beat(6), Beat(2)])] * 4)
+
+
+@pytest.mark.parametrize("state", [
+    Part().state,
+    Part([Measure([Beat([2, 2]), Beat([2])])]).state,
+    Part([Measure([Beat([1, 1, 0, 1]), Beat([2, 1, 1])])]).state,
+    *RhythmEnsemble.activate_random(_template, n=5, density=.6, random_seed=4).states
+])
+def test_get_state_attributes_fused(state):
+    fused = get_state_attributes(state, tpb=480)
+    chained = _get_state_attributes_chained(state, tpb=480)
+
+    for f in fields(fused):
+        assert_array_equal(getattr(fused, f.name), getattr(chained, f.name))
+
+
+def test_msg_types():
+    state = Part([Measure([Beat([1, 1, 0, 2]), Beat([1, 2, 0])])]).state
+    msg_types = get_state_attributes(state, tpb=480).msg_types
+
+    assert msg_types.dtype == np.int8
+    assert_array_equal(msg_types, [MsgType.NOTE_ON, MsgType.OFN, MsgType.NOTE_OFF, MsgType.NOTE_ON, MsgType.NOTE_OFF])
+
+    parallel = get_parallel_attrs([state, Part([Measure([Beat([0, 1, 0, 0]), Beat([0, 0, 1])])]).state], tpb=480)
+    adj_msg_types = parallel.adj_attributes[1].adj_msg_types
+    assert adj_msg_types.dtype == np.int8
+    assert_array_equal(adj_msg_types[:3], [MsgType.NOTE_OFF, MsgType.NOTE_ON, MsgType.NOTE_OFF])
+
+
+def test_merge_timestamps():
+    states = RhythmEnsemble.activate_random(_template, n=8, density=.5, random_seed=7).states
+    abs_times = [get_state_attributes(s, tpb=480).timestamp_comp for s in states]
+
+    consolidated, index_maps = merge_timestamps(abs_times)
+
+    expected = np.zeros(shape=(1,), dtype=int)
+    for _abs in abs_times:
+        expected = np.union1d(_abs, expected)
+    assert_array_equal(consolidated, expected)
+
+    for _abs, idx in zip(abs_times, index_maps):
+        assert_array_equal(consolidated[idx], _abs)
+
+    parallel = get_parallel_attrs(states, tpb=480)
+    for _abs, adj in zip(abs_times, parallel.adj_attributes):
+        assert_array_equal(adj.adj_timestamp, np.where(np.in1d(consolidated, _abs), consolidated, -4))
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache and len(cache) == 2
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1)
+
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_cached_state_attributes():
+    st.STATE_ATTRIBUTES_CACHE.clear()
+    st.PARALLEL_ATTRIBUTES_CACHE.clear()
+    states = RhythmEnsemble.activate_random(_template, n=3, density=.5, random_seed=2).states
+
+    attrs = st.cached_state_attributes(states[0], tpb=480)
+    assert st.cached_state_attributes(states[0].copy(), tpb=480) is attrs
+    assert st.cached_state_attributes(states[0], tpb=960) is not attrs
+    assert (st.STATE_ATTRIBUTES_CACHE.hits, st.STATE_ATTRIBUTES_CACHE.misses) == (1, 2)
+
+    with pytest.raises(ValueError):
+        attrs.msg_types[0] = MsgType.OFN
+
+    parallel = st.cached_parallel_attrs(states, tpb=480)
+    assert st.cached_parallel_attrs(list(states), tpb=480) is parallel
+    assert st.PARALLEL_ATTRIBUTES_CACHE.hits == 1
+    assert st.STATE_ATTRIBUTES_CACHE.hits == 2  # the first state was already cached
+
+    expected = get_parallel_attrs(states, tpb=480)
+    for adj, exp in zip(parallel.adj_attributes, expected.adj_attributes):
+        assert_array_equal(adj.adj_msg_types, exp.adj_msg_types)
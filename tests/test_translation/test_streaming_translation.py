@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+import pytest
+from mido import MidiFile
+from numpy.testing import assert_array_equal
+
+from MidiCompose.logic.rhythm.beat import Beat
+from MidiCompose.logic.rhythm.measure import Measure
+from MidiCompose.logic.rhythm.part import Part
+from MidiCompose.logic.rhythm.streaming_part import StreamingPart
+from MidiCompose.logic.melody.melody import Melody
+from MidiCompose.translation import midi_translation as mt
+from MidiCompose.translation import smf_writer as smf
+from MidiCompose.translation.track_builder import TrackBuilder
+
+# re-attacks and sustains across measure boundaries
+_measures = [Measure([Beat([2, 1]), Beat([1, 2, 2])]),
+             Measure([Beat([2, 2]), Beat([1])]),
+             Measure([Beat([1, 0]), Beat([0, 2, 1])])] * 5
+
+
+@pytest.mark.parametrize("window_size", [1, 2, 16])
+def test_iter_single_part_events(window_size):
+    part = Part(_measures)
+    melodies = [Melody(list(range(40, 40 + part.n_note_on))), Melody(list(range(70, 70 + part.n_note_on)))]
+    expected = mt.get_single_part_events(part, melodies, channels=[0, 1])
+
+    chunks = list(mt.iter_single_part_events(part, melodies, channels=[0, 1], window_size=window_size))
+    assert_array_equal(np.concatenate(chunks), expected)
+
+    streamed = mt.iter_single_part_events(StreamingPart(iter(_measures)), melodies, channels=[0, 1],
+                                          window_size=window_size)
+    assert_array_equal(np.concatenate(list(streamed)), expected)
+
+
+def test_iter_multi_part_events():
+    parts = [Part(_measures), Part([Measure([Beat([1] * b.subdivision) for b in m]) for m in _measures])]
+    melodies = [Melody([60] * p.n_note_on) for p in parts]
+    expected = mt.get_multi_part_events(parts, melodies, channels=[0, 1])
+
+    chunks = list(mt.iter_multi_part_events(parts, melodies, channels=[0, 1], window_size=4))
+    assert_array_equal(np.concatenate(chunks), expected)
+
+    with pytest.raises(ValueError):
+        list(mt.iter_multi_part_events([parts[0], Part(_measures[1:])], melodies, channels=[0, 1]))
+
+
+def test_iter_messages():
+    part = Part(_measures)
+    melodies = [Melody([60] * part.n_note_on)]
+    chunks = mt.iter_single_part_events(part, melodies, channels=[0], window_size=2)
+
+    assert list(mt.iter_messages(chunks)) == mt.translate_single_part(part, melodies, channels=[0])
+
+
+def test_write_smf_stream():
+    part = Part(_measures)
+    tb = TrackBuilder([part], [Melody([60] * part.n_note_on)])
+
+    buffer = io.BytesIO()
+    smf.write_smf_stream(buffer, tb.iter_events(window_size=2), tpb=tb.tpb, tempo=500000)
+
+    expected = smf.encode_smf([smf.encode_track(tb.get_events(), tempo=500000)], tpb=tb.tpb)
+    assert buffer.getvalue() == expected
+    assert len(MidiFile(file=io.BytesIO(buffer.getvalue())).tracks[0]) == len(tb.get_messages()) + 1
+
+
+def test_get_messages_tempo_first():
+    part = Part(_measures)
+    messages = TrackBuilder([part], [Melody([60] * part.n_note_on)], bpm=120).get_messages()
+
+    assert messages[0].type == "set_tempo" and messages[0].tempo == 500000